@@ -41,5 +41,23 @@ if [ -v ST_LOG_LEVEL ]; then
     PASS_LOG_LEVEL="--logger.level=${ST_LOG_LEVEL}"
 fi
 
+# if WARMUP is set, run the app once headlessly as soon as streamlit is up, so views prewarm
+#  their caches (python/components/Warmup.py) before the first visitor arrives
+
+if [[ -n "${WARMUP}" && "${WARMUP}" != "0" && "${WARMUP,,}" != "false" ]]; then
+    PASS_WARMUP="--server.scriptHealthCheckEnabled=true"
+    (
+        for i in $(seq 1 120); do
+            sleep 5
+            if curl -sf "http://localhost:8501/${BASE_PATH}_stcore/health" > /dev/null; then
+                echo "Warmup: triggering first app run"
+                curl -sf -m 600 "http://localhost:8501/${BASE_PATH}_stcore/script-health-check" > /dev/null \
+                    || echo "Warmup: first app run reported an error"
+                break
+            fi
+        done
+    ) &
+fi
+
 { source activate base || echo ok ; } \
-    && echo "pwd: `pwd`" && find . && streamlit run "$@" "${PASS_LOG_LEVEL}"
+    && echo "pwd: `pwd`" && find . && streamlit run "$@" "${PASS_LOG_LEVEL}" ${PASS_WARMUP}
@@ -0,0 +1,125 @@
+"""Benchmarks for converting TigerGraph results, on synthetic fraudConnectivityGraph responses
+
+From src/python:  python -m TigerGraph_helper.benchmarks [--edges 1000000] [--vertices 200000] [--legacy-edges 20000]
+
+The legacy per-view loop is quadratic, so it only runs on --legacy-edges, where both outputs are also compared
+"""
+import argparse
+import random
+
+import pandas as pd
+
+from neptune_helper.benchmarks import best_of
+
+from . import df_helper
+
+VERTEX_TYPES = ['User', 'Transaction', 'Payment_Instrument', 'Device_Token']
+EDGE_TYPES = ['User_Transfer_Transaction', 'User_Recieve_Transaction_Rev', 'User_to_Payment', 'User_to_Device']
+TRUST_BINS = [0.2, 0.4, 0.6, 0.8]
+TRUST_COLORS = [0xED293800, 0xB25F4A00, 0x77945C00, 0x3BCA6800, 0x00FF7F00]
+NODE_COLORS = {'Transaction': 0x00000000, 'Payment_Instrument': 0xFF00FF00, 'Device_Token': 0x00FFFF00}
+EDGE_COLORS = dict(zip(EDGE_TYPES, [0xFF740000, 0xA5A5A500, 0x42424200, 0xF5B61700]))
+
+
+# int * int * int -> [dict]
+def make_response(num_edges, num_vertices, seed=0):
+    """runInstalledQuery('fraudConnectivityGraph') results: @@trustS, @@trustD, then @@visResult"""
+    rng = random.Random(seed)
+    types = [VERTEX_TYPES[i % len(VERTEX_TYPES)] for i in range(num_vertices)]
+    edges = []
+    for _ in range(num_edges):
+        src, dst = rng.randrange(num_vertices), rng.randrange(num_vertices)
+        edges.append({
+            'e_type': rng.choice(EDGE_TYPES), 'directed': False,
+            'from_id': str(src), 'from_type': types[src], 'to_id': str(dst), 'to_type': types[dst],
+            'attributes': {}})
+    # some vertices have no trust score, or an empty set of them
+    trust = {str(i): [round(rng.random(), 2)] if i % 10 else [] for i in range(0, num_vertices, 2)}
+    return [{'@@trustS': trust}, {'@@trustD': trust}, {'@@visResult': edges}]
+
+
+def legacy_to_dfs(response):  # noqa: C901
+    """List scans and row-wise apply(), as demo_tigergraph_fraud did before df_helper"""
+    results = response[2]['@@visResult']
+    results_trust_source = response[0]['@@trustS']
+    results_trust_destination = response[1]['@@trustD']
+    from_ids, to_ids, types, from_types, to_types = [], [], [], [], []
+    for s in results:
+        from_ids.append(s['from_id'])
+        to_ids.append(s['to_id'])
+        types.append(s['e_type'])
+        from_types.append(s['from_type'])
+        to_types.append(s['to_type'])
+    edges_df = pd.DataFrame({'from_id': from_ids, 'to_id': to_ids, 'type': types})
+    node_idf, typef, trustf = [], [], []
+    for i in range(len(from_ids)):
+        if from_ids[i] not in node_idf:
+            try:
+                trustf.append(results_trust_source[str(from_ids[i])][0])
+            except:  # noqa: E722
+                trustf.append(0)
+            node_idf.append(from_ids[i])
+            typef.append(from_types[i])
+        if to_ids[i] not in node_idf:
+            try:
+                trustf.append(results_trust_destination[str(to_ids[i])][0])
+            except:  # noqa: E722
+                trustf.append(0)
+            node_idf.append(to_ids[i])
+            typef.append(to_types[i])
+
+    def node_color(node_type, trust):
+        if node_type == 'User':
+            for bound, color in zip(TRUST_BINS, TRUST_COLORS):
+                if trust < bound:
+                    return color
+            return TRUST_COLORS[-1]
+        return NODE_COLORS.get(node_type, 0xFFFFFF00)
+
+    nodes_df = pd.DataFrame({'n': node_idf, 'type': typef, 'trust': trustf, 'size': 0.1})
+    nodes_df['color'] = nodes_df.apply(lambda x: node_color(x['type'], x['trust']), axis=1)
+    edges_df['color'] = edges_df['type'].apply(lambda type_str: EDGE_COLORS[type_str])
+    return nodes_df, edges_df
+
+
+def columnar_to_dfs(response):
+    """df_helper, as demo_tigergraph_fraud does"""
+    edges_df = df_helper.edges_to_df(response[2]['@@visResult'])
+    nodes_df = df_helper.edges_to_nodes_df(
+        edges_df, node='n', from_values=response[0]['@@trustS'], to_values=response[1]['@@trustD'],
+        value='trust', default=0)
+    nodes_df['size'] = 0.1
+    edges_df = edges_df[['from_id', 'to_id', 'type']]
+    nodes_df['color'] = df_helper.lookup_colors(nodes_df['type'], NODE_COLORS)
+    users = (nodes_df['type'] == 'User').to_numpy()
+    nodes_df.loc[users, 'color'] = df_helper.binned_colors(nodes_df['trust'][users], TRUST_BINS, TRUST_COLORS)
+    edges_df['color'] = df_helper.lookup_colors(edges_df['type'], EDGE_COLORS)
+    return nodes_df, edges_df
+
+
+def bench_to_dfs(num_edges, num_vertices, legacy_edges, repeat):
+    for label, edges, fns in [
+        ('compared', legacy_edges, [('legacy', legacy_to_dfs), ('columnar', columnar_to_dfs)]),
+        ('columnar only', num_edges, [('columnar', columnar_to_dfs)])
+    ]:
+        response = make_response(edges, min(num_vertices, edges))
+        print(f'to_dfs ({label}): {edges:,} edges over {min(num_vertices, edges):,} vertices, best of {repeat}')
+        results = {}
+        for name, fn in fns:
+            seconds, (nodes_df, edges_df) = best_of(lambda: fn(response), repeat)
+            results[name] = (nodes_df, edges_df)
+            print(f'  {name:10s} {seconds:8.3f}s  {edges / seconds:12,.0f} edges/s  '
+                  f'({len(nodes_df):,} nodes, {len(edges_df):,} edges)')
+        if 'legacy' in results:
+            for legacy_df, columnar_df in zip(results['legacy'], results['columnar']):
+                pd.testing.assert_frame_equal(legacy_df, columnar_df, check_dtype=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--edges', type=int, default=1000000)
+    parser.add_argument('--vertices', type=int, default=200000)
+    parser.add_argument('--legacy-edges', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    bench_to_dfs(args.edges, args.vertices, args.legacy_edges, args.repeat)
@@ -0,0 +1,110 @@
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from util import getChild
+
+logger = getChild(__name__)
+
+# Keys of an edge in installed query results, ex: SetAccum<EDGE> @@visResult -> edges_to_df() columns
+EDGE_KEYS = {'from_id': 'from_id', 'from_type': 'from_type', 'to_id': 'to_id', 'to_type': 'to_type', 'e_type': 'type'}
+
+# Bar chart colors per transaction type, see transactions_to_df()
+TRANSACTION_COLORS = {"receive": "rgba(0,0,255,0.5)", "transfer": "rgba(255,0,0,0.5)"}
+
+
+# [dict] * ? [str] -> pd.DataFrame
+def edges_to_df(edges, attributes=None):
+    """Edge set results as columns from_id, from_type, to_id, to_type, type, and any listed edge attributes"""
+    columns = {col: [e[key] for e in edges] for key, col in EDGE_KEYS.items()}
+    for attribute in attributes or []:
+        columns[attribute] = [e['attributes'].get(attribute) for e in edges]
+    return pd.DataFrame(columns)
+
+
+# {str -> 'a | ['a]} -> {str -> 'a}
+def accum_to_dict(accum):
+    """MapAccum<VERTEX, ...> results by vertex id, keeping the first value of SetAccum/ListAccum values"""
+    out = {}
+    for k, v in accum.items():
+        if isinstance(v, list):
+            if len(v) > 0:
+                out[k] = v[0]
+        else:
+            out[k] = v
+    return out
+
+
+# pd.DataFrame * str * ? {str -> 'a} * ? {str -> 'a} * str * 'a -> pd.DataFrame
+def edges_to_nodes_df(edges_df, node='n', from_values=None, to_values=None, value='value', default=0):
+    """Distinct endpoints of edges_df, in order of first appearance, with their type
+
+    With from_values/to_values, accumulator maps such as @@trustS/@@trustD, also a value column: looked up in
+    from_values for nodes first seen as a source, else in to_values, by str id, and default when missing"""
+    n = len(edges_df)
+    codes, uniques = pd.factorize(pd.concat([edges_df['from_id'], edges_df['to_id']], ignore_index=True))
+    # endpoints in edge order, source then destination: position 2 * i for sources, 2 * i + 1 for destinations
+    interleaved = np.empty(2 * n, dtype=codes.dtype)
+    interleaved[0::2] = codes[:n]
+    interleaved[1::2] = codes[n:]
+    # first position of each node: assigning in reverse, the earliest position is written last
+    first = np.empty(len(uniques), dtype='int64')
+    first[interleaved[::-1]] = np.arange(2 * n - 1, -1, -1)
+    order = np.argsort(first, kind='stable')
+    first = first[order]
+    is_source = first % 2 == 0
+    rows = first // 2
+
+    nodes_df = pd.DataFrame({
+        node: np.asarray(uniques)[order],
+        'type': np.where(is_source, edges_df['from_type'].to_numpy()[rows], edges_df['to_type'].to_numpy()[rows])
+    })
+    if from_values is not None or to_values is not None:
+        keys = nodes_df[node].astype(str)
+        from_looked_up = keys.map(accum_to_dict(from_values or {}))
+        to_looked_up = keys.map(accum_to_dict(to_values or {}))
+        values = from_looked_up.where(is_source, to_looked_up)
+        nodes_df[value] = values.fillna(default).infer_objects()
+    return nodes_df
+
+
+# pd.Series * {'a -> int} * int -> np.array
+def lookup_colors(s, mapping, default=0xFFFFFF00):
+    """Color per value of a categorical column, and default for unmapped values"""
+    codes, uniques = pd.factorize(s)
+    palette = np.array([mapping.get(u, default) for u in uniques] + [default], dtype='int64')
+    # missing values are coded -1: the trailing default
+    return palette[codes]
+
+
+# pd.Series * [float] * [int] -> np.array
+def binned_colors(s, bins, colors):
+    """Color per value of a numeric column: colors[i] for values in [bins[i - 1], bins[i]), so len(bins) + 1 colors"""
+    codes = pd.cut(s, [-np.inf] + list(bins) + [np.inf], right=False, labels=False)
+    return np.asarray(colors, dtype='int64')[np.asarray(codes, dtype='int64')]
+
+
+# {str -> [dict]} -> pd.DataFrame
+def transactions_to_df(results):
+    """totalTransaction results -> monthly amounts per transaction type, with their TRANSACTION_COLORS, for the bar chart"""
+    dates = []
+    amounts = []
+    transfer_type = []
+    for action in results:
+        for transfer in results[action]:
+            dates.append(datetime.datetime.fromtimestamp(transfer['attributes']['ts']))
+            amounts.append(transfer['attributes']['amount'])
+            transfer_type.append(action)
+    cols = list(zip(dates, amounts, transfer_type))
+    cols = sorted(cols, key=lambda x: x[0].day)
+    cols = sorted(cols, key=lambda x: x[0].month)
+    cols = sorted(cols, key=lambda x: x[0].year)
+    df = pd.DataFrame(data=cols, columns=['Date', 'Amount', 'Type'])
+    df['Date'] = pd.to_datetime(df['Date'])
+    df['Color'] = df['Type'].map(TRANSACTION_COLORS)
+
+    df = df.groupby([df['Date'].dt.to_period('M'), 'Type', 'Color'])[['Amount']].sum()
+    df = df.reset_index(level=['Type', 'Color'])
+    df.index = df.index.values.astype('datetime64[M]')
+    return df
@@ -1,4 +1,5 @@
-import logging, os, pyTigerGraph as tg
+import logging, os, re, threading, time, pyTigerGraph as tg
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
 from util import getChild
@@ -7,33 +8,419 @@ logger = getChild(__name__)
 
 TIGERGRAPH_CONNECTION_VERSION = '3.1.0'
 
+
+# One authenticated TigerGraphConnection, see TigerGraphConnectionCache
+class CachedConnection:
+
+    # str * str * str * str * ? str -> ()
+    def __init__(self, host, graphname, username, password, secret=None):
+        self.host = host
+        self.graphname = graphname
+        self.username = username
+        self.password = password
+        self.secret = secret
+        self.lock = threading.RLock()
+        self.conn = None
+        self.expires_at = 0.0
+        self.failed_at = None
+        self.timer = None
+
+    def is_valid(self):
+        return self.conn is not None and time.time() < self.expires_at
+
+    # str * ? str -> bool
+    def matches(self, password, secret=None):
+        """Whether it was created with these credentials; a missing secret matches the one it created"""
+        return self.password == password and not (secret and self.secret != secret)
+
+
+# Process-wide authenticated TigerGraph connections shared by all users and reruns, keyed by host/graph/user
+#  Connects and gets a token once per key, reusing the secret (created once when not provided), tracks the
+#  token's expiry, and gets a fresh token on a daemon timer TIGERGRAPH_REFRESH_MARGIN_SECONDS before it
+#  expires. Failed connections are retried at most every RETRY_SECONDS instead of on every rerun. Other
+#  credentials for a key are tried on a candidate entry, which replaces the key's entry only once it connects
+class TigerGraphConnectionCache:
+    REFRESH_MARGIN_SECONDS = float(os.environ.get('TIGERGRAPH_REFRESH_MARGIN_SECONDS', '300'))
+    # for token responses without an expiry
+    DEFAULT_TTL_SECONDS = float(os.environ.get('TIGERGRAPH_TOKEN_TTL_SECONDS', '3600'))
+    # minimum delay between failed connects, and between refreshes
+    RETRY_SECONDS = 30
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}  # (host, graphname, username) -> CachedConnection
+        self.candidates = {}  # (host, graphname, username) -> CachedConnection with other credentials
+        self.stats = {'hits': 0, 'connects': 0, 'refreshes': 0, 'failures': 0}
+
+    # str * str * str * str * ? str -> ? TigerGraphConnection
+    def get(self, host, graphname, username, password, secret=None):
+        """Authenticated connection for host/graph/user, connecting only when none is live; cheap when hot
+
+        Returns None when connecting failed within the last RETRY_SECONDS"""
+        key = (host, graphname, username)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = CachedConnection(host, graphname, username, password, secret)
+            elif not entry.matches(password, secret):
+                # a wrong password must not disconnect the working entry other sessions share
+                entry = self.candidates.get(key)
+                if entry is None or not entry.matches(password, secret):
+                    entry = self.candidates[key] = CachedConnection(host, graphname, username, password, secret)
+        # per-key lock: concurrent sessions wait for one connect instead of each connecting
+        with entry.lock:
+            if entry.is_valid():
+                self.count('hits')
+                return entry.conn
+            if entry.failed_at is not None and time.time() - entry.failed_at < self.RETRY_SECONDS:
+                return None
+            conn = self.connect(entry)
+        if conn is not None:
+            self.promote(key, entry)
+        return conn
+
+    # (str, str, str) * CachedConnection -> ()
+    def promote(self, key, entry):
+        """Make a connected candidate the entry of key, dropping the one it replaces"""
+        with self.lock:
+            if self.candidates.get(key) is not entry:
+                return
+            del self.candidates[key]
+            old, self.entries[key] = self.entries.get(key), entry
+        if old is not None:
+            self.forget(old)
+
+    # str -> ()
+    def count(self, stat):
+        with self.lock:
+            self.stats[stat] += 1
+
+    # CachedConnection -> ? TigerGraphConnection
+    def connect(self, entry):
+        with entry.lock:
+            logger.info('Connecting to TigerGraph: %s', {
+                'host': entry.host, 'graphname': entry.graphname, 'username': entry.username,
+                'password': '*' * len(entry.password or '')})
+            try:
+                conn = tg.TigerGraphConnection(
+                    host=entry.host, graphname=entry.graphname, username=entry.username, password=entry.password,
+                    version=TIGERGRAPH_CONNECTION_VERSION)
+                if entry.secret:
+                    logger.info('... Connected to TG, getting token via provided secret...')
+                else:
+                    # FIXME: This times out in practice, maybe TG 3.0 -> 3.1 version issues?
+                    logger.info('... Connected to TG, creating secret and getting token...')
+                    entry.secret = conn.createSecret()
+                self.remember(entry, conn, conn.getToken(entry.secret))
+                self.count('connects')
+                logger.info('Successfully finished connecting to TG!')
+            except Exception:  # noqa: E722
+                logger.warning('Failed connecting to TigerGraph %s', entry.host, exc_info=True)
+                self.count('failures')
+                self.remember(entry, None, None)
+            return entry.conn
+
+    # CachedConnection -> ()
+    def refresh(self, entry):
+        with entry.lock:
+            if self.entries.get((entry.host, entry.graphname, entry.username)) is not entry:
+                return
+            try:
+                self.remember(entry, entry.conn, entry.conn.getToken(entry.secret))
+                self.count('refreshes')
+                logger.debug('TigerGraph token refreshed for %s', entry.host)
+            except Exception:  # noqa: E722
+                logger.info('TigerGraph token refresh failed for %s, reconnecting', entry.host, exc_info=True)
+                self.connect(entry)
+
+    # CachedConnection * ? TigerGraphConnection * ? 'a -> ()
+    def remember(self, entry, conn, token_response):
+        if entry.timer is not None:
+            entry.timer.cancel()
+            entry.timer = None
+        entry.conn = conn
+        if conn is None:
+            # next get() retries, throttled
+            entry.expires_at = 0.0
+            entry.failed_at = time.time()
+            return
+        entry.failed_at = None
+        expiry = self.token_expiry(token_response)
+        entry.expires_at = expiry if expiry is not None else time.time() + self.DEFAULT_TTL_SECONDS
+        delay = max(self.RETRY_SECONDS, entry.expires_at - time.time() - self.REFRESH_MARGIN_SECONDS)
+        logger.debug('TigerGraph token valid for %0.0fs, refreshing in %0.0fs', entry.expires_at - time.time(), delay)
+        entry.timer = threading.Timer(delay, self.refresh, args=(entry,))
+        entry.timer.name = 'gak-tigergraph-refresh'
+        entry.timer.daemon = True
+        entry.timer.start()
+
+    @staticmethod
+    def token_expiry(token_response):
+        """Expiry epoch of a getToken() response, (token, expiry epoch, expiry str), or None when absent"""
+        try:
+            return float(token_response[1])
+        except Exception:  # noqa: E722
+            return None
+
+    # CachedConnection -> ()
+    def forget(self, entry):
+        with entry.lock:
+            if entry.timer is not None:
+                entry.timer.cancel()
+                entry.timer = None
+            entry.conn = None
+            entry.expires_at = 0.0
+
+    # () -> [ { 'host': str, 'graphname': str, 'username': str, 'connected': bool, 'expires_in': float } ]
+    def status(self):
+        with self.lock:
+            entries = list(self.entries.values())
+        return [{
+            'host': e.host,
+            'graphname': e.graphname,
+            'username': e.username,
+            'connected': e.is_valid(),
+            'expires_in': max(0.0, e.expires_at - time.time())
+        } for e in entries]
+
+
+connection_cache = TigerGraphConnectionCache()
+
+
+# GSQL for the installed queries the TigerGraph demos create when missing, see QueryCatalog and query_gsql()
+QUERIES = {
+    'totalTransaction': """
+        CREATE QUERY totalTransaction(Vertex<User> Source) FOR GRAPH {graph} {
+            start = {Source};
+
+            transfer = SELECT tgt
+                FROM start:s -(User_Transfer_Transaction:e) - :tgt;
+
+            receive = select tgt
+                FROM start:s -(User_Recieve_Transaction:e) -:tgt;
+
+            PRINT transfer, receive;
+        }
+    """,
+    'fraudConnectivityGraph': """
+        CREATE QUERY fraudConnectivityGraph (VERTEX<User> inputUser) FOR GRAPH {graph} {
+            /*
+            This query finds all connect users/payment cards/device .
+
+            Starting with a user X find all other users connected to
+            X through device token, payment instrument connected via transactions
+
+            Sample input
+            User: any integer between 1 and 500
+            */
+            MapAccum<VERTEX,SetAccum <float>> @@trustS,@@trustD;
+            OrAccum<bool> @visited;
+            SetAccum<edge> @@visResult;
+
+            Start (_) = {inputUser};
+
+            // keep traverse for 3 steps
+            WHILE Start.size()>0 limit 5 DO
+                Start = SELECT t
+                    FROM Start:s-(:e)-:t
+                    WHERE t.@visited == false AND t != inputUser
+                    ACCUM
+                    @@visResult += e,
+                    @@trustS +=  (s -> s.trust_score),
+                    @@trustD +=  (t -> t.trust_score)
+                    POST-ACCUM
+                    t.@visited += true;
+            END;
+            print @@trustS;
+            print @@trustD;
+            print @@visResult;
+        }
+    """
+}
+
+
+# str * str -> str
+def query_gsql(name, graphname):
+    """CREATE QUERY statement of QUERIES[name] for graph graphname"""
+    return QUERIES[name].replace('FOR GRAPH {graph}', f'FOR GRAPH {graphname}')
+
+
+# Queries of one graph, see QueryCatalog
+class GraphQueries:
+
+    def __init__(self):
+        self.defined = set()
+        self.installed = set()
+        # name -> when a load last tried to install it: retried at most every RETRY_SECONDS when it cannot be,
+        #  ex: not in QUERIES
+        self.checked = {}
+        self.loaded = threading.Event()
+        self.loading = False
+        self.error = None
+        self.failed_at = None
+
+
+# Process-wide catalog of the installed queries of each graph, so views check for their queries in memory
+#  The first ensure() for a graph lists its queries with one GSQL `ls`, and creates and installs the missing
+#  QUERIES, on a background thread; afterwards, lookups never leave the process. Failed loads, and queries
+#  that failed to install, are retried at most every RETRY_SECONDS
+class QueryCatalog:
+    RETRY_SECONDS = 30
+    # default wait() for a load, which may compile and install queries
+    WAIT_SECONDS = float(os.environ.get('TIGERGRAPH_CATALOG_TIMEOUT_SECONDS', '600'))
+    # '  - totalTransaction(vertex<User> Source) (installed v2)'
+    LS_QUERY_PATTERN = re.compile(r'^\s*-\s*(\w+)\s*\(.*$')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.graphs = {}  # (host, graphname) -> GraphQueries
+
+    # str -> [str] * [str]
+    @classmethod
+    def parse_ls(cls, output):
+        """Names of the queries defined and installed, from the 'Queries:' section of a GSQL `ls`"""
+        defined, installed = [], []
+        in_queries = False
+        for line in output.splitlines():
+            if line.strip().endswith(':') and not line.lstrip().startswith('-'):
+                in_queries = line.strip() == 'Queries:'
+                continue
+            match = cls.LS_QUERY_PATTERN.match(line) if in_queries else None
+            if match is not None:
+                defined.append(match.group(1))
+                if '(installed' in line:
+                    installed.append(match.group(1))
+        return defined, installed
+
+    # TigerGraphConnection * [str] -> GraphQueries
+    def ensure(self, conn, names=None):
+        """Start loading conn's graph catalog, installing any of names (default: all QUERIES) it lacks
+
+        Non-blocking: cheap once the graph is loaded"""
+        names = list(QUERIES.keys()) if names is None else names
+        now = time.time()
+        with self.lock:
+            graph = self.graphs.setdefault((conn.host, conn.graphname), GraphQueries())
+            missing = [
+                n for n in names
+                if n not in graph.installed and now - graph.checked.get(n, 0) >= self.RETRY_SECONDS]
+            if graph.loading or (graph.loaded.is_set() and not missing):
+                return graph
+            if graph.failed_at is not None and now - graph.failed_at < self.RETRY_SECONDS:
+                return graph
+            graph.loading = True
+            graph.loaded.clear()
+        threading.Thread(
+            target=self.load, args=(conn, graph, names), name='gak-tigergraph-catalog', daemon=True).start()
+        return graph
+
+    # TigerGraphConnection * [str] * ? float -> ()
+    def wait(self, conn, names, timeout=None):
+        """Block until names are installed on conn's graph, loading the catalog first if needed
+
+        Raises RuntimeError when they could not be installed, TimeoutError after timeout seconds,
+        default TIGERGRAPH_CATALOG_TIMEOUT_SECONDS"""
+        timeout = self.WAIT_SECONDS if timeout is None else timeout
+        graph = self.ensure(conn, names)
+        if not graph.loaded.wait(timeout):
+            raise TimeoutError(f'TigerGraph query catalog for {conn.graphname} not loaded after {timeout}s')
+        missing = [n for n in names if n not in graph.installed]
+        if len(missing) > 0:
+            raise RuntimeError(f'TigerGraph queries not installed on {conn.graphname}: {missing} ({graph.error})')
+
+    # TigerGraphConnection * str -> bool
+    def is_installed(self, conn, name):
+        graph = self.graphs.get((conn.host, conn.graphname))
+        return graph is not None and name in graph.installed
+
+    # TigerGraphConnection * GraphQueries * [str] -> ()
+    def load(self, conn, graph, names):
+        tic = time.perf_counter()
+        try:
+            defined, installed = self.parse_ls(conn.gsql(f'use graph {conn.graphname}\nls', options=[]))
+            to_create = [n for n in names if n not in defined and n in QUERIES]
+            to_install = [n for n in names if n not in installed and (n in defined or n in QUERIES)]
+            if len(to_install) > 0:
+                logger.info('Installing TigerGraph queries %s on %s', to_install, conn.graphname)
+                # one INSTALL compiles all the queries together
+                conn.gsql('\n'.join(
+                    [f'use graph {conn.graphname}']
+                    + [query_gsql(n, conn.graphname) for n in to_create]
+                    + [f'INSTALL QUERY {", ".join(to_install)}']), options=[])
+                defined, installed = self.parse_ls(conn.gsql(f'use graph {conn.graphname}\nls', options=[]))
+            with self.lock:
+                graph.defined = set(defined)
+                graph.installed = set(installed)
+                graph.checked.update({n: time.time() for n in names})
+                graph.error = None
+                graph.failed_at = None
+            logger.info('Loaded TigerGraph query catalog of %s in %0.2fs: %s',
+                        conn.graphname, time.perf_counter() - tic, sorted(graph.installed))
+        except BaseException as e:  # noqa: E722
+            # gsql() may sys.exit() on failures
+            logger.error('Failed loading TigerGraph query catalog of %s', conn.graphname, exc_info=True)
+            with self.lock:
+                graph.error = e
+                graph.failed_at = time.time()
+        finally:
+            with self.lock:
+                graph.loading = False
+                graph.loaded.set()
+
+    # () -> [ { 'host': str, 'graphname': str, 'installed': [str], 'loading': bool, 'error': ? str } ]
+    def status(self):
+        with self.lock:
+            return [{
+                'host': host,
+                'graphname': graphname,
+                'installed': sorted(graph.installed),
+                'loading': graph.loading,
+                'error': None if graph.error is None else str(graph.error)
+            } for (host, graphname), graph in self.graphs.items()]
+
+
+query_catalog = QueryCatalog()
+
+
+# Process-wide pool running independent installed queries concurrently, one REST++ request per worker
+#  A view submits its independent queries, or the cached functions running them, at once and then waits on
+#  their futures, so it waits for the slowest query instead of the sum of all of them.
+#  Sized by TIGERGRAPH_QUERY_WORKERS (default 8)
+class InstalledQueryRunner:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pool = None
+
+    def get_pool(self):
+        with self.lock:
+            if self.pool is None:
+                workers = int(os.environ.get('TIGERGRAPH_QUERY_WORKERS', '8'))
+                self.pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='gak-tigergraph-query')
+            return self.pool
+
+    @staticmethod
+    def run_one(conn, name, params, kwargs):
+        tic = time.perf_counter()
+        try:
+            return conn.runInstalledQuery(name, params, **kwargs)
+        finally:
+            logger.debug('TigerGraph query %s took %0.2fs', name, time.perf_counter() - tic)
+
+
+query_runner = InstalledQueryRunner()
+
+
 def connect_to_tigergraph() -> Optional[dict]:
     if ('TIGERGRAPH_HOST' in os.environ and 'TIGERGRAPH_USERNAME' in os.environ
         and 'TIGERGRAPH_PASSWORD' in os.environ and 'TIGERGRAPH_GRAPHNAME' in os.environ):
 
-        creds = {
-            'host': os.environ["TIGERGRAPH_HOST"],
-            'username': os.environ["TIGERGRAPH_USERNAME"],
-            'password': os.environ["TIGERGRAPH_PASSWORD"],
-            'graphname': os.environ["TIGERGRAPH_GRAPHNAME"]
-        }
-        logger.info('Connecting to TigerGraph using environment variables: %s',
-            {**creds,
-            'password': ''.join(['*' for x in creds['password']]) if creds['password'] is not None else ''})
-
-        conn = tg.TigerGraphConnection(**creds, version=TIGERGRAPH_CONNECTION_VERSION)
-
-        if ('TIGERGRAPH_SECRET' in os.environ and os.environ["TIGERGRAPH_SECRET"] is not None):
-            logger.info('... Connected to TG, getting token via provided secret...')
-            secret = os.environ["TIGERGRAPH_SECRET"]
-            conn.getToken(secret)
-        else:
-            # FIXME: This times out in practice, maybe TG 3.0 -> 3.1 version issues?
-            logger.info('... Connected to TG, creating secret and getting token...')
-            conn.getToken(conn.createSecret())
-
-        logger.info('Successfully finished connecting to TG!')
-        return conn
+        return connection_cache.get(
+            host=os.environ["TIGERGRAPH_HOST"],
+            graphname=os.environ["TIGERGRAPH_GRAPHNAME"],
+            username=os.environ["TIGERGRAPH_USERNAME"],
+            password=os.environ["TIGERGRAPH_PASSWORD"],
+            secret=os.environ.get("TIGERGRAPH_SECRET") or None)
 
     logger.debug("Missing TigerGraph environment variables; skipping connection")
     return None
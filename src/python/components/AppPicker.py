@@ -1,16 +1,239 @@
+import ast
 import importlib
-import logging, os
+import logging, os, sys, threading
 import streamlit as st
 from util import getChild
+from .Graphistry import GraphistrySt
+from .URLParam import URLParam
 
 logger = getChild(__name__)
 
+
+# Read a view's info() without importing it: parses views/<app>/__init__.py and evaluates
+#  `def info(): return {...}` when it only uses literals and module-level literal constants,
+#  e.g., {'id': app_id, 'name': 'x', 'tags': ['demo']}
+# Returns None whenever that is not statically knowable, so callers can fall back to importing
+class StaticViewInfo:
+
+    # ast.AST * {str -> 'a} -> 'a, or raises ValueError
+    @staticmethod
+    def eval_literal(node, consts):
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, ast.Name):
+            if node.id not in consts:
+                raise ValueError(f"Unknown name {node.id}")
+            return consts[node.id]
+        if isinstance(node, ast.List):
+            return [StaticViewInfo.eval_literal(v, consts) for v in node.elts]
+        if isinstance(node, ast.Tuple):
+            return tuple([StaticViewInfo.eval_literal(v, consts) for v in node.elts])
+        if isinstance(node, ast.Dict):
+            if any([k is None for k in node.keys]):
+                raise ValueError("Dict unpacking not supported")
+            return {
+                StaticViewInfo.eval_literal(k, consts): StaticViewInfo.eval_literal(v, consts)
+                for k, v in zip(node.keys, node.values)
+            }
+        raise ValueError(f"Unsupported expression {type(node).__name__}")
+
+    # ast.FunctionDef * {str -> 'a} -> dict, or raises ValueError
+    @staticmethod
+    def eval_info(fn, consts):
+        body = fn.body
+        if len(body) > 0 and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant):
+            body = body[1:]  # docstring
+        if fn.args.args or len(body) != 1 or not isinstance(body[0], ast.Return) or body[0].value is None:
+            raise ValueError("info() is not a single return statement")
+        out = StaticViewInfo.eval_literal(body[0].value, consts)
+        if not isinstance(out, dict):
+            raise ValueError("info() does not return a dict")
+        return out
+
+    # ast.Module -> {str -> 'a} * ? ast.FunctionDef * bool, or raises ValueError
+    @staticmethod
+    def scan_module(tree):
+        """Module-level literal constants, the info() definition if any, and whether run() is defined"""
+        consts = {}
+        info_fn = None
+        has_run = False
+        for node in tree.body:
+            if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+                name = node.targets[0].id
+                try:
+                    consts[name] = StaticViewInfo.eval_literal(node.value, consts)
+                except ValueError:
+                    consts.pop(name, None)
+            elif isinstance(node, ast.FunctionDef) and node.name == "info":
+                info_fn = node
+            elif isinstance(node, ast.FunctionDef) and node.name == "run":
+                has_run = True
+            elif isinstance(node, (ast.Import, ast.ImportFrom)):
+                if any([(alias.asname or alias.name) in ("info", "run") for alias in node.names]):
+                    raise ValueError("info() or run() bound by an import")  # only knowable by importing
+        return consts, info_fn, has_run
+
+    # str * str -> ? { 'name': str, 'id': str, 'tags': [str], 'view_folder': str }
+    @staticmethod
+    def read(view_path, view_folder):
+        init_path = os.path.join(view_path, view_folder, "__init__.py")
+        try:
+            with open(init_path, "r") as f:
+                tree = ast.parse(f.read(), filename=init_path)
+        except (OSError, SyntaxError, ValueError):
+            return None
+
+        try:
+            consts, info_fn, has_run = StaticViewInfo.scan_module(tree)
+            if not has_run:
+                return None
+            nfo = StaticViewInfo.eval_info(info_fn, consts) if info_fn is not None else {"name": view_folder}
+        except ValueError as e:
+            logger.debug("Cannot statically read info() of views/%s, will import: %s", view_folder, e)
+            return None
+        if "id" not in nfo and "name" not in nfo:
+            return None
+        return {
+            "name": view_folder,
+            "tags": [],
+            **nfo,
+            "id": nfo["id"] if "id" in nfo else nfo["name"],
+            "view_folder": view_folder,
+        }
+
+
+# Process-wide cache of views/<app> modules and their resolved info(), shared by all sessions and reruns
+#  entries are invalidated when the view folder or one of its top-level .py files changes mtime
+#  import failures are cached as well, so broken views are only retried once edited
+#  when lazy, info() is read statically and a view is only imported once it becomes active
+class ViewRegistry:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # view_folder -> {
+        #   'mtime': float,
+        #   'nfo': ? { 'name': str, 'id': str, 'tags': [str], 'view_folder': str, ?'module': Module },
+        #   'module': ? Module, 'failed': bool }
+        self.entries = {}
+
+    # str -> float
+    @staticmethod
+    def folder_mtime(folder_path):
+        mtime = os.stat(folder_path).st_mtime
+        with os.scandir(folder_path) as it:
+            for entry in it:
+                if entry.name.endswith(".py") and entry.is_file():
+                    mtime = max(mtime, entry.stat().st_mtime)
+        return mtime
+
+    # str -> [ str ]
+    @staticmethod
+    def list_view_folders(view_path):
+        with os.scandir(view_path) as it:
+            return sorted([
+                entry.name for entry in it
+                if entry.is_dir() and not entry.name.endswith("__pycache__")
+            ])
+
+    # str -> ? Module
+    @staticmethod
+    def import_view(view_folder):
+        mod_name = f"views.{view_folder}"
+        try:
+            if mod_name in sys.modules:
+                return importlib.reload(sys.modules[mod_name])
+            return importlib.import_module(mod_name)
+        except:  # noqa: E722
+            logger.error(
+                "Module loader ignoring file views/%s due to import failure; safe to ignore for .swp etc files",
+                view_folder,
+                exc_info=True,
+            )
+            return None
+
+    # str -> { 'nfo': ? { 'name': str, 'id': str, 'tags': [str], 'view_folder': str, 'module': Module }, ... }
+    def load(self, view_folder):
+        mod = self.import_view(view_folder)
+        if mod is None:
+            return {"nfo": None, "module": None, "failed": True}
+        if not hasattr(mod, "run"):
+            return {"nfo": None, "module": mod, "failed": False}
+        try:
+            nfo = mod.info() if hasattr(mod, "info") else {"name": view_folder}
+        except:  # noqa: E722
+            logger.error("Module loader ignoring views/%s due to info() failure", view_folder, exc_info=True)
+            return {"nfo": None, "module": mod, "failed": True}
+        mod_id = nfo["id"] if "id" in nfo else nfo["name"]
+        return {
+            "nfo": {
+                "name": view_folder,
+                "tags": [],
+                **nfo,
+                "id": mod_id,
+                "view_folder": view_folder,
+                "module": mod,
+            },
+            "module": mod,
+            "failed": False,
+        }
+
+    # str * bool -> [ { 'name': str, 'id': str, 'tags': [str], 'view_folder': str, ?'module': Module } ]
+    def get_views(self, view_path, lazy=False):
+        views = []
+        with self.lock:
+            view_folders = self.list_view_folders(view_path)
+            for view_folder in view_folders:
+                try:
+                    mtime = self.folder_mtime(os.path.join(view_path, view_folder))
+                except OSError:
+                    logger.debug("View folder %s disappeared during listing", view_folder)
+                    continue
+                entry = self.entries.get(view_folder)
+                if entry is None or entry["mtime"] != mtime:
+                    logger.debug("(Re)loading view %s (mtime %s, lazy %s)", view_folder, mtime, lazy)
+                    nfo = StaticViewInfo.read(view_path, view_folder) if lazy else None
+                    if nfo is None:
+                        entry = {"mtime": mtime, **self.load(view_folder)}
+                    else:
+                        entry = {"mtime": mtime, "nfo": nfo, "module": None, "failed": False}
+                    self.entries[view_folder] = entry
+                if entry["nfo"] is not None:
+                    views.append(entry["nfo"])
+            for view_folder in set(self.entries.keys()) - set(view_folders):
+                del self.entries[view_folder]
+        return views
+
+    # { 'view_folder': str, ... } -> ? Module
+    def get_module(self, nfo):
+        if "module" in nfo:
+            return nfo["module"]
+        view_folder = nfo["view_folder"]
+        with self.lock:
+            entry = self.entries.get(view_folder)
+            if entry is None:
+                return None
+            if entry["module"] is None and not entry["failed"]:
+                logger.debug("Importing active view %s", view_folder)
+                entry["module"] = self.import_view(view_folder)
+                entry["failed"] = entry["module"] is None
+            return entry["module"]
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+
+
+view_registry = ViewRegistry()
+
 # loads all views/<app>/__init__.py and tracks active as URL param "?view_index=<info()['id']>"
 #  includes modules with methods run()
 #  and excludes if ('enabled' in info() and info()['enabled'] == False)
 class AppPicker:
     VIEW_APP_ID_VAR = "view_index"
 
+    # "static": read info() without importing, import only the active view; "import": import all views upfront
+    VIEW_DISCOVERY = os.environ.get("VIEW_DISCOVERY", "static").strip().lower()
+
     # include: if non-empty, include if any tags match
     # exclude: exclude if any tag matches
     def __init__(self, include=[], exclude=[]):
@@ -36,55 +259,14 @@ class AppPicker:
 
     # () -> {'id' -> { 'name': str, 'id': str, 'module': Module } }
     def list_modules(self):
-        
-        # tcook - debug logger issues and prints to stdout
-        # print("func: print(flush=True) in list_modules()", flush=True)
-        # print("func: print(NO flush) in list_modules()")
-        # logger.info("logger.INFO() msg in list_modules()")
-        # logger.error("logger.ERROR() msg in list_modules()")
-        # logger.debug("logger.DEBUG() msg in list_modules()")
-        # print(f"func: print() call LOG_LEVEL={os.getenv('LOG_LEVEL')}", flush=True)
-
-        # tcook: does not affect newlines issues in logger
-        # for handler in logger.handlers:
-        #     handler.flush()
-
         modules_by_id = {}
         view_path = os.environ.get("VIEW_PATH", "/apps/views")
-        for view_folder in sorted([view.split("/")[-1] for (view, _, _) in os.walk(view_path) if view != view_path and not view.endswith("__pycache__")]):
-            try:
-                mod = importlib.import_module(f"views.{view_folder}")
-                if hasattr(mod, "run"):
-                    nfo = mod.info() if hasattr(mod, "info") else {"name": view_folder}
-                    mod_id = nfo["id"] if "id" in nfo else nfo["name"]
-                    nfo_resolved = {
-                        "name": view_folder,
-                        "tags": [],
-                        **nfo,
-                        "id": mod_id,
-                        "module": mod,
-                    }
-                    if self.check_included(nfo_resolved):
-                        modules_by_id[mod_id] = nfo_resolved
-            except:  # noqa: E722
-
-                # tcook - debug logger issues and prints to stdout
-                # print("exception caught in list_modules()", flush=True)
-                # print("func: list_modules() 222222", flush=True)
-                # logger.info("logger.INFO msg in list_modules() 222222")
-                # logger.error("logger.ERROR msg in list_modules() 222222")
-                # logger.debug("logger.DEBUG msg in list_modules() 222222")
-                # print(f"check: LOG_LEVEL={os.getenv('LOG_LEVEL')}", flush=True)
-
-                logger.error(
-                    "Module loader ignoring file views/%s due to import failure; safe to ignore for .swp etc files",
-                    view_folder,
-                    exc_info=True,
-                )
-
-                # tcook: does not affect newlines issues in logger
-                # for handler in logger.handlers:
-                #     handler.flush()
+        lazy = self.VIEW_DISCOVERY != "import"
+        for nfo in view_registry.get_views(view_path, lazy=lazy):
+            # copy so per-picker fields like "index" do not leak into the shared registry
+            nfo_resolved = {**nfo}
+            if self.check_included(nfo_resolved):
+                modules_by_id[nfo_resolved["id"]] = nfo_resolved
 
         sorted_mods = sorted(modules_by_id.values(), key=lambda nfo: nfo["id"])
         for i in range(len(sorted_mods)):
@@ -96,13 +278,14 @@ class AppPicker:
         maybe_default_view_id = query_params[self.VIEW_APP_ID_VAR] if self.VIEW_APP_ID_VAR in query_params else None
         return maybe_default_view_id
 
-    # () -> ? { 'name': str, 'id': str, 'module': Module }
-    def get_and_set_active_app(self):
+    # ? {'id' -> { 'name': str, 'id': str, 'module': Module } } -> ? { 'name': str, 'id': str, 'module': Module }
+    def get_and_set_active_app(self, modules_by_id=None):
         query_params = st.query_params.to_dict()
         maybe_default_view_id = self.get_maybe_active_view_id(query_params)
         logger.debug("url view id: %s", maybe_default_view_id)
 
-        modules_by_id = self.list_modules()
+        if modules_by_id is None:
+            modules_by_id = self.list_modules()
         # logger.debug("loaded mods: %s", modules_by_id)
 
         view = None
@@ -140,7 +323,7 @@ class AppPicker:
 
     def load_active_app(self):
         mods = self.list_modules()
-        view = self.get_and_set_active_app()
+        view = self.get_and_set_active_app(mods)
 
         if len(mods.keys()) == 0:
             st.sidebar.header("No modules found")
@@ -152,7 +335,15 @@ class AppPicker:
             st.sidebar.title(view["name"])
 
         if not (view is None):
+            mod = view_registry.get_module(view)
+            if mod is None:
+                st.error(f"Failed to load view {view['name']}, see server logs")
+                return view
+            view["module"] = mod
             logger.info("running mod: %s / %s", view, view["module"])
-            view["module"].run()
+            # one merged query string write per run instead of one per URLParam.set_field(),
+            #  and iframes of GraphistrySt.plot_async() uploads swapped in once the rest of the view rendered
+            with URLParam.batch(), GraphistrySt.deferred_renders():
+                view["module"].run()
 
         return view
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+
+from util import getChild
+
+logger = getChild(__name__)
+
+
+# Shrink a graph to an edge and/or byte budget before uploading, vectorized in pandas/numpy
+#  Strategies:
+#   - 'degree' (default): local degree sparsification. Every node keeps its strongest
+#     (by weight, else random) ~deg^alpha edges, with alpha picked to meet the budget,
+#     so hubs are thinned while leaves and small neighborhoods stay connected
+#   - 'top_k': the budget's heaviest edges by weight (random sample without a weight)
+#   - 'components': whole connected components, largest first; the first component
+#     that does not fit is itself reduced with 'degree'
+class GraphReducer:
+    STRATEGIES = ["degree", "top_k", "components"]
+
+    # ? int * ? int * str * ? str * int -> ()
+    def __init__(self, max_edges=None, max_bytes=None, strategy="degree", weight=None, seed=42):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown strategy {strategy}, expected one of {self.STRATEGIES}")
+        self.max_edges = max_edges
+        self.max_bytes = max_bytes
+        self.strategy = strategy
+        self.weight = weight
+        self.seed = seed
+        # { 'strategy': str, 'budget': int, 'edges_before': int, 'edges_after': int, 'nodes_before': int, 'nodes_after': int }
+        self.report = {}
+
+    # pd.DataFrame -> int
+    def budget(self, edges_df):
+        budget = len(edges_df) if self.max_edges is None else min(len(edges_df), self.max_edges)
+        if self.max_bytes is not None and len(edges_df) > 0:
+            bytes_per_edge = edges_df.memory_usage(deep=True, index=True).sum() / len(edges_df)
+            budget = min(budget, int(self.max_bytes / max(bytes_per_edge, 1)))
+        return max(budget, 0)
+
+    # pd.DataFrame * str * str * ? pd.DataFrame * ? str -> pd.DataFrame * ? pd.DataFrame
+    def reduce(self, edges_df, src, dst, nodes_df=None, node=None):
+        """Return edges_df reduced to the budget, and nodes_df restricted to their endpoints
+
+        Row order, columns and dtypes are preserved; inputs within budget are returned as-is"""
+        budget = self.budget(edges_df)
+        self.report = {
+            "strategy": self.strategy,
+            "budget": budget,
+            "edges_before": len(edges_df),
+            "edges_after": len(edges_df),
+            "nodes_before": None if nodes_df is None else len(nodes_df),
+            "nodes_after": None if nodes_df is None else len(nodes_df),
+        }
+        if len(edges_df) <= budget:
+            return edges_df, nodes_df
+
+        codes, uniques = pd.factorize(pd.concat([edges_df[src], edges_df[dst]], ignore_index=True))
+        s, d = codes[:len(edges_df)], codes[len(edges_df):]
+        if self.strategy == "top_k":
+            keep = self.top_k(edges_df, budget)
+        elif self.strategy == "components":
+            keep = self.components(edges_df, s, d, len(uniques), budget)
+        else:
+            keep = self.degree(edges_df, s, d, len(uniques), budget)
+
+        mask = np.zeros(len(edges_df), dtype=bool)
+        mask[keep] = True
+        out_edges = edges_df[mask]
+        out_nodes = nodes_df
+        if nodes_df is not None and node is not None:
+            endpoints = pd.concat([out_edges[src], out_edges[dst]]).unique()
+            out_nodes = nodes_df[nodes_df[node].isin(endpoints)]
+
+        self.report["edges_after"] = len(out_edges)
+        self.report["nodes_after"] = None if out_nodes is None else len(out_nodes)
+        logger.info("Reduced graph: %s", self.report)
+        return out_edges, out_nodes
+
+    # pd.DataFrame -> np.array
+    # Edge positions, best first: by descending weight, else a seeded random order
+    def order(self, edges_df):
+        if self.weight is not None and self.weight in edges_df:
+            w = pd.to_numeric(edges_df[self.weight], errors="coerce").fillna(-np.inf).to_numpy()
+            return np.argsort(-w, kind="stable")
+        return np.random.default_rng(self.seed).permutation(len(edges_df))
+
+    def top_k(self, edges_df, budget):
+        return self.order(edges_df)[:budget]
+
+    def degree(self, edges_df, s, d, num_nodes, budget, candidates=None):
+        order = self.order(edges_df)
+        if candidates is not None:
+            order = order[np.isin(order, candidates)]
+        so, do = s[order], d[order]
+        deg = np.bincount(so, minlength=num_nodes) + np.bincount(do, minlength=num_nodes)
+
+        # rank of each edge among its endpoint's edges, strongest first
+        rank_s = pd.Series(so).groupby(so).cumcount().to_numpy()
+        rank_d = pd.Series(do).groupby(do).cumcount().to_numpy()
+
+        # the edge survives alpha iff rank < deg^alpha at either endpoint: smallest such alpha
+        def critical_alpha(rank, node_deg):
+            with np.errstate(divide="ignore", invalid="ignore"):
+                alpha = np.log(rank + 1) / np.log(np.maximum(node_deg, 2))
+            return np.where(rank == 0, 0.0, alpha)
+
+        alpha = np.minimum(critical_alpha(rank_s, deg[so]), critical_alpha(rank_d, deg[do]))
+        return order[np.argsort(alpha, kind="stable")[:budget]]
+
+    def components(self, edges_df, s, d, num_nodes, budget):
+        edge_labels = connected_components(s, d, num_nodes)[s]
+        sizes = np.bincount(edge_labels, minlength=num_nodes)
+        by_size = np.argsort(-sizes, kind="stable")
+        fits = np.cumsum(sizes[by_size]) <= budget
+        whole = by_size[fits]
+        keep = np.flatnonzero(np.isin(edge_labels, whole))
+        remaining = budget - len(keep)
+        if remaining > 0 and not fits.all():
+            partial = np.flatnonzero(edge_labels == by_size[len(whole)])
+            keep = np.concatenate([keep, self.degree(edges_df, s, d, num_nodes, remaining, candidates=partial)])
+        return keep
+
+
+# np.array int * np.array int * int -> np.array int
+def connected_components(s, d, num_nodes):
+    """Component label (smallest member id) per node, by min-label propagation with pointer jumping"""
+    labels = np.arange(num_nodes)
+    # labels only decrease and never exceed their node id, so this terminates
+    while True:
+        prev = labels
+        labels = labels.copy()
+        np.minimum.at(labels, s, prev[d])
+        np.minimum.at(labels, d, prev[s])
+        # pointer jumping: adopt the label of your label
+        labels = labels[labels]
+        if np.array_equal(labels, prev):
+            return labels
@@ -1,11 +1,17 @@
-import os
+import base64, json, os, threading, time, uuid
 import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
 import graphistry
 import streamlit.components.v1 as components
 from graphistry import PyGraphistry
 import streamlit as st
 
 from util import getChild
+from .PlotCache import plot_cache
 
 logger = getChild(__name__)
 
@@ -32,7 +38,307 @@ def set_graphistry_privacy_mode():
         logger.info(f"GRAPHISTRY_DEFAULT_PRIVACY not set. Defaulting to privacy mode private for visualization.")
         graphistry.privacy(mode="private")
 
+
+# Process-wide Graphistry session shared by all users and reruns
+#  Authenticates once per distinct cfg, caches the JWT with its expiry (from its 'exp' claim),
+#  and refreshes it on a daemon timer GRAPHISTRY_REFRESH_MARGIN_SECONDS before it expires,
+#  falling back to a full re-register when the refresh is rejected
+class GraphistryTokenManager:
+    REFRESH_MARGIN_SECONDS = float(os.environ.get("GRAPHISTRY_REFRESH_MARGIN_SECONDS", "300"))
+    # for tokens without a readable 'exp' claim
+    DEFAULT_TTL_SECONDS = float(os.environ.get("GRAPHISTRY_TOKEN_TTL_SECONDS", "3600"))
+    # minimum delay between failed logins, and between refreshes
+    RETRY_SECONDS = 30
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.cfg_key = None
+        self.cfg = None
+        self.token = None
+        self.expires_at = 0.0
+        self.failed_at = None
+        self.timer = None
+
+    @staticmethod
+    def token_expiry(token):
+        """Read the 'exp' claim of a JWT without verifying it, or None"""
+        try:
+            payload = token.split(".")[1]
+            claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+            return float(claims["exp"])
+        except Exception:  # noqa: E722
+            return None
+
+    # {str -> 'a} -> bool
+    def ensure(self, cfg):
+        """Register cfg unless a live token for it is already cached; cheap when hot"""
+        cfg_key = tuple(sorted(cfg.items()))
+        with self.lock:
+            if self.cfg_key == cfg_key:
+                if self.is_valid():
+                    return True
+                if self.failed_at is not None and time.time() - self.failed_at < self.RETRY_SECONDS:
+                    return False
+            self.cfg_key = cfg_key
+            self.cfg = cfg
+            return self.register()
+
+    def is_valid(self):
+        return self.token is not None and time.time() < self.expires_at
+
+    def register(self):
+        with self.lock:
+            try:
+                graphistry.register(**self.cfg)
+                self.remember(PyGraphistry._config["api_token"])
+            except Exception:  # noqa: E722
+                logger.warning("Graphistry registration failed", exc_info=True)
+                self.remember(None)
+            return self.token is not None
+
+    def refresh(self):
+        with self.lock:
+            token = None
+            try:
+                token = PyGraphistry.refresh(fail_silent=True)
+            except Exception:  # noqa: E722
+                logger.debug("Graphistry token refresh failed", exc_info=True)
+            if token is None:
+                logger.info("Graphistry token refresh failed, registering again")
+                self.register()
+            else:
+                logger.debug("Graphistry token refreshed")
+                self.remember(token)
+
+    def remember(self, token):
+        self.token = token
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if token is None:
+            # next ensure() retries, throttled
+            self.expires_at = 0.0
+            self.failed_at = time.time()
+            return
+        self.failed_at = None
+        expiry = self.token_expiry(token)
+        self.expires_at = expiry if expiry is not None else time.time() + self.DEFAULT_TTL_SECONDS
+        delay = max(self.RETRY_SECONDS, self.expires_at - time.time() - self.REFRESH_MARGIN_SECONDS)
+        logger.debug("Graphistry token valid for %0.0fs, refreshing in %0.0fs", self.expires_at - time.time(), delay)
+        self.timer = threading.Timer(delay, self.refresh)
+        self.timer.name = "gak-graphistry-refresh"
+        self.timer.daemon = True
+        self.timer.start()
+
+
+token_manager = GraphistryTokenManager()
+
+
+# Pre-upload stage shrinking the node/edge frames of a Plottable, see GraphistrySt.plot_url()
+#  - with keep_columns, drops columns not referenced by bindings or encodings, except those listed
+#  - dictionary-encodes repeated strings (pandas category -> arrow dictionary)
+#  - downcasts integers, and floats when lossless
+#  Bound id columns (source, destination, node, edge) keep their values and dtypes
+#  Opt-in (GRAPHISTRY_MINIMIZE=1), as the uploaded dtypes change, ex: category, int8, float32
+class PayloadMinimizer:
+    MINIMIZE_VAR = "GRAPHISTRY_MINIMIZE"
+    ID_FIELDS = ["_source", "_destination", "_node", "_edge"]
+    # dictionary-encode string columns with at most this many distinct values per row
+    DICTIONARY_MAX_RATIO = 0.5
+
+    # ? [str] -> ()
+    def __init__(self, keep_columns=None):
+        self.keep_columns = None if keep_columns is None else sorted(set(keep_columns))
+        # { 'nodes' | 'edges': { 'bytes_before': int, 'bytes_after': int, 'dropped': [str] } }
+        self.report = {}
+
+    @classmethod
+    def is_enabled(cls):
+        return os.environ.get(cls.MINIMIZE_VAR, "").strip().lower() in ("1", "true", "yes", "on")
+
+    # () -> {str -> 'a}, for PlotCache keys
+    def variant(self):
+        return {"minimize": True, "keep_columns": self.keep_columns}
+
+    @classmethod
+    def referenced_columns(cls, g):
+        out = set()
+        for k, v in vars(g).items():
+            if isinstance(v, str) and (k in cls.ID_FIELDS or k.startswith("_point_") or k.startswith("_edge_")):
+                out.add(v)
+
+        def walk(encodings):
+            if isinstance(encodings, dict):
+                for k, v in encodings.items():
+                    if k == "attribute" and isinstance(v, str):
+                        out.add(v)
+                    else:
+                        walk(v)
+
+        walk(g._complex_encodings)
+        return out
+
+    def minimize_frame(self, df, referenced, ids):
+        if not isinstance(df, pd.DataFrame):
+            return df, None
+        before = int(df.memory_usage(deep=True, index=True).sum())
+
+        dropped = []
+        if self.keep_columns is not None:
+            dropped = [c for c in df.columns if c not in referenced and c not in self.keep_columns]
+            df = df.drop(columns=dropped)
+
+        compact = {}
+        for c in df.columns:
+            if c not in ids:
+                s = self.compact_series(df[c])
+                if s is not None:
+                    compact[c] = s
+        if len(compact) > 0:
+            df = df.assign(**compact)
+
+        after = int(df.memory_usage(deep=True, index=True).sum())
+        return df, {"bytes_before": before, "bytes_after": after, "dropped": dropped}
+
+    # pd.Series -> ? pd.Series
+    def compact_series(self, s):
+        """Lossless smaller dtype for s, or None: categories for repetitive strings, downcast ints, exact float32s"""
+        if isinstance(s.dtype, pd.StringDtype) \
+                or (s.dtype.name == "object" and pd.api.types.infer_dtype(s, skipna=True) == "string"):
+            if s.nunique(dropna=True) <= len(s) * self.DICTIONARY_MAX_RATIO:
+                return s.astype("category")
+        elif pd.api.types.is_integer_dtype(s.dtype) and not pd.api.types.is_bool_dtype(s.dtype):
+            return pd.to_numeric(s, downcast="integer")
+        elif s.dtype.name == "float64":
+            s32 = s.astype("float32")
+            if np.array_equal(s32.to_numpy(dtype="float64"), s.to_numpy(), equal_nan=True):
+                return s32
+        return None
+
+    # Plottable -> Plottable
+    def __call__(self, g):
+        tic = time.perf_counter()
+        referenced = self.referenced_columns(g)
+        ids = set([v for v in [getattr(g, k, None) for k in self.ID_FIELDS] if isinstance(v, str)])
+        nodes, self.report["nodes"] = self.minimize_frame(g._nodes, referenced, ids)
+        edges, self.report["edges"] = self.minimize_frame(g._edges, referenced, ids)
+        out = g
+        if nodes is not g._nodes:
+            out = out.nodes(nodes)
+        if edges is not g._edges:
+            out = out.edges(edges)
+        sizes = {
+            k: f"{r['bytes_before']:,} -> {r['bytes_after']:,} bytes, dropped {len(r['dropped'])} columns"
+            for k, r in self.report.items() if r is not None
+        }
+        logger.info("Minimized upload payload in %0.3fs: %s", time.perf_counter() - tic, sizes)
+        return out
+
+
+# Process-wide pool for non-blocking uploads, see GraphistrySt.plot_async()
+#  Uploads of the same content (PlotCache.key) share one future, so reruns and other sessions
+#  wait on the upload already in flight instead of starting another; completed URLs are kept
+#  for the last MAX_FUTURES graphs, and failed uploads are forgotten so the next call retries
+class AsyncUploader:
+    MAX_FUTURES = 128
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pool = None
+        self.futures = OrderedDict()
+        self.seconds = {}  # key -> seconds its upload took, for the keys in futures
+
+    def get_pool(self):
+        if self.pool is None:
+            workers = int(os.environ.get("GRAPHISTRY_UPLOAD_WORKERS", "4"))
+            self.pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="gak-upload")
+        return self.pool
+
+    # Plottable * ? PayloadMinimizer * {str -> 'a} * ? str -> Future str
+    def submit(self, g, minimizer, plot_kwargs, key=None):
+        """Upload g on a worker, sharing the future of any upload with the same key, see GraphistrySt.upload_key()"""
+        if key is None:
+            variant = None if minimizer is None else minimizer.variant()
+            key = plot_cache.key(g, plot_kwargs, variant) or str(uuid.uuid4())
+        with self.lock:
+            if key in self.futures:
+                self.futures.move_to_end(key)
+                return self.futures[key]
+            future = self.get_pool().submit(self.upload, key, g, minimizer, plot_kwargs)
+            self.futures[key] = future
+            while len(self.futures) > self.MAX_FUTURES:
+                old_key, _ = self.futures.popitem(last=False)
+                self.seconds.pop(old_key, None)
+        future.add_done_callback(lambda f: self.forget_failed(key, f))
+        return future
+
+    def forget_failed(self, key, future):
+        if future.exception() is not None:
+            with self.lock:
+                if self.futures.get(key) is future:
+                    del self.futures[key]
+
+    def upload(self, key, g, minimizer, plot_kwargs):
+        tic = time.perf_counter()
+        url = GraphistrySt.upload(g, minimizer, plot_kwargs)
+        seconds = time.perf_counter() - tic
+        with self.lock:
+            self.seconds[key] = seconds
+        logger.debug("Uploaded in %0.2fs: %s", seconds, url)
+        return url
+
+    # str -> ? float
+    def upload_seconds(self, key):
+        with self.lock:
+            return self.seconds.get(key)
+
+
+uploader = AsyncUploader()
+
+
+class PlotHandle:
+    """Placeholder for an upload started by GraphistrySt.plot_async(), see render()"""
+
+    def __init__(self, gst, key, future, placeholder):
+        self.gst = gst
+        self.key = key
+        self.future = future
+        self.placeholder = placeholder
+        self.rendered = False
+        # whether the upload already finished, ex: in an earlier rerun, when the placeholder was rendered
+        self.reused = future.done()
+
+    def done(self):
+        return self.future.done()
+
+    # ? float -> str
+    def url(self, timeout=None):
+        return self.future.result(timeout=timeout)
+
+    # () -> ? float
+    def upload_seconds(self):
+        """Seconds the upload itself took, once done, excluding any wait for a worker or for render()"""
+        return uploader.upload_seconds(self.key)
+
+    def render(self):
+        """Wait for the upload and swap the iframe into the placeholder; idempotent"""
+        if self.rendered:
+            return
+        self.rendered = True
+        try:
+            url = self.url()
+        except Exception as e:
+            logger.error("Graphistry upload failed", exc_info=True)
+            self.placeholder.error(f"Graphistry upload failed: {e}")
+            return
+        with self.placeholder.container():
+            self.gst.render_url(url)
+
+
 class GraphistrySt:
+    # Per script-thread list of PlotHandles still to render, see deferred_renders()
+    _local = threading.local()
+
     def __init__(self, overrides={}):
         self.cfg = {
             "api": 3,
@@ -48,12 +354,14 @@ class GraphistrySt:
             ),
             **overrides,
         }
-        if not (("username" in self.cfg) and ("password" in self.cfg)) and not ("token" in self.cfg):
+        self.has_creds = (("username" in self.cfg) and ("password" in self.cfg)) or ("token" in self.cfg)
+        if not self.has_creds:
             logger.info("No graphistry creds set, skipping")
             return
         if not ("store_token_creds_in_memory" in self.cfg):
             self.cfg["store_token_creds_in_memory"] = True
-        graphistry.register(**self.cfg) 
+        if not token_manager.ensure(self.cfg):
+            logger.warning("Graphistry login failed")
         set_graphistry_privacy_mode()
 
     def render_url(self, url):
@@ -63,9 +371,76 @@ class GraphistrySt:
             # st.markdown(iframe, unsafe_allow_html=True)
             components.iframe(src=url, height=800, scrolling=True)
 
+    # ? [str] * bool -> ? PayloadMinimizer
+    @staticmethod
+    def minimizer(keep_columns=None, minimize=True):
+        return PayloadMinimizer(keep_columns) if minimize and PayloadMinimizer.is_enabled() else None
+
+    # Plottable * ? PayloadMinimizer * {str -> 'a} -> str
+    @staticmethod
+    def upload(g, minimizer, plot_kwargs):
+        if minimizer is None:
+            return plot_cache.plot(g, **plot_kwargs)
+        return plot_cache.plot(g, prepare=minimizer, variant=minimizer.variant(), **plot_kwargs)
+
+    # Plottable * ? [str] * bool -> str
+    # Upload g, or with PLOT_CACHE=1, reuse the URL of an identical earlier upload
+    #  With GRAPHISTRY_MINIMIZE=1, the payload is minimized first, see PayloadMinimizer: pass keep_columns to also drop
+    #  columns not bound or encoded, except those worth inspecting in the visualization
+    def plot_url(self, g, keep_columns=None, minimize=True, **plot_kwargs):
+        return self.upload(g, self.minimizer(keep_columns, minimize), plot_kwargs)
+
+    # Plottable * ? [str] * bool -> str
+    # Identity of g's upload for upload_async()/plot_async(): its content hash, else a fresh id.
+    #  Compute it along with g, ex: in a cached run_filters, so reruns share one upload without rehashing
+    def upload_key(self, g, keep_columns=None, minimize=True, **plot_kwargs):
+        minimizer = self.minimizer(keep_columns, minimize)
+        variant = None if minimizer is None else minimizer.variant()
+        return plot_cache.key(g, plot_kwargs, variant) or str(uuid.uuid4())
+
+    # Plottable * ? [str] * bool * ? str -> Future str
+    # Start uploading g on a worker thread, without rendering; also usable outside a script run
+    def upload_async(self, g, keep_columns=None, minimize=True, key=None, **plot_kwargs):
+        if key is None:
+            key = self.upload_key(g, keep_columns, minimize, **plot_kwargs)
+        return uploader.submit(g, self.minimizer(keep_columns, minimize), plot_kwargs, key)
+
+    # Plottable * ? [str] * bool * ? str -> ? PlotHandle
+    # Render a placeholder now and start uploading g on a worker thread, so the rest of the view
+    #  renders while it uploads. handle.render() later waits for the URL and swaps in the iframe;
+    #  inside deferred_renders() (AppPicker runs each view in one), handles not yet rendered are at its end
+    def plot_async(self, g, keep_columns=None, minimize=True, key=None, **plot_kwargs):
+        if not self.test_login():
+            return None
+        if key is None:
+            key = self.upload_key(g, keep_columns, minimize, **plot_kwargs)
+        future = uploader.submit(g, self.minimizer(keep_columns, minimize), plot_kwargs, key)
+        placeholder = st.empty()
+        if not future.done():
+            placeholder.info("Uploading graph to Graphistry...")
+        handle = PlotHandle(self, key, future, placeholder)
+        pending = getattr(GraphistrySt._local, "pending", None)
+        if pending is not None:
+            pending.append(handle)
+        return handle
+
+    @staticmethod
+    @contextmanager
+    def deferred_renders():
+        if getattr(GraphistrySt._local, "pending", None) is not None:
+            yield
+            return
+        GraphistrySt._local.pending = []
+        try:
+            yield
+            for handle in GraphistrySt._local.pending:
+                handle.render()
+        finally:
+            GraphistrySt._local.pending = None
+
     def plot(self, g):
-        if PyGraphistry._is_authenticated:
-            url = g.plot(as_files=True, render=False)  # TODO: Remove as_files=True when becomes default
+        if self.test_login(verbose=False) and PyGraphistry._is_authenticated:
+            url = self.plot_url(g, as_files=True)  # TODO: Remove as_files=True when becomes default
             self.render_url(url)
         else:
             st.markdown(
@@ -76,8 +451,8 @@ class GraphistrySt:
 
     def test_login(self, verbose=True):
         try:
-            graphistry.register(**self.cfg)
-            if PyGraphistry._config["api_token"] is None:
+            # in-memory check unless the cached token is missing or expired
+            if not self.has_creds or not token_manager.ensure(self.cfg):
                 raise Exception("Graphistry username and/or password not found.") 
             return True
         except:  # noqa: E722
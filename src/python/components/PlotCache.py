@@ -0,0 +1,109 @@
+import hashlib, json, os, threading
+import pandas as pd
+from graphistry import PyGraphistry
+
+from util import getChild, SqliteKVStore
+
+logger = getChild(__name__)
+
+
+# Opt-in (PLOT_CACHE=1) persistent cache of Graphistry dataset URLs, keyed by content
+#  The key hashes the node/edge frames (values, columns, dtypes), the plotter's bindings,
+#  encodings and settings, the plot() arguments, and the target server/org/user/privacy,
+#  so an identical graph reuses its existing dataset URL instead of being re-uploaded,
+#  across sessions, processes and restarts sharing PLOT_CACHE_PATH
+class PlotCache:
+    PLOT_CACHE_VAR = "PLOT_CACHE"
+
+    # Plotter fields that never affect the upload, or are the frames hashed separately
+    IGNORED_FIELDS = ["_pygraphistry", "session", "_nodes", "_edges", "_protocol"]
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.store = None
+        self.stats = {"hits": 0, "misses": 0, "uncacheable": 0}
+
+    @classmethod
+    def is_enabled(cls):
+        return os.environ.get(cls.PLOT_CACHE_VAR, "").strip().lower() in ("1", "true", "yes", "on")
+
+    # () -> SqliteKVStore
+    def get_store(self):
+        with self.lock:
+            if self.store is None:
+                self.store = SqliteKVStore(
+                    os.environ.get("PLOT_CACHE_PATH", "/tmp/gak/plot_cache.sqlite"),
+                    max_bytes=int(os.environ.get("PLOT_CACHE_MAX_BYTES", str(16 * 1024 * 1024))),
+                    ttl_seconds=float(os.environ.get("PLOT_CACHE_TTL_DAYS", "7")) * 24 * 60 * 60)
+            return self.store
+
+    @staticmethod
+    def hash_frame(h, df):
+        if df is None:
+            h.update(b"none")
+            return
+        h.update(json.dumps([[str(c), str(t)] for c, t in df.dtypes.items()]).encode("utf-8"))
+        h.update(str(len(df)).encode("utf-8"))
+        if hasattr(df, "hash_values"):  # cudf
+            row_hashes = df.hash_values().values_host
+        else:
+            row_hashes = pd.util.hash_pandas_object(df, index=True).values
+        h.update(row_hashes.tobytes())
+
+    # Plottable * {str -> 'a} * ? 'b -> ? str
+    def key(self, g, plot_kwargs, variant=None):
+        """Content hash for g.plot(**plot_kwargs), or None when some field cannot be hashed
+
+        variant: JSON-able description of any preprocessing applied before upload"""
+        settings = {k: v for k, v in vars(g).items() if k not in self.IGNORED_FIELDS and v is not None}
+        session = PyGraphistry.session
+        target = {
+            "protocol": session.protocol,
+            "hostname": session.hostname,
+            "client_protocol_hostname": session.client_protocol_hostname,
+            "org_name": session.org_name,
+            "privacy": session.privacy,
+            "username": os.environ.get("GRAPHISTRY_USERNAME"),
+        }
+        try:
+            h = hashlib.blake2b(digest_size=20)
+            h.update(json.dumps([settings, plot_kwargs, target, variant], sort_keys=True).encode("utf-8"))
+            self.hash_frame(h, g._nodes)
+            self.hash_frame(h, g._edges)
+        except (TypeError, ValueError):
+            # ex: list-valued columns, fitted models
+            logger.debug("Plot not cacheable", exc_info=True)
+            return None
+        return h.hexdigest()
+
+    # Plottable * ? (Plottable -> Plottable) * ? 'a * {str -> 'b} -> str
+    def plot(self, g, prepare=None, variant=None, **plot_kwargs):
+        """g.plot(render=False, **plot_kwargs), reusing the URL of an identical earlier upload
+
+        prepare: optional transform run on g just before uploading, so skipped on hits; describe it in variant"""
+        def upload():
+            return (g if prepare is None else prepare(g)).plot(render=False, **plot_kwargs)
+
+        if not self.is_enabled():
+            return upload()
+        key = self.key(g, plot_kwargs, variant)
+        if key is None:
+            self.stats["uncacheable"] += 1
+            return upload()
+
+        store = self.get_store()
+        url = store.get(key)
+        if url is not None:
+            self.stats["hits"] += 1
+            logger.debug("Plot cache hit %s: %s (%s)", key, url, self.stats)
+            return url
+
+        self.stats["misses"] += 1
+        url = upload()
+        if isinstance(url, str):
+            store.put(key, url)
+        logger.debug("Plot cache miss %s: %s (%s)", key, url, self.stats)
+        return url
+
+
+plot_cache = PlotCache()
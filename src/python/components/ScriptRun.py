@@ -0,0 +1,25 @@
+try:
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    from streamlit.runtime.scriptrunner_utils.script_requests import ScriptRequestType
+except ImportError:  # older streamlit: never superseded
+    get_script_run_ctx = None
+    ScriptRequestType = None
+
+
+# Lets long blocking work in a script run, ex: Neptune queries, give up once a newer run supersedes it
+#  Streamlit only interrupts a run at its next st.* call, so without this, a query started for an
+#  intermediate slider value runs to completion before the run for the final value can even start
+class ScriptRun:
+
+    # () -> (() -> bool)
+    @staticmethod
+    def superseded_check():
+        """Predicate for the calling script run: whether a rerun or stop is pending for its session
+
+        Always false outside a script run, ex: in warmup threads"""
+        ctx = None if get_script_run_ctx is None else get_script_run_ctx(suppress_warning=True)
+        requests = getattr(ctx, "script_requests", None)
+        if requests is None:
+            return lambda: False
+        # No public API for pending requests: peek at the state without consuming the request
+        return lambda: getattr(requests, "_state", ScriptRequestType.CONTINUE) != ScriptRequestType.CONTINUE
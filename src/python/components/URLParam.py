@@ -1,21 +1,111 @@
+import hashlib
 import json
+import os
+import threading
 import urllib
+from contextlib import contextmanager
 import streamlit as st
 import logging
 
-from util import getChild
+from util import getChild, SqliteKVStore
 
 logger = getChild(__name__)
 
 class URLParam:
+    # Per script-thread transaction shared by all URLParam prefixes, see batch()
+    #  { 'snapshot': {str -> str}, 'params': {str -> str}, 'changes': {str -> str} }
+    _local = threading.local()
+
+    # Optional server-side store for large values (URL_PARAM_STORE=1): the URL then only carries
+    #  STORE_REF_PREFIX + a content hash, keeping deep links short and their parse cost constant
+    #  '~' never starts a percent-quoted JSON value, so inline and stored values cannot be confused
+    STORE_REF_PREFIX = "~"
+    STORE_MIN_CHARS = int(os.environ.get("URL_PARAM_STORE_MIN_CHARS", "256"))
+    _store = None
+    _store_lock = threading.Lock()
+
     def __init__(self, prefix="d_"):
         self.prefix = prefix
 
+    # Stage set_field() writes in memory until the block exits, then flush one merged query string write
+    #  get_field() reads a snapshot taken once at the start instead of reparsing the query string per call
+    #  Nested batches join the outermost one; staged writes are dropped if the block raises an Exception
+    #  AppPicker wraps each view run in a batch
+    @staticmethod
+    @contextmanager
+    def batch():
+        if getattr(URLParam._local, "txn", None) is not None:
+            yield
+            return
+
+        snapshot = st.query_params.to_dict()
+        txn = {"snapshot": snapshot, "params": {**snapshot}, "changes": {}}
+        URLParam._local.txn = txn
+        ok = True
+        try:
+            yield
+        except Exception:
+            ok = False
+            raise
+        finally:
+            # streamlit's st.stop()/st.rerun() are BaseExceptions: still commit
+            URLParam._local.txn = None
+            if ok:
+                URLParam._flush(txn)
+
+    @staticmethod
+    def _flush(txn):
+        changes = {k: v for k, v in txn["changes"].items() if txn["snapshot"].get(k) != v}
+        logger.debug("flushing staged url params: %s", changes)
+        if len(changes) > 0:
+            st.query_params.update(changes)
+
+    # () -> ? { 'snapshot': {str -> str}, 'params': {str -> str}, 'changes': {str -> str} }
+    @staticmethod
+    def _txn():
+        return getattr(URLParam._local, "txn", None)
+
+    # () -> ? SqliteKVStore
+    @classmethod
+    def store(cls):
+        if os.environ.get("URL_PARAM_STORE", "").strip().lower() not in ("1", "true", "yes", "on"):
+            return None
+        with cls._store_lock:
+            if cls._store is None:
+                cls._store = SqliteKVStore(
+                    os.environ.get("URL_PARAM_STORE_PATH", "/tmp/gak/url_params.sqlite"),
+                    max_bytes=int(os.environ.get("URL_PARAM_STORE_MAX_BYTES", str(256 * 1024 * 1024))),
+                    ttl_seconds=float(os.environ.get("URL_PARAM_STORE_TTL_DAYS", "90")) * 24 * 60 * 60)
+            return cls._store
+
+    # 'a -> str * ? (str * str)
+    # Returns the URL value, and when it is a store reference, the (key, json) entry to persist
+    def _encode(self, val):
+        inline = urllib.parse.quote(json.dumps(val), safe="")
+        store = self.store()
+        if store is None or len(inline) < self.STORE_MIN_CHARS:
+            return inline, None
+        val_json = json.dumps(val, sort_keys=True)
+        key = hashlib.sha256(val_json.encode("utf-8")).hexdigest()[:24]
+        return self.STORE_REF_PREFIX + key, (key, val_json)
+
+    # str -> ? 'a
+    def _decode(self, encoded):
+        if not encoded.startswith(self.STORE_REF_PREFIX):
+            return json.loads(urllib.parse.unquote(encoded))
+        store = self.store()
+        val_json = store.get(encoded[len(self.STORE_REF_PREFIX):]) if store is not None else None
+        if val_json is None:
+            logger.warning("url param reference %s not found in server-side store, using default", encoded)
+            return None
+        return json.loads(val_json)
+
     # str * 'a -> 'a
     def get_field(self, field: str, default=None):
         field = self.prefix + field
-        query_params = st.query_params.to_dict()
-        maybe_v = json.loads(urllib.parse.unquote(query_params[field])) if field in query_params else None
+        txn = self._txn()
+        query_params = st.query_params.to_dict() if txn is None else txn["params"]
+        maybe_v = self._decode(query_params[field]) if field in query_params else None
         out = default if maybe_v is None else maybe_v
         logger.debug("resolved default for %s as %s :: %s", field, out, type(out))
         return out
@@ -23,12 +113,25 @@ class URLParam:
     # str * 'a -> ()
     def set_field(self, field: str, val):
         field = self.prefix + field
+        new_value, stored = self._encode(val)
+
+        txn = self._txn()
+        if txn is not None:
+            if txn["params"].get(field) != new_value:
+                logger.debug("staging field %s val %s as %s", field, val, new_value)
+                if stored is not None:
+                    self.store().put(*stored)
+                txn["params"][field] = new_value
+                txn["changes"][field] = new_value
+            return
+
         query_params = st.query_params.to_dict()
         logger.debug("params at set: %s", query_params.items())
-        logger.debug("rewriting field %s val %s as %s", field, val, urllib.parse.quote(json.dumps(val), safe=""))
+        logger.debug("rewriting field %s val %s as %s", field, val, new_value)
 
-        new_value = urllib.parse.quote(json.dumps(val), safe="")
         # Only update if the value has changed to prevent infinite loops
         if field not in query_params or query_params[field] != new_value:
+            if stored is not None:
+                self.store().put(*stored)
             new_params = {**{k: v for k, v in query_params.items()}, **{field: new_value}}
             st.query_params.from_dict(new_params)
@@ -0,0 +1,73 @@
+import os, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+from util import getChild
+from .AppPicker import view_registry
+
+logger = getChild(__name__)
+
+
+# Opt-in (WARMUP=1) background prewarm of view caches, started at most once per process
+#  Each included view may define warmup(), which runs its default-parameter pipeline
+#  (run_filters with the same defaults as its sidebar_area) so st.cache_data entries,
+#  downloads and Graphistry uploads are hot before the first visitor opens it
+#  entrypoint.sh triggers the first app run at container start when WARMUP is set
+class Warmup:
+    WARMUP_VAR = "WARMUP"
+    WARMUP_WORKERS_VAR = "WARMUP_WORKERS"
+
+    lock = threading.Lock()
+    started = False
+    # view id -> { 'status': 'ok' | 'error' | 'skipped', 'seconds': float }
+    results = {}
+
+    @classmethod
+    def is_enabled(cls):
+        return os.environ.get(cls.WARMUP_VAR, "").strip().lower() in ("1", "true", "yes", "on")
+
+    @classmethod
+    def is_pending(cls):
+        """Whether start() would start, so callers skip listing views on every rerun"""
+        return cls.is_enabled() and not cls.started
+
+    # {'id' -> { 'name': str, 'id': str, ... } } * bool -> bool
+    def start(self, modules_by_id, force=False):
+        with Warmup.lock:
+            if Warmup.started or not (force or self.is_enabled()):
+                return False
+            Warmup.started = True
+        views = sorted(modules_by_id.values(), key=lambda nfo: nfo["id"])
+        logger.info("Warmup: starting for %s views", len(views))
+        threading.Thread(target=self.run_all, args=(views,), name="gak-warmup", daemon=True).start()
+        return True
+
+    def run_all(self, views):
+        tic = time.perf_counter()
+        # import serially up front: module imports share a lock anyway
+        warmups = []
+        for view in views:
+            mod = view_registry.get_module(view)
+            if mod is None or not hasattr(mod, "warmup"):
+                Warmup.results[view["id"]] = {"status": "skipped", "seconds": 0.0}
+            else:
+                warmups.append((view["id"], mod.warmup))
+
+        workers = int(os.environ.get(self.WARMUP_WORKERS_VAR, "4"))
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="gak-warmup") as pool:
+            for view_id, warmup in warmups:
+                pool.submit(self.run_one, view_id, warmup)
+
+        toc = time.perf_counter()
+        logger.info("Warmup: finished in %0.2fs: %s", toc - tic, Warmup.results)
+
+    def run_one(self, view_id, warmup):
+        tic = time.perf_counter()
+        status = "ok"
+        try:
+            warmup()
+        except Exception:
+            status = "error"
+            logger.error("Warmup: view %s failed", view_id, exc_info=True)
+        toc = time.perf_counter()
+        Warmup.results[view_id] = {"status": status, "seconds": toc - tic}
+        logger.info("Warmup: view %s %s in %0.2fs", view_id, status, toc - tic)
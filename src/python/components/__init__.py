@@ -1,3 +1,7 @@
 from .AppPicker import AppPicker
 from .Graphistry import GraphistrySt
+from .GraphReducer import GraphReducer
+from .PlotCache import PlotCache, plot_cache
+from .ScriptRun import ScriptRun
 from .URLParam import URLParam
+from .Warmup import Warmup
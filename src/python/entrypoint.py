@@ -1,6 +1,11 @@
 import streamlit as st
 import os
-from components import AppPicker
+from util import import_profile
+
+# IMPORT_PROFILE=1: time all imports below, including views, and report them after each run that imported new modules
+import_profile.start()
+
+from components import AppPicker, Warmup  # noqa: E402
 
 page_title_str = "Graph dashboard"
 st.set_page_config(
@@ -14,6 +19,16 @@ st.set_page_config(
 #  includes modules with methods run()
 #  and excludes if ('enabled' in info() and info()['enabled'] == False)
 #  ... and further include/exclude via info()['tags']
-AppPicker().load_active_app()
+#  ... info() is read without importing when it is a plain literal (VIEW_DISCOVERY=static, default),
+#      so only the active view gets imported; set VIEW_DISCOVERY=import to import every view upfront
+app_picker = AppPicker()
+
+# WARMUP=1: once per process, prewarm each included view's default pipeline in background threads
+if Warmup.is_pending():
+    Warmup().start(app_picker.list_modules())
+
+app_picker.load_active_app()
+
+import_profile.report(label="entrypoint")
 
 # AppPicker(include=[], exclude=['demo']).load_active_app()
@@ -0,0 +1,237 @@
+"""Benchmarks for converting Neptune results, on synthetic data shaped like the demo views' queries
+
+From src/python:  python -m neptune_helper.benchmarks [--paths 100000] [--vertices 20000] [--rows 1000000]
+
+Wire formats, with gremlinpython installed:
+  python -m neptune_helper.benchmarks --decode [--paths 100000]     synthetic responses
+  python -m neptune_helper.benchmarks --decode --record DIR         record the demo path query from NEPTUNE_READER_*
+  python -m neptune_helper.benchmarks --decode --responses DIR      replay a recording
+"""
+import argparse
+import os
+import pickle
+import random
+import struct
+import time
+import uuid
+from enum import Enum
+
+import pandas as pd
+
+from . import df_helper
+
+# Stand-in for gremlin_python.process.traversal.T: same str() of its keys, no driver needed
+T = Enum('T', 'id label')
+
+
+# int * int * int * Enum -> [[dict, dict, dict]]
+def make_paths(num_paths, num_vertices, seed=0, T=T):
+    """path().by(valueMap().with_(WithOptions.tokens)) results: vertex properties are lists"""
+    rng = random.Random(seed)
+    states = ['Washington', 'Oregon', 'Texas', 'New York', 'Florida']
+    vertices = [
+        {T.id: f'v{i}', T.label: 'user' if i % 2 else 'website',
+         'uid': [f'uid-{i}'], 'state': [rng.choice(states)], 'city': [f'city-{i % 300}'], 'age': [rng.randint(18, 90)]}
+        for i in range(num_vertices)
+    ]
+    paths = []
+    for i in range(num_paths):
+        src = vertices[rng.randrange(num_vertices)]
+        dst = vertices[rng.randrange(num_vertices)]
+        edge = {T.id: f'e{i}', T.label: 'visited', 'state': src['state'][0], 'ts': 1600000000 + i}
+        paths.append([src, edge, dst])
+    return paths
+
+
+def legacy_path_to_df(paths):
+    """Per-element dicts, as the views did before df_helper.path_to_df()"""
+    nodes = {}
+    edges = {}
+    for triple in paths:
+        src_id = triple[0][T.id]
+        nodes[src_id] = df_helper.vertex_to_dict(triple[0])
+        dst_id = triple[2][T.id]
+        nodes[dst_id] = df_helper.vertex_to_dict(triple[2])
+        edges[triple[1][T.id]] = df_helper.edge_to_dict(triple[1], src_id, dst_id)
+    return pd.DataFrame(nodes.values()), pd.DataFrame(edges.values())
+
+
+def legacy_flatten_df(df):
+    """Per-cell apply() stringifying every object value, as df_helper.flatten_df() did before"""
+    def obj_as_primitive(v):
+        if (v is None) or isinstance(v, str):
+            return v
+        if isinstance(v, list):
+            return ','.join([str(x) for x in v])
+        return str(v)
+
+    df2 = df.copy(deep=False)
+    for c in df.columns:
+        if df2[c].dtype.name == 'object':
+            df2[c] = df2[c].apply(obj_as_primitive)
+    return df2
+
+
+# int -> pd.DataFrame
+def make_object_frame(num_rows, seed=0):
+    """Object columns as Neptune properties arrive: strings, numbers with gaps, a few multi-valued"""
+    rng = random.Random(seed)
+    return pd.DataFrame({
+        'state': pd.Series([rng.choice(['Washington', 'Oregon', 'Texas']) for _ in range(num_rows)], dtype='object'),
+        'age': pd.Series([None if i % 50 == 0 else rng.randint(18, 90) for i in range(num_rows)], dtype='object'),
+        'score': pd.Series([rng.random() for _ in range(num_rows)], dtype='object'),
+        'tags': pd.Series([['a', 'b'] if i % 20 == 0 else 'a' for i in range(num_rows)], dtype='object'),
+    })
+
+
+# (() -> 'a) * int -> float * 'a
+def best_of(fn, repeat):
+    best, out = None, None
+    for _ in range(repeat):
+        tic = time.perf_counter()
+        out = fn()
+        elapsed = time.perf_counter() - tic
+        best = elapsed if best is None else min(best, elapsed)
+    return best, out
+
+
+def bench_path_to_df(num_paths, num_vertices, repeat):
+    paths = make_paths(num_paths, num_vertices)
+    print(f'path_to_df: {num_paths:,} paths over {num_vertices:,} vertices, best of {repeat}')
+    results = {}
+    for name, fn in [('legacy', legacy_path_to_df), ('columnar', df_helper.path_to_df)]:
+        seconds, (nodes_df, edges_df) = best_of(lambda: fn(paths), repeat)
+        results[name] = (nodes_df, edges_df)
+        print(f'  {name:10s} {seconds:8.3f}s  {num_paths / seconds:12,.0f} paths/s  '
+              f'({len(nodes_df):,} nodes, {len(edges_df):,} edges)')
+    for legacy_df, columnar_df in zip(results['legacy'], results['columnar']):
+        pd.testing.assert_frame_equal(legacy_df[sorted(legacy_df.columns)], columnar_df[sorted(columnar_df.columns)])
+
+
+def bench_flatten_df(num_rows, repeat):
+    df = make_object_frame(num_rows)
+    print(f'flatten_df: {num_rows:,} rows x {len(df.columns)} object columns, best of {repeat}')
+    for name, fn in [('legacy', legacy_flatten_df), ('vectorized', df_helper.flatten_df)]:
+        seconds, out = best_of(lambda: fn(df), repeat)
+        dtypes = ', '.join([f'{c}:{t}' for c, t in out.dtypes.items()])
+        print(f'  {name:10s} {seconds:8.3f}s  {num_rows / seconds:12,.0f} rows/s  ({dtypes})')
+
+
+class RecordingSerializer:
+    """Message serializer wrapper keeping each raw response message it decodes"""
+
+    def __init__(self, serializer):
+        self.serializer = serializer
+        self.messages = []
+
+    def __getattr__(self, name):
+        return getattr(self.serializer, name)
+
+    def deserialize_message(self, message):
+        self.messages.append(message)
+        return self.serializer.deserialize_message(message)
+
+
+# str * int -> ()
+def record_responses(path, num_edges):
+    """Save the raw responses of the Neptune demo path query, once per wire format, as path/<name>.pickle"""
+    from gremlin_python.driver.driver_remote_connection import DriverRemoteConnection
+    from gremlin_python.process.anonymous_traversal import traversal
+    from . import gremlin_helper
+
+    endpoint = gremlin_helper.reader_endpoints()[0]
+    os.makedirs(path, exist_ok=True)
+    for name in gremlin_helper.SERIALIZERS:
+        recorder = RecordingSerializer(gremlin_helper.get_serializer(name))
+        connection = DriverRemoteConnection(endpoint, 'g', message_serializer=recorder)
+        try:
+            g = traversal().withRemote(connection)
+            res = gremlin_helper.path_by_properties(g.V().inE().limit(num_edges).outV()).toList()
+        finally:
+            gremlin_helper.close_connection(connection)
+        with open(os.path.join(path, f'{name}.pickle'), 'wb') as f:
+            pickle.dump(recorder.messages, f)
+        print(f'Recorded {len(res):,} paths from {endpoint} as {len(recorder.messages)} {name} messages')
+
+
+# [Path] * int -> {str -> [bytes]}
+def make_responses(paths, batch_size):
+    """Server response messages carrying paths as Traversers, batch_size per message, in each wire format"""
+    import json
+    from gremlin_python.process.traversal import Traverser
+    from gremlin_python.structure.graph import Path
+    from gremlin_python.structure.io import graphbinaryV1, graphsonV3d0
+
+    # gremlinpython only reads paths in GraphSON, so write them as the server does
+    class GraphSONPathIO(graphsonV3d0._GraphSONTypeIO):
+        python_type = Path
+
+        @classmethod
+        def dictify(cls, path, writer):
+            return graphsonV3d0.GraphSONUtil.typed_value(
+                'Path', {'labels': writer.to_dict(path.labels), 'objects': writer.to_dict(path.objects)})
+
+    graphson_writer = graphsonV3d0.GraphSONWriter({Path: GraphSONPathIO})
+    graphbinary_writer = graphbinaryV1.GraphBinaryWriter()
+    empty_map = {'@type': 'g:Map', '@value': []}
+    responses = {'graphbinary': [], 'graphson': []}
+    request_id = uuid.uuid4()
+    for start in range(0, len(paths), batch_size):
+        data = [Traverser(Path([set() for _ in p], p), 1) for p in paths[start:start + batch_size]]
+        status = 200 if start + batch_size >= len(paths) else 206
+
+        responses['graphson'].append(json.dumps({
+            'requestId': str(request_id),
+            'status': {'code': status, 'message': '', 'attributes': empty_map},
+            'result': {'data': graphson_writer.to_dict(data), 'meta': empty_map},
+        }).encode('utf-8'))
+
+        # version, non-null request id, status code, null status message, no status attributes, no meta, data
+        ba = bytearray(b'\x81\x00' + request_id.bytes + struct.pack('>i', status) + b'\x01' + struct.pack('>ii', 0, 0))
+        graphbinary_writer.to_dict(data, ba)
+        responses['graphbinary'].append(bytes(ba))
+    return responses
+
+
+def bench_decode(num_paths, num_vertices, repeat, record=None, responses=None):
+    from gremlin_python.process.traversal import T as GremlinT
+    from . import gremlin_helper
+
+    if record is not None:
+        record_responses(record, num_paths)
+        responses = record
+    if responses is not None:
+        messages = {}
+        for name in gremlin_helper.SERIALIZERS:
+            with open(os.path.join(responses, f'{name}.pickle'), 'rb') as f:
+                messages[name] = pickle.load(f)
+        source = f'responses recorded in {responses}'
+    else:
+        messages = make_responses(make_paths(num_paths, num_vertices, T=GremlinT), gremlin_helper.BATCH_SIZE)
+        source = f'{num_paths:,} synthetic paths in batches of {gremlin_helper.BATCH_SIZE}'
+
+    print(f'decode: {source}, best of {repeat}')
+    for name, msgs in messages.items():
+        serializer = gremlin_helper.get_serializer(name)
+        seconds, decoded = best_of(lambda: [serializer.deserialize_message(m) for m in msgs], repeat)
+        num_bytes = sum([len(m) for m in msgs])
+        results = sum([len(d['result']['data'] or []) for d in decoded])
+        print(f'  {name:12s} {seconds:8.3f}s  {results / seconds:12,.0f} results/s  '
+              f'{num_bytes / seconds / 1e6:8.1f} MB/s  ({num_bytes / 1e6:,.1f} MB in {len(msgs)} messages)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--paths', type=int, default=100000)
+    parser.add_argument('--vertices', type=int, default=20000)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--decode', action='store_true', help='Compare GraphBinary and GraphSON response decoding instead')
+    parser.add_argument('--record', help='With --decode: first record responses of --paths edges into this directory')
+    parser.add_argument('--responses', help='With --decode: decode responses recorded in this directory')
+    args = parser.parse_args()
+    if args.decode:
+        bench_decode(args.paths, args.vertices, args.repeat, record=args.record, responses=args.responses)
+    else:
+        bench_path_to_df(args.paths, args.vertices, args.repeat)
+        bench_flatten_df(args.rows, args.repeat)
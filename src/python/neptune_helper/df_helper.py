@@ -1,3 +1,7 @@
+import numpy as np
+import pandas as pd
+
+
 def vertex_to_dict(vertex):
     d = {}
     for k in vertex.keys():
@@ -24,18 +28,167 @@ def edge_to_dict(edge, start_id, end_id):
     return d
 
 
-def flatten_df(df):
+class ColumnBuilder:
+    """Column arrays for rows with varying keys, padded with None where a row lacks a key"""
+
+    def __init__(self):
+        self.columns = {}
+        self.rows = 0
+
+    def add(self, name, value):
+        col = self.columns.get(name)
+        if col is None:
+            col = self.columns[name] = [None] * self.rows
+        col.append(value)
+
+    def end_row(self):
+        self.rows += 1
+        for col in self.columns.values():
+            if len(col) < self.rows:
+                col.append(None)
+
+    # [str] -> pd.DataFrame
+    def to_df(self, last=()):
+        names = [c for c in self.columns if c not in last] + [c for c in last if c in self.columns]
+        return pd.DataFrame({c: self.columns[c] for c in names}, columns=names)
+
+
+class PathFrames:
+    """Nodes and edges frames for [[vertex, edge, vertex]] paths of valueMap().with_(WithOptions.tokens)
+
+    Same columns as vertex_to_dict()/edge_to_dict(), but each distinct vertex and edge id is converted
+    once, straight into column arrays, however many paths repeat it. Paths can be add()ed batch by
+    batch as they stream in, so only the distinct elements are kept rather than every raw path"""
+
+    # Columns set from the path itself: same-named properties are dropped, as vertex_to_dict()/edge_to_dict() overwrote them
+    NODE_COLUMNS = ('id', 'label')
+    EDGE_COLUMNS = ('id', 'label', 'source', 'target')
+
+    def __init__(self):
+        self.nodes = ColumnBuilder()
+        self.edges = ColumnBuilder()
+        self.seen_nodes = set()
+        self.seen_edges = set()
+        # key -> column name, ex: T.id -> 'id', or '' for dropped properties
+        self.node_names = {}
+        self.edge_names = {}
+        self.id_key = None
+        self.paths = 0
+
+    @staticmethod
+    def name_of(names, reserved, k):
+        name = str(k)
+        if not isinstance(k, str):
+            name = {'T.id': 'id', 'T.label': 'label'}.get(name, name)
+        elif name in reserved:
+            name = ''
+        names[k] = name
+        return name
+
+    def add_element(self, builder, names, reserved, element):
+        add = builder.add
+        for k, v in element.items():
+            name = names.get(k)
+            if name is None:
+                name = self.name_of(names, reserved, k)
+            if name:
+                add(name, v[0] if isinstance(v, list) else v)
+
+    def add(self, paths):
+        nodes, edges, seen_nodes, seen_edges = self.nodes, self.edges, self.seen_nodes, self.seen_edges
+        node_names, edge_names = self.node_names, self.edge_names
+        node_columns, edge_columns = self.NODE_COLUMNS, self.EDGE_COLUMNS
+        add_element = self.add_element
+        for triple in paths:
+            src, edge, dst = triple[0], triple[1], triple[2]
+            if self.id_key is None:
+                self.id_key = next(k for k in src.keys() if str(k) == 'T.id')
+            id_key = self.id_key
+
+            src_id = src[id_key]
+            if src_id not in seen_nodes:
+                seen_nodes.add(src_id)
+                add_element(nodes, node_names, node_columns, src)
+                nodes.end_row()
 
-    def obj_as_primitive(v):
-        if (v is None) or type(v) == str:
-            return v
-        if type(v) == list:
-            return ','.join([str(x) for x in v])
-        return str(v)
+            dst_id = dst[id_key]
+            if dst_id not in seen_nodes:
+                seen_nodes.add(dst_id)
+                add_element(nodes, node_names, node_columns, dst)
+                nodes.end_row()
 
+            edge_id = edge[id_key]
+            if edge_id not in seen_edges:
+                seen_edges.add(edge_id)
+                add_element(edges, edge_names, edge_columns, edge)
+                edges.add('source', src_id)
+                edges.add('target', dst_id)
+                edges.end_row()
+            self.paths += 1
+
+    # () -> pd.DataFrame * pd.DataFrame
+    def to_dfs(self):
+        return self.nodes.to_df(last=['id', 'label']), self.edges.to_df(last=['id', 'label', 'source', 'target'])
+
+
+def path_to_df(paths):
+    """Nodes and edges frames for a list of paths, see PathFrames"""
+    frames = PathFrames()
+    frames.add(paths)
+    return frames.to_dfs()
+
+
+# infer_dtype() kinds converted to typed columns; other non-string kinds are stringified
+NUMERIC_KINDS = ('integer', 'floating', 'mixed-integer-float', 'decimal')
+DATETIME_KINDS = ('datetime', 'datetime64', 'date')
+
+
+def typed_series(s, kind):
+    """Object column of one value kind as a typed column (nullable when missing values), or None when it does not fit one"""
+    has_nulls = s.isna().any()
+    try:
+        if kind == 'integer':
+            return s.astype('Int64' if has_nulls else 'int64')
+        if kind == 'boolean':
+            return s.astype('boolean' if has_nulls else 'bool')
+        if kind in NUMERIC_KINDS:
+            return pd.to_numeric(s)
+        if kind in DATETIME_KINDS:
+            return pd.to_datetime(s)
+    except (OverflowError, TypeError, ValueError):
+        pass  # ex: ints beyond int64, mixed timezones
+    return None
+
+
+def flatten_series(s):
+    """Object column as a typed or string column, or None when it is already flat
+
+    The value kind is detected once per column: numbers, booleans and datetimes stay typed
+    (nullable when missing values), list values are ','-joined, and other objects stringified"""
+    kind = pd.api.types.infer_dtype(s, skipna=True)
+    if kind in ('string', 'empty'):
+        return None
+    typed = typed_series(s, kind)
+    if typed is not None:
+        return typed
+
+    # mixed: one pass each over the list cells and the other non-null cells, str() keeps strings as-is
+    out = s.to_numpy(dtype='object', copy=True)
+    is_list = np.fromiter((type(v) is list for v in out), dtype=bool, count=len(out))
+    if is_list.any():
+        out[is_list] = [','.join(map(str, v)) for v in out[is_list]]
+    is_other = ~is_list & s.notna().to_numpy()
+    if is_other.any():
+        out[is_other] = list(map(str, out[is_other]))
+    return pd.Series(out, index=s.index, name=s.name, dtype='object')
+
+
+def flatten_df(df):
+    """Flatten object columns for upload, see flatten_series(); other columns are shared, not copied"""
     df2 = df.copy(deep=False)
     for c in df.columns:
-        if df2[c].dtype.name == 'object':
-            df2[c] = df2[c].apply(obj_as_primitive)
-
+        if df[c].dtype.name == 'object':
+            flat = flatten_series(df[c])
+            if flat is not None:
+                df2[c] = flat
     return df2
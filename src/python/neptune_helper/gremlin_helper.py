@@ -1,29 +1,599 @@
+import asyncio
 import os
 import logging
+import queue
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+from contextlib import contextmanager
 from gremlin_python import statics
 from gremlin_python.structure.graph import Graph
 from gremlin_python.process.graph_traversal import __
 from gremlin_python.process.anonymous_traversal import traversal
 from gremlin_python.process.strategies import *
 from gremlin_python.process.traversal import *
+from gremlin_python.process.traversal import WithOptions
 from gremlin_python.structure.graph import Path, Vertex, Edge
+from gremlin_python.driver.serializer import GraphBinarySerializersV1, GraphSONSerializersV3d0
 from gremlin_python.driver.driver_remote_connection import DriverRemoteConnection
+from gremlin_python.driver.protocol import GremlinServerError
 from util import getChild
+from .result_cache import get_result_cache
 
 logger = getChild(__name__)
 
+# Results per server response message when streaming, see iter_batches()
+BATCH_SIZE = int(os.environ.get('NEPTUNE_BATCH_SIZE', '1000'))
+# Default per-query deadline for stream(), 0 for none beyond the server's own evaluation timeout
+QUERY_TIMEOUT_SECONDS = float(os.environ.get('NEPTUNE_QUERY_TIMEOUT_SECONDS', '0'))
+# How often a streaming query waiting on the server checks its deadline and cancelled() predicate
+POLL_SECONDS = 0.1
+
+# NEPTUNE_SERIALIZER values -> wire format; GraphSON v3 is the oldest that keeps valueMap() token keys typed
+SERIALIZERS = {
+    'graphbinary': GraphBinarySerializersV1,
+    'graphson': GraphSONSerializersV3d0,
+}
+
+
+# ? str -> ? serializer
+def get_serializer(name=None):
+    """Message serializer named by name or NEPTUNE_SERIALIZER, or None for gremlinpython's default"""
+    name = (name if name is not None else os.environ.get('NEPTUNE_SERIALIZER', '')).strip().lower()
+    if name == '':
+        return None
+    if name not in SERIALIZERS:
+        raise ValueError(f'Unknown NEPTUNE_SERIALIZER {name}, expected one of {list(SERIALIZERS.keys())}')
+    return SERIALIZERS[name]()
+
+
+def is_configured():
+    """Whether the NEPTUNE_READER_* environment variables needed by connect_to_neptune() are set"""
+    return ('NEPTUNE_READER_HOST' in os.environ and 'NEPTUNE_READER_PORT' in os.environ
+            and 'NEPTUNE_READER_PROTOCOL' in os.environ)
+
+
+# () -> [str]
+def reader_endpoints():
+    """Gremlin URLs of the readers in NEPTUNE_READER_HOST, a comma-separated list of host or host:port
+
+    Ports default to NEPTUNE_READER_PORT, ex: NEPTUNE_READER_HOST=replica-1.example.com,replica-2.example.com"""
+    protocol = os.environ["NEPTUNE_READER_PROTOCOL"]
+    port = os.environ["NEPTUNE_READER_PORT"]
+    endpoints = []
+    for host in os.environ["NEPTUNE_READER_HOST"].split(','):
+        host = host.strip()
+        if host != '':
+            endpoints.append(f'{protocol}://{host if ":" in host else f"{host}:{port}"}/gremlin')
+    return endpoints
+
+
 def connect_to_neptune():
-    """Creates a connection to Neptune and returns the traversal source"""
-    if ('NEPTUNE_READER_HOST' in os.environ and 'NEPTUNE_READER_PORT' in os.environ
-            and 'NEPTUNE_READER_PROTOCOL' in os.environ):
-        server = os.environ["NEPTUNE_READER_HOST"]
-        port = os.environ["NEPTUNE_READER_PORT"]
-        protocol = os.environ["NEPTUNE_READER_PROTOCOL"]
-        endpoint = f'{protocol}://{server}:{port}/gremlin'
+    """Creates a connection to the first Neptune reader and returns the traversal source
+
+    Prefer get_pool().traversal(), which reuses open connections across queries and readers"""
+    if is_configured():
+        endpoint = reader_endpoints()[0]
         logger.info(endpoint)
-        connection = DriverRemoteConnection(endpoint, 'g')
+        connection = DriverRemoteConnection(endpoint, 'g', message_serializer=get_serializer())
         gts = traversal().withRemote(connection)
         return (gts, connection)
     else:
         logging.error("Internal Configuraiton Error Occurred.  ")
         return None
+
+
+# DriverRemoteConnection -> ()
+def close_connection(connection):
+    try:
+        connection.close()
+    except RuntimeError as e:
+        # gremlinpython closes on the calling thread's event loop, which Streamlit script threads lack
+        if "no current event loop" in str(e):
+            asyncio.set_event_loop(asyncio.new_event_loop())
+            connection.close()
+        else:
+            raise e
+
+
+# Traversal * ? [str] * ? [str] -> Traversal
+def path_by_properties(t, vertex_props=None, edge_props=None):
+    """t.path() of alternating vertex, edge, vertex, ... elements as valueMap()s with id and label tokens
+
+    vertex_props/edge_props: only fetch these properties, all when None or empty. by() modulators
+    apply round-robin along the path, so the first maps the vertices and the second the edges"""
+    vertex_map = __.valueMap(*(vertex_props or [])).with_(WithOptions.tokens)
+    if not vertex_props and not edge_props:
+        return t.path().by(vertex_map)
+    edge_map = __.valueMap(*(edge_props or [])).with_(WithOptions.tokens)
+    return t.path().by(vertex_map).by(edge_map)
+
+
+class QueryCancelled(Exception):
+    """A streaming query was abandoned because its cancelled() predicate turned true"""
+
+
+class ConnectionUnavailable(TimeoutError):
+    """Every connection of a pool stayed checked out past the acquire timeout"""
+
+
+# str * str -> ()
+def cancel_query(endpoint, request_id):
+    """Ask Neptune to stop running query request_id, in the background and best effort
+
+    See https://docs.aws.amazon.com/neptune/latest/userguide/gremlin-api-status-cancel.html"""
+    base = endpoint.replace('wss://', 'https://', 1).replace('ws://', 'http://', 1)
+    url = f'{base.rstrip("/")}/status'
+    data = urllib.parse.urlencode({'cancelQuery': '', 'queryId': request_id}).encode('utf-8')
+
+    def send():
+        try:
+            urllib.request.urlopen(url, data=data, timeout=10).close()
+            logger.debug('Cancelled Neptune query %s', request_id)
+        except Exception:
+            logger.debug('Failed cancelling Neptune query %s', request_id, exc_info=True)
+
+    threading.Thread(target=send, name='gak-neptune-cancel', daemon=True).start()
+
+
+# DriverRemoteConnection * Traversal * dict -> str * str * ResultSet
+def submit_traversal(connection, t, request_options):
+    """Submit traversal t on connection without waiting for its results: (endpoint, requestId, ResultSet)
+
+    Options set on the traversal itself, ex: g.with_('evaluationTimeout', 500), take precedence over request_options"""
+    # gremlinpython has no public accessors for these, DriverRemoteConnection.submit() uses the same
+    options = {**request_options, **(DriverRemoteConnection._extract_request_options(t.bytecode) or {})}
+    client = connection._client
+    return client._url, options['requestId'], client.submit(t.bytecode, request_options=options)
+
+
+# ResultSet * (() -> ()) -> ? [Traverser]
+def poll_batch(result_set, check):
+    """Next non-empty batch of result_set, or None once the results are done, calling check() while waiting
+
+    ResultSet iteration spins until the next batch with no way to give up, so this polls its queue instead"""
+    while True:
+        try:
+            traversers = result_set.stream.get(timeout=POLL_SECONDS)
+        except queue.Empty:
+            if result_set.done.done() and result_set.stream.empty():
+                result_set.done.result()  # raises server errors
+                return None
+            check()
+            continue
+        if len(traversers) > 0:
+            return traversers
+
+
+# str * str * ? float * ? (() -> bool) -> (() -> ())
+def abandon_check(endpoint, request_id, timeout=None, cancelled=None):
+    """Check for iter_batches() raising QueryCancelled once cancelled(), or TimeoutError past timeout seconds from now
+
+    Before raising, it asks the server to cancel query request_id"""
+    tic = time.perf_counter()
+    deadline = None if not timeout else time.monotonic() + timeout
+
+    def check():
+        if cancelled is not None and cancelled():
+            cancel_query(endpoint, request_id)
+            raise QueryCancelled(f'Query {request_id} cancelled after {time.perf_counter() - tic:0.3f}s')
+        if deadline is not None and time.monotonic() > deadline:
+            cancel_query(endpoint, request_id)
+            raise TimeoutError(f'Query {request_id} exceeded its {timeout}s deadline')
+
+    return check
+
+
+# DriverRemoteConnection * Traversal * ? int * ? float * ? (() -> bool) -> iter [ 'a ]
+def iter_batches(connection, t, batch_size=None, timeout=None, cancelled=None):
+    """Results of traversal t, a batch at a time as the server sends them
+
+    Unlike t.toList(), whose DriverRemoteConnection.submit() waits for and buffers the whole result,
+    callers can convert each batch and drop it before the next arrives.
+
+    timeout: seconds, sent as the request's evaluationTimeout unless t sets its own, and enforced client-side with TimeoutError
+    cancelled: polled while waiting and between batches; once true, raises QueryCancelled
+
+    Either way, or when the generator is closed early, the query is also cancelled on the server,
+    so it stops using Neptune capacity"""
+    tic = time.perf_counter()
+    request_options = {'batchSize': batch_size or BATCH_SIZE, 'requestId': str(uuid.uuid4())}
+    if timeout:
+        request_options['evaluationTimeout'] = int(timeout * 1000)
+    endpoint, request_id, result_set = submit_traversal(connection, t, request_options)
+    check = abandon_check(endpoint, request_id, timeout, cancelled)
+
+    batches = 0
+    try:
+        while True:
+            traversers = poll_batch(result_set, check)
+            if traversers is None:
+                break
+            if batches == 0:
+                logger.debug('First batch of %s results after %0.3fs', len(traversers), time.perf_counter() - tic)
+            batches += 1
+            yield [tr.object for tr in traversers for _ in range(tr.bulk)]
+            check()
+    except GeneratorExit:
+        if not result_set.done.done():
+            cancel_query(endpoint, request_id)
+        raise
+    logger.debug('Streamed %s batches in %0.3fs', batches, time.perf_counter() - tic)
+
+
+# Queries through a connection() context manager, see GremlinConnectionPool and GremlinLoadBalancer
+class GremlinSource:
+    @contextmanager
+    def traversal(self):
+        """Check out a connection and yield its traversal source g"""
+        with self.connection() as connection:
+            yield traversal().withRemote(connection)
+
+    # (GraphTraversalSource -> Traversal) * ? int * ? float * ? (() -> bool) -> iter [ 'a ]
+    def stream(self, build, batch_size=None, timeout=None, cancelled=None):
+        """Batches of the results of traversal build(g), see iter_batches()
+
+        timeout defaults to NEPTUNE_QUERY_TIMEOUT_SECONDS. The connection is checked out until the results
+        are consumed or the generator is closed. With NEPTUNE_RESULT_CACHE=1, fully consumed results are
+        cached by bytecode and replayed"""
+        cache = get_result_cache()
+        key = None if cache is None else cache.key_for(build, self.endpoint)
+        if key is not None:
+            batches = cache.get(key)
+            if batches is not None:
+                logger.debug('Gremlin result cache hit %s (%s)', key, cache.stats)
+                yield from batches
+                return
+
+        batches = []
+        with self.connection() as connection:
+            t = build(traversal().withRemote(connection))
+            for batch in iter_batches(connection, t, batch_size, timeout or QUERY_TIMEOUT_SECONDS, cancelled):
+                if key is not None:
+                    batches.append(batch)
+                yield batch
+        if key is not None:
+            cache.put(key, batches)
+
+
+class GremlinConnectionPool(GremlinSource):
+    """Bounded, thread-safe pool of Neptune connections shared by all Streamlit sessions
+
+    Queries check a connection out for their duration, skipping the websocket and TLS handshake
+    of a new one. Connections idle longer than health_check_seconds are probed before reuse, and
+    connections that fail a probe, whose query raised and then fail a probe, or whose query was
+    abandoned, are replaced.
+    Websocket heartbeats keep idle connections alive through load balancers and NAT."""
+
+    # str * int * float * ? float * float * ? str -> ()
+    def __init__(self, endpoint, max_size=4, health_check_seconds=30, heartbeat_seconds=30, acquire_timeout=60,
+                 serializer=None):
+        self.endpoint = endpoint
+        self.serializer = serializer
+        self.max_size = max_size
+        self.health_check_seconds = health_check_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.acquire_timeout = acquire_timeout
+        self.cond = threading.Condition()
+        self.idle = []  # [ (DriverRemoteConnection, last_used) ], most recently used last
+        self.size = 0  # idle + checked out + connecting
+        self.stats = {'created': 0, 'reused': 0, 'discarded': 0}
+
+    def connect(self):
+        logger.info('Opening Neptune connection to %s', self.endpoint)
+        transport_kwargs = {'heartbeat': self.heartbeat_seconds} if self.heartbeat_seconds else {}
+        connection = DriverRemoteConnection(
+            self.endpoint, 'g', pool_size=1, message_serializer=get_serializer(self.serializer), **transport_kwargs)
+        self.stats['created'] += 1
+        return connection
+
+    def is_healthy(self, connection):
+        try:
+            traversal().withRemote(connection).inject(1).toList()
+            return True
+        except Exception:
+            logger.warning('Neptune connection failed health check', exc_info=True)
+            return False
+
+    # ? float -> DriverRemoteConnection
+    def acquire(self, timeout=None):
+        """Idle or new connection, waiting at most timeout seconds, default acquire_timeout, for a free one"""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            with self.cond:
+                while len(self.idle) == 0 and self.size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise ConnectionUnavailable(f'No Neptune connection available within {timeout}s')
+                    self.cond.wait(remaining)
+                if len(self.idle) > 0:
+                    connection, last_used = self.idle.pop()
+                else:
+                    connection, last_used = None, None
+                    self.size += 1
+
+            if connection is None:
+                try:
+                    return self.connect()
+                except Exception:
+                    with self.cond:
+                        self.size -= 1
+                        self.cond.notify()
+                    raise
+
+            if time.time() - last_used < self.health_check_seconds or self.is_healthy(connection):
+                self.stats['reused'] += 1
+                return connection
+            self.discard(connection)
+
+    def release(self, connection, healthy=True):
+        if not healthy:
+            self.discard(connection)
+            return
+        with self.cond:
+            self.idle.append((connection, time.time()))
+            self.cond.notify()
+
+    def discard(self, connection):
+        """Replace connection, closing it in the background: closing waits for any query still streaming on it"""
+        with self.cond:
+            self.stats['discarded'] += 1
+            self.size -= 1
+            self.cond.notify()
+
+        def close():
+            try:
+                close_connection(connection)
+            except Exception:
+                logger.debug('Failed closing Neptune connection', exc_info=True)
+
+        threading.Thread(target=close, name='gak-neptune-close', daemon=True).start()
+
+    # ? float -> DriverRemoteConnection
+    @contextmanager
+    def connection(self, timeout=None):
+        """Check out a connection for the block, replaced if the block raises and it then fails a probe
+
+        Connections of abandoned queries, ex: cancelled, past their deadline, or streams closed early, are
+        replaced without a probe: their results may still be arriving, and the next query would wait behind them"""
+        connection = self.acquire(timeout)
+        healthy = True
+        try:
+            yield connection
+        except (QueryCancelled, TimeoutError):
+            healthy = False
+            raise
+        except Exception:
+            healthy = self.is_healthy(connection)
+            raise
+        except BaseException:
+            # ex: GeneratorExit when a stream() is closed early
+            healthy = False
+            raise
+        finally:
+            self.release(connection, healthy)
+
+    def close(self):
+        with self.cond:
+            idle, self.idle = self.idle, []
+        for connection, _ in idle:
+            self.discard(connection)
+
+
+class ReaderEndpoint:
+    """A reader's connection pool with its load and latency, see GremlinLoadBalancer"""
+
+    LATENCY_DECAY = 0.2  # weight of the newest sample in the moving average
+
+    # GremlinConnectionPool -> ()
+    def __init__(self, pool):
+        self.pool = pool
+        self.outstanding = 0
+        self.latency = None  # exponential moving average of probes, seconds
+        self.samples = 0
+        self.ejected_until = 0
+        self.probing = False  # a probe after a failed query is running, see GremlinLoadBalancer.record_failure()
+        self.stats = {'queries': 0, 'failures': 0, 'ejections': 0}
+
+    def record_latency(self, seconds):
+        self.latency = seconds if self.latency is None else \
+            self.LATENCY_DECAY * seconds + (1 - self.LATENCY_DECAY) * self.latency
+        self.samples += 1
+
+    # float -> float
+    def probe(self, timeout):
+        """Seconds for a g.inject(1) round trip, waiting at most timeout for a free connection
+
+        Unlike query times, it does not depend on what queries the reader happens to serve"""
+        with self.pool.connection(timeout) as connection:
+            tic = time.perf_counter()
+            traversal().withRemote(connection).inject(1).toList()
+            return time.perf_counter() - tic
+
+
+class GremlinLoadBalancer(GremlinSource):
+    """Spreads queries over several Neptune readers, each with its own GremlinConnectionPool
+
+    Picks the reader with the fewest outstanding queries (ties: round-robin), or round-robin.
+    Every probe_seconds, and in the background after a query fails on its connection, readers are probed:
+    those failing the probe are ejected for eject_seconds, and so are readers whose average probe latency
+    exceeds slow_factor times the median of the others. Query deadlines, cancellations and server errors
+    are not reader failures. When every reader is ejected, all are used again rather than failing."""
+
+    STRATEGIES = ['least_outstanding', 'round_robin']
+    MIN_SAMPLES = 5  # before a reader's latency can eject it
+    PROBE_ACQUIRE_SECONDS = 5  # a reader with every connection busy for longer is skipped, not ejected
+
+    # [GremlinConnectionPool] * str * float * float * float -> ()
+    def __init__(self, pools, strategy='least_outstanding', eject_seconds=30, slow_factor=3, probe_seconds=10):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f'Unknown strategy {strategy}, expected one of {self.STRATEGIES}')
+        self.readers = [ReaderEndpoint(p) for p in pools]
+        # one cluster: results are the same whichever reader serves them, see result_cache
+        self.endpoint = ','.join(sorted([p.endpoint for p in pools]))
+        self.strategy = strategy
+        self.eject_seconds = eject_seconds
+        self.slow_factor = slow_factor
+        self.probe_seconds = probe_seconds
+        self.lock = threading.Lock()
+        self.next_index = 0
+        self.closed = threading.Event()
+        if probe_seconds:
+            threading.Thread(target=self.probe_loop, name='gak-neptune-probe', daemon=True).start()
+
+    # () -> ReaderEndpoint
+    def pick(self):
+        now = time.time()
+        with self.lock:
+            candidates = [r for r in self.readers if r.ejected_until <= now] or self.readers
+            # rotate so ties, ex: all idle, are broken round-robin
+            start = self.next_index % len(candidates)
+            candidates = candidates[start:] + candidates[:start]
+            self.next_index += 1
+            if self.strategy == 'round_robin':
+                reader = candidates[0]
+            else:
+                reader = min(candidates, key=lambda r: r.outstanding)
+            reader.outstanding += 1
+            reader.stats['queries'] += 1
+            return reader
+
+    def eject(self, reader, reason):
+        reader.ejected_until = time.time() + self.eject_seconds
+        reader.stats['ejections'] += 1
+        # returns with a clean slate instead of being re-ejected on stale samples
+        reader.latency = None
+        reader.samples = 0
+        logger.warning('Ejecting Neptune reader %s for %ss: %s', reader.pool.endpoint, self.eject_seconds, reason)
+
+    # ReaderEndpoint * str -> ()
+    def probe(self, reader, reason='failed probe'):
+        """Record reader's probe latency, or eject it when the probe fails or is slow compared to the others"""
+        try:
+            seconds = reader.probe(self.PROBE_ACQUIRE_SECONDS)
+        except ConnectionUnavailable:
+            return  # busy, which pick() already accounts for
+        except Exception as e:
+            with self.lock:
+                self.eject(reader, f'{reason}: {e}')
+            return
+        with self.lock:
+            reader.record_latency(seconds)
+            others = sorted([r.latency for r in self.readers if r is not reader and r.latency is not None])
+            if len(others) == 0 or reader.samples < self.MIN_SAMPLES:
+                return
+            median = others[len(others) // 2]
+            if reader.latency > self.slow_factor * median:
+                self.eject(reader, f'average latency {reader.latency:0.3f}s vs others\' median {median:0.3f}s')
+
+    def probe_loop(self):
+        while not self.closed.wait(self.probe_seconds):
+            for reader in self.readers:
+                self.probe(reader)
+
+    def record_done(self, reader):
+        with self.lock:
+            reader.outstanding -= 1
+
+    def record_failure(self, reader):
+        """Count a connection or transport failure, and probe reader off the request thread"""
+        with self.lock:
+            reader.outstanding -= 1
+            reader.stats['failures'] += 1
+            if reader.probing:
+                return
+            reader.probing = True
+        threading.Thread(
+            target=self.probe_after_failure, args=(reader,), name='gak-neptune-probe', daemon=True).start()
+
+    def probe_after_failure(self, reader):
+        try:
+            self.probe(reader, 'failed probe after query failure')
+        finally:
+            with self.lock:
+                reader.probing = False
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection from the picked reader's pool"""
+        reader = self.pick()
+        try:
+            with reader.pool.connection() as connection:
+                yield connection
+        except (QueryCancelled, TimeoutError, GremlinServerError):
+            # the reader is busy, the caller gave up, the query ran past its deadline, or the server answered
+            #  with an error: not failures of the reader
+            self.record_done(reader)
+            raise
+        except Exception:
+            self.record_failure(reader)
+            raise
+        except BaseException:
+            # ex: GeneratorExit when a stream() is closed early
+            self.record_done(reader)
+            raise
+        self.record_done(reader)
+
+    # () -> [ { 'endpoint': str, 'outstanding': int, 'latency': ? float, 'ejected': bool, ... } ]
+    def status(self):
+        now = time.time()
+        with self.lock:
+            return [
+                {'endpoint': r.pool.endpoint, 'outstanding': r.outstanding, 'latency': r.latency,
+                 'ejected': r.ejected_until > now, **r.stats, **r.pool.stats}
+                for r in self.readers
+            ]
+
+    def close(self):
+        self.closed.set()
+        for reader in self.readers:
+            reader.pool.close()
+
+
+pool = None
+pool_config = None
+pool_lock = threading.Lock()
+
+
+# () -> ? GremlinSource
+def get_pool():
+    """Process-wide GremlinConnectionPool for the NEPTUNE_READER_* endpoint, or None when not configured
+
+    Each reader's pool is sized by NEPTUNE_POOL_SIZE (default 4), and uses the NEPTUNE_SERIALIZER wire
+    format. With several readers in NEPTUNE_READER_HOST, a GremlinLoadBalancer over their pools, with
+    NEPTUNE_BALANCER strategy (default least_outstanding), NEPTUNE_EJECT_SECONDS, NEPTUNE_SLOW_FACTOR and
+    NEPTUNE_PROBE_SECONDS"""
+    global pool, pool_config
+    if not is_configured():
+        logger.error("Neptune connection not configured")
+        return None
+    endpoints = reader_endpoints()
+    serializer_name = os.environ.get('NEPTUNE_SERIALIZER', '')
+    config = (tuple(endpoints), serializer_name)
+    with pool_lock:
+        if pool is None or pool_config != config:
+            if pool is not None:
+                pool.close()
+            pools = [
+                GremlinConnectionPool(
+                    endpoint,
+                    max_size=int(os.environ.get('NEPTUNE_POOL_SIZE', '4')),
+                    health_check_seconds=float(os.environ.get('NEPTUNE_POOL_HEALTH_CHECK_SECONDS', '30')),
+                    heartbeat_seconds=float(os.environ.get('NEPTUNE_HEARTBEAT_SECONDS', '30')),
+                    serializer=serializer_name)
+                for endpoint in endpoints
+            ]
+            if len(pools) == 1:
+                pool = pools[0]
+            else:
+                pool = GremlinLoadBalancer(
+                    pools,
+                    strategy=os.environ.get('NEPTUNE_BALANCER', 'least_outstanding').strip().lower(),
+                    eject_seconds=float(os.environ.get('NEPTUNE_EJECT_SECONDS', '30')),
+                    slow_factor=float(os.environ.get('NEPTUNE_SLOW_FACTOR', '3')),
+                    probe_seconds=float(os.environ.get('NEPTUNE_PROBE_SECONDS', '10')))
+            pool_config = config
+        return pool
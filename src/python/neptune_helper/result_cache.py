@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from gremlin_python.process.traversal import T
+from gremlin_python.structure.graph import Edge, Graph, Path, Vertex
+from gremlin_python.structure.io.graphsonV3d0 import GraphSONWriter
+
+from util import getChild, SqliteKVStore
+
+logger = getChild(__name__)
+
+# Tags of the {tag: value} objects in encoded results: unlike unpickling, loading a shared cache file cannot run code
+DECODERS = {
+    '@map': dict,
+    '@set': set,
+    '@T': lambda name: T[name],
+    '@datetime': datetime.fromisoformat,
+    '@path': lambda v: Path(*v),
+    '@vertex': lambda v: Vertex(*v),
+    '@edge': lambda v: Edge(*v),
+}
+
+
+# Types encoded as themselves
+SCALARS = frozenset([type(None), str, bool, int, float])
+
+
+# 'a -> json
+def encode(v):
+    """Gremlin result v as JSON data, with tagged objects for maps, tokens, paths, ... see decode()
+
+    Raises TypeError for values it cannot restore, ex: elements with materialized properties"""
+    # exact type checks first: results are mostly lists and maps of scalars, so scalars are not recursed into
+    t = type(v)
+    if t in SCALARS:
+        return v
+    if t is list:
+        return [x if type(x) in SCALARS else encode(x) for x in v]
+    if t is dict:
+        return {'@map': [[k if type(k) is str else encode(k), x if type(x) in SCALARS else encode(x)]
+                         for k, x in v.items()]}
+    if t is T:
+        return {'@T': v._name_}
+    if isinstance(v, Path):
+        return {'@path': [encode(v.labels), encode(v.objects)]}
+    if isinstance(v, (set, frozenset)):
+        return {'@set': [encode(x) for x in v]}
+    if isinstance(v, datetime):
+        return {'@datetime': v.isoformat()}
+    if isinstance(v, (Vertex, Edge)) and not v.properties:
+        if isinstance(v, Vertex):
+            return {'@vertex': [encode(v.id), v.label]}
+        return {'@edge': [encode(v.id), encode(v.outV), v.label, encode(v.inV)]}
+    raise TypeError(f'Cannot cache {type(v).__name__} results')
+
+
+# {str -> json} -> 'a
+def decode(o):
+    """json.loads() object_hook inverting encode()"""
+    (tag, value), = o.items()
+    return DECODERS[tag](value)
+
+
+# Opt-in (NEPTUNE_RESULT_CACHE=1) cache of Gremlin results, keyed by the traversal's bytecode and endpoint
+#  Views issuing the same traversal share results, whatever their Python arguments. Entries expire
+#  NEPTUNE_RESULT_CACHE_TTL_SECONDS after they were fetched, and the least recently used are evicted
+#  beyond NEPTUNE_RESULT_CACHE_MAX_BYTES of encoded results, see encode(). In memory by default; with
+#  NEPTUNE_RESULT_CACHE_PATH, in a SQLite file that processes and replicas on a shared volume reuse
+class GremlinResultCache:
+
+    # float * int * ? str -> ()
+    def __init__(self, ttl_seconds=300, max_bytes=256 * 1024 * 1024, path=None):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> (fetched, bytes), least recently used first
+        self.size = 0
+        self.store = None if path is None else SqliteKVStore(path, max_bytes=max_bytes, ttl_seconds=ttl_seconds)
+        self.stats = {'hits': 0, 'misses': 0, 'puts': 0, 'evictions': 0, 'uncacheable': 0}
+
+    # Traversal * str -> ? str
+    def key(self, t, endpoint):
+        """Content hash of t's bytecode for endpoint, or None when it cannot be serialized, ex: lambdas"""
+        try:
+            bytecode = GraphSONWriter().write_object(t.bytecode)
+        except Exception:
+            logger.debug('Traversal not cacheable', exc_info=True)
+            self.count('uncacheable')
+            return None
+        return hashlib.sha256(f'{endpoint}\n{bytecode}'.encode('utf-8')).hexdigest()
+
+    # (GraphTraversalSource -> Traversal) * str -> ? str
+    def key_for(self, build, endpoint):
+        """key() of the traversal build(g) would issue: bytecode does not depend on the remote connection"""
+        return self.key(build(Graph().traversal()), endpoint)
+
+    # str -> ? 'a
+    def get(self, key):
+        now = time.time()
+        payload = None
+        if self.store is not None:
+            # the store's TTL slides on access: the fetch time prefix bounds staleness
+            value = self.store.get(key)
+            if value is not None:
+                fetched, encoded = value.split(':', 1)
+                if float(fetched) >= now - self.ttl_seconds:
+                    payload = encoded
+        else:
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is not None and entry[0] >= now - self.ttl_seconds:
+                    self.entries.move_to_end(key)
+                    payload = entry[1]
+        results = None
+        if payload is not None:
+            try:
+                results = json.loads(payload, object_hook=decode)
+            except (ValueError, KeyError, TypeError):
+                logger.warning('Ignoring unreadable Gremlin result cache entry %s', key, exc_info=True)
+        if results is None:
+            self.count('misses')
+            return None
+        self.count('hits')
+        return results
+
+    # str * 'a -> ()
+    def put(self, key, results):
+        try:
+            # ASCII, so characters are bytes
+            payload = json.dumps(encode(results), separators=(',', ':'))
+        except TypeError:
+            logger.debug('Results not cacheable', exc_info=True)
+            self.count('uncacheable')
+            return
+        if len(payload) > self.max_bytes:
+            logger.debug('Not caching %s bytes of results, over NEPTUNE_RESULT_CACHE_MAX_BYTES', len(payload))
+            return
+        self.count('puts')
+        if self.store is not None:
+            self.store.put(key, f'{time.time()}:{payload}')
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[1])
+            self.entries[key] = (time.time(), payload)
+            self.size += len(payload)
+            self.evict()
+
+    def evict(self):
+        expired = [k for k, (fetched, _) in self.entries.items() if fetched < time.time() - self.ttl_seconds]
+        for k in expired:
+            self.size -= len(self.entries.pop(k)[1])
+        while self.size > self.max_bytes:
+            _, (_, payload) = self.entries.popitem(last=False)
+            self.size -= len(payload)
+            self.stats['evictions'] += 1
+        self.stats['evictions'] += len(expired)
+
+    # str -> ()
+    def count(self, stat):
+        with self.lock:
+            self.stats[stat] += 1
+
+
+result_cache = None
+result_cache_lock = threading.Lock()
+
+
+# () -> ? GremlinResultCache
+def get_result_cache():
+    """Process-wide GremlinResultCache, or None unless NEPTUNE_RESULT_CACHE=1"""
+    global result_cache
+    if os.environ.get('NEPTUNE_RESULT_CACHE', '').strip().lower() not in ('1', 'true', 'yes', 'on'):
+        return None
+    with result_cache_lock:
+        if result_cache is None:
+            result_cache = GremlinResultCache(
+                ttl_seconds=float(os.environ.get('NEPTUNE_RESULT_CACHE_TTL_SECONDS', '300')),
+                max_bytes=int(os.environ.get('NEPTUNE_RESULT_CACHE_MAX_BYTES', str(256 * 1024 * 1024))),
+                path=os.environ.get('NEPTUNE_RESULT_CACHE_PATH') or None)
+        return result_cache
@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from components.GraphReducer import GraphReducer, connected_components
+
+
+def edges(pairs, weights=None):
+    df = pd.DataFrame(pairs, columns=['s', 'd'])
+    if weights is not None:
+        df['w'] = weights
+    return df
+
+
+def nodes(ids):
+    return pd.DataFrame({'n': ids, 'x': range(len(ids))})
+
+
+def endpoints(edges_df):
+    return set(edges_df['s']) | set(edges_df['d'])
+
+
+# hub 0 with 6 leaves, and a separate triangle 10-11-12
+STAR_AND_TRIANGLE = [(0, i) for i in range(1, 7)] + [(10, 11), (11, 12), (12, 10)]
+
+
+@pytest.mark.parametrize('strategy', GraphReducer.STRATEGIES)
+def test_within_budget_returned_as_is(strategy):
+    edges_df = edges(STAR_AND_TRIANGLE)
+    nodes_df = nodes([0, 1, 2, 3, 4, 5, 6, 10, 11, 12])
+    # budget at and beyond the edge count, and beyond the node count
+    for max_edges in [len(edges_df), len(edges_df) + 1, 1000]:
+        reducer = GraphReducer(max_edges=max_edges, strategy=strategy)
+        out_edges, out_nodes = reducer.reduce(edges_df, 's', 'd', nodes_df, 'n')
+        assert out_edges is edges_df and out_nodes is nodes_df
+        assert reducer.report['edges_after'] == len(edges_df) and reducer.report['nodes_after'] == len(nodes_df)
+
+
+@pytest.mark.parametrize('strategy', GraphReducer.STRATEGIES)
+def test_empty_edges(strategy):
+    edges_df = edges([], weights=[])
+    nodes_df = nodes([1, 2])
+    reducer = GraphReducer(max_edges=0, max_bytes=10, strategy=strategy, weight='w')
+    out_edges, out_nodes = reducer.reduce(edges_df, 's', 'd', nodes_df, 'n')
+    assert len(out_edges) == 0 and out_nodes is nodes_df
+    assert reducer.report['budget'] == 0
+
+
+@pytest.mark.parametrize('strategy', GraphReducer.STRATEGIES)
+def test_zero_budget(strategy):
+    edges_df = edges(STAR_AND_TRIANGLE)
+    out_edges, out_nodes = GraphReducer(max_edges=0, strategy=strategy).reduce(edges_df, 's', 'd', nodes([0, 10]), 'n')
+    assert len(out_edges) == 0 and len(out_nodes) == 0
+
+
+@pytest.mark.parametrize('strategy', GraphReducer.STRATEGIES)
+def test_preserves_rows_and_restricts_nodes(strategy):
+    edges_df = edges(STAR_AND_TRIANGLE, weights=np.arange(len(STAR_AND_TRIANGLE), dtype='float64'))
+    nodes_df = nodes([0, 1, 2, 3, 4, 5, 6, 10, 11, 12])
+    reducer = GraphReducer(max_edges=4, strategy=strategy, weight='w')
+    out_edges, out_nodes = reducer.reduce(edges_df, 's', 'd', nodes_df, 'n')
+    assert len(out_edges) == 4
+    assert out_edges.index.is_monotonic_increasing
+    assert out_edges.dtypes.equals(edges_df.dtypes)
+    assert set(out_nodes['n']) == endpoints(out_edges)
+    assert reducer.report == {
+        'strategy': strategy, 'budget': 4, 'edges_before': 9, 'edges_after': 4,
+        'nodes_before': 10, 'nodes_after': len(out_nodes)}
+
+
+def test_max_bytes_budget():
+    edges_df = edges(STAR_AND_TRIANGLE)
+    bytes_per_edge = edges_df.memory_usage(deep=True, index=True).sum() / len(edges_df)
+    reducer = GraphReducer(max_bytes=int(bytes_per_edge * 3))
+    assert reducer.budget(edges_df) == 3
+    assert GraphReducer(max_edges=2, max_bytes=10 ** 9).budget(edges_df) == 2
+
+
+def test_unknown_strategy():
+    with pytest.raises(ValueError):
+        GraphReducer(strategy='random')
+
+
+def test_top_k_heaviest():
+    edges_df = edges(STAR_AND_TRIANGLE, weights=[1, 9, 2, 8, 3, 7, 4, 6, 5])
+    out_edges, _ = GraphReducer(max_edges=3, strategy='top_k', weight='w').reduce(edges_df, 's', 'd')
+    assert sorted(out_edges['w'].tolist()) == [7, 8, 9]
+
+
+def test_top_k_ties_at_cutoff():
+    # the cutoff falls inside the run of 5s: earlier rows win, so reruns keep the same edges
+    edges_df = edges(STAR_AND_TRIANGLE, weights=[9, 5, 5, 5, 5, 1, 1, 1, 1])
+    out_edges, _ = GraphReducer(max_edges=3, strategy='top_k', weight='w').reduce(edges_df, 's', 'd')
+    assert out_edges.index.tolist() == [0, 1, 2]
+
+
+def test_top_k_missing_weights_last():
+    edges_df = edges(STAR_AND_TRIANGLE, weights=[None, 'x', 3, 1, 2, None, None, None, None])
+    out_edges, _ = GraphReducer(max_edges=3, strategy='top_k', weight='w').reduce(edges_df, 's', 'd')
+    assert out_edges.index.tolist() == [2, 3, 4]
+
+
+def test_unweighted_is_seeded():
+    edges_df = edges(STAR_AND_TRIANGLE)
+    first, _ = GraphReducer(max_edges=4, strategy='top_k').reduce(edges_df, 's', 'd')
+    again, _ = GraphReducer(max_edges=4, strategy='top_k').reduce(edges_df, 's', 'd')
+    assert first.index.tolist() == again.index.tolist()
+
+
+def test_degree_thins_hubs_keeps_small_neighborhoods():
+    # hubs a and b share 6 leaves, all heavier than the separate x-y edge
+    pairs = [('a', i) for i in range(6)] + [('b', i) for i in range(6)] + [('x', 'y')]
+    edges_df = edges(pairs, weights=list(range(20, 8, -1)) + [1])
+    out_edges, _ = GraphReducer(max_edges=8, strategy='degree', weight='w').reduce(edges_df, 's', 'd')
+    # each leaf keeps its strongest edge, b its strongest leaf, and x-y stays: only b's weaker edges go
+    assert out_edges.index.tolist() == [0, 1, 2, 3, 4, 5, 6, 12]
+    top_edges, _ = GraphReducer(max_edges=8, strategy='top_k', weight='w').reduce(edges_df, 's', 'd')
+    assert 12 not in top_edges.index
+
+
+def test_degree_ties_at_cutoff():
+    # all edges equally strong: the cutoff keeps them in row order
+    edges_df = edges([(0, 1), (2, 3), (4, 5), (6, 7)], weights=[1, 1, 1, 1])
+    out_edges, _ = GraphReducer(max_edges=2, strategy='degree', weight='w').reduce(edges_df, 's', 'd')
+    assert out_edges.index.tolist() == [0, 1]
+
+
+def test_components_largest_first():
+    # star (6 edges), triangle (3), pair (1)
+    edges_df = edges(STAR_AND_TRIANGLE + [(20, 21)])
+    out_edges, _ = GraphReducer(max_edges=9, strategy='components').reduce(edges_df, 's', 'd')
+    assert endpoints(out_edges) == {0, 1, 2, 3, 4, 5, 6, 10, 11, 12}
+
+
+def test_components_partial_fill():
+    # the triangle does not fit after the star: it is reduced with 'degree' to the remaining edge
+    edges_df = edges(STAR_AND_TRIANGLE)
+    out_edges, _ = GraphReducer(max_edges=7, strategy='components').reduce(edges_df, 's', 'd')
+    assert len(out_edges) == 7
+    assert out_edges.index[:6].tolist() == list(range(6))
+    assert endpoints(out_edges.iloc[6:]) <= {10, 11, 12}
+
+
+def test_components_ties_at_cutoff():
+    # two same-size components, room for one: the one seen first wins
+    edges_df = edges([(0, 1), (1, 2), (5, 6), (6, 7)])
+    out_edges, _ = GraphReducer(max_edges=2, strategy='components').reduce(edges_df, 's', 'd')
+    assert out_edges.index.tolist() == [0, 1]
+
+
+def test_connected_components():
+    s, d = np.array([0, 1, 3, 5]), np.array([1, 2, 4, 3])
+    assert connected_components(s, d, 7).tolist() == [0, 0, 0, 3, 3, 3, 6]
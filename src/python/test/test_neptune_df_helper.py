@@ -0,0 +1,59 @@
+from datetime import datetime
+from enum import Enum
+
+import pandas as pd
+
+from neptune_helper.df_helper import PathFrames, flatten_series, path_to_df
+
+# Stand-in for gremlin_python.process.traversal.T
+T = Enum('T', 'id label')
+
+
+def vertex(i, **props):
+    return {T.id: f'v{i}', T.label: 'user', **{k: [v] for k, v in props.items()}}
+
+
+def edge(i, **props):
+    return {T.id: f'e{i}', T.label: 'visited', **props}
+
+
+def test_path_frames_distinct_elements():
+    frames = PathFrames()
+    frames.add([[vertex(1, age=30), edge(1), vertex(2)]])
+    frames.add([[vertex(1, age=30), edge(2, ts=5), vertex(3, city='Austin')]])
+    nodes_df, edges_df = frames.to_dfs()
+    assert frames.paths == 2
+    assert list(nodes_df.columns) == ['age', 'city', 'id', 'label']
+    assert nodes_df['id'].tolist() == ['v1', 'v2', 'v3']
+    assert nodes_df['city'].isna().tolist() == [True, True, False]
+    assert list(edges_df.columns) == ['ts', 'id', 'label', 'source', 'target']
+    assert edges_df[['source', 'target']].values.tolist() == [['v1', 'v2'], ['v1', 'v3']]
+
+
+def test_path_frames_reserved_property_names():
+    nodes_df, edges_df = path_to_df([
+        [vertex(1, id='prop-id', label='prop-label'), edge(1, source='s', target='t', id='x'), vertex(2)]
+    ])
+    assert nodes_df.to_dict('records') == [{'id': 'v1', 'label': 'user'}, {'id': 'v2', 'label': 'user'}]
+    assert edges_df.to_dict('records') == [{'id': 'e1', 'label': 'visited', 'source': 'v1', 'target': 'v2'}]
+
+
+def test_flatten_series_kinds():
+    assert flatten_series(pd.Series(['a', None], dtype=object)) is None
+    assert flatten_series(pd.Series([1, 2], dtype=object)).dtype == 'int64'
+    assert flatten_series(pd.Series([1, None], dtype=object)).dtype == 'Int64'
+    assert flatten_series(pd.Series([True, False], dtype=object)).dtype == 'bool'
+    assert flatten_series(pd.Series([1.5, 2], dtype=object)).dtype == 'float64'
+    assert pd.api.types.is_datetime64_any_dtype(
+        flatten_series(pd.Series([datetime(2020, 1, 1), None], dtype=object)))
+
+
+def test_flatten_series_mixed():
+    out = flatten_series(pd.Series([['a', 'b'], 1, 'c', None], dtype=object))
+    assert out.tolist()[:3] == ['a,b', '1', 'c']
+    assert out.isna().tolist() == [False, False, False, True]
+
+
+def test_flatten_series_beyond_int64():
+    out = flatten_series(pd.Series([2**70, 1], dtype=object))
+    assert out.tolist() == [str(2**70), '1']
@@ -0,0 +1,104 @@
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+pytest.importorskip('gremlin_python')
+
+from gremlin_python.driver.protocol import GremlinServerError  # noqa: E402
+
+from neptune_helper.gremlin_helper import GremlinLoadBalancer, QueryCancelled, reader_endpoints  # noqa: E402
+
+
+class FakePool:
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.stats = {}
+
+    @contextmanager
+    def connection(self, timeout=None):
+        yield self
+
+    def close(self):
+        pass
+
+
+def test_reader_endpoints(monkeypatch):
+    monkeypatch.setenv('NEPTUNE_READER_PROTOCOL', 'wss')
+    monkeypatch.setenv('NEPTUNE_READER_PORT', '8182')
+    monkeypatch.setenv('NEPTUNE_READER_HOST', ' replica-1.example.com, replica-2.example.com:9999,,')
+    assert reader_endpoints() == [
+        'wss://replica-1.example.com:8182/gremlin',
+        'wss://replica-2.example.com:9999/gremlin',
+    ]
+
+
+def balancer(strategy, n=3):
+    return GremlinLoadBalancer([FakePool(f'r{i}') for i in range(n)], strategy=strategy, probe_seconds=0)
+
+
+def endpoints(readers):
+    return [r.pool.endpoint for r in readers]
+
+
+def test_pick_round_robin():
+    lb = balancer('round_robin')
+    assert endpoints([lb.pick() for _ in range(4)]) == ['r0', 'r1', 'r2', 'r0']
+
+
+def test_pick_least_outstanding():
+    lb = balancer('least_outstanding')
+    # all idle: ties are broken round-robin
+    first = [lb.pick() for _ in range(3)]
+    assert endpoints(first) == ['r0', 'r1', 'r2']
+    lb.record_done(first[0])
+    lb.record_done(first[2])
+    lb.readers[2].outstanding += 1
+    assert endpoints([lb.pick()]) == ['r0']
+
+
+def test_pick_skips_ejected():
+    lb = balancer('round_robin')
+    lb.eject(lb.readers[1], 'test')
+    assert 'r1' not in endpoints([lb.pick() for _ in range(4)])
+    for reader in lb.readers:
+        lb.eject(reader, 'test')
+    # all ejected: all used again
+    assert sorted(endpoints([lb.pick() for _ in range(3)])) == ['r0', 'r1', 'r2']
+
+
+def run_failing(lb, exn):
+    with pytest.raises(type(exn)):
+        with lb.connection():
+            raise exn
+
+
+@pytest.mark.parametrize('exn', [
+    TimeoutError('deadline'), QueryCancelled('cancelled'), GremlinServerError({'code': 597, 'message': 'bad', 'attributes': {}})])
+def test_query_errors_are_not_reader_failures(monkeypatch, exn):
+    lb = balancer('round_robin', n=1)
+    monkeypatch.setattr(lb, 'probe', lambda *args: pytest.fail('probed'))
+    run_failing(lb, exn)
+    assert lb.readers[0].outstanding == 0 and lb.readers[0].stats['failures'] == 0
+
+
+def test_connection_failure_probes_in_background(monkeypatch):
+    lb = balancer('round_robin', n=1)
+    request_thread = threading.current_thread()
+    probed, release = threading.Event(), threading.Event()
+
+    def probe(reader, reason):
+        assert threading.current_thread() is not request_thread
+        release.wait(5)
+        lb.eject(reader, reason)
+        probed.set()
+
+    monkeypatch.setattr(lb, 'probe', probe)
+    run_failing(lb, RuntimeError('Connection was closed by server.'))
+    # returned before the probe finished, and concurrent failures do not start more probes
+    run_failing(lb, RuntimeError('Connection was closed by server.'))
+    reader = lb.readers[0]
+    assert reader.stats['failures'] == 2 and reader.outstanding == 0 and reader.stats['ejections'] == 0
+    release.set()
+    assert probed.wait(5)
+    assert reader.stats['ejections'] == 1
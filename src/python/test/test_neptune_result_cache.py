@@ -0,0 +1,38 @@
+from datetime import datetime, timezone
+
+import pytest
+
+pytest.importorskip('gremlin_python')
+
+from gremlin_python.process.traversal import T  # noqa: E402
+from gremlin_python.structure.graph import Edge, Path, Vertex  # noqa: E402
+
+from neptune_helper.result_cache import GremlinResultCache  # noqa: E402
+
+RESULTS = [
+    [
+        {T.id: 'v1', T.label: 'user', 'age': [30], 'score': [1.5], 'since': [datetime(2020, 1, 1, tzinfo=timezone.utc)]},
+        Path([{'a'}, set()], [{T.id: 'v2', 'big': [2**70]}, Vertex('v3', 'user')]),
+        Edge('e1', Vertex('v1'), 'visited', Vertex('v2')),
+        {'tags': {'x', 'y'}, 1: None},
+    ],
+    [],
+]
+
+
+@pytest.mark.parametrize('in_sqlite', [False, True])
+def test_round_trip(tmp_path, in_sqlite):
+    cache = GremlinResultCache(path=str(tmp_path / 'results.sqlite') if in_sqlite else None)
+    cache.put('k', RESULTS)
+    assert repr(cache.get('k')) == repr(RESULTS)
+    assert cache.get('missing') is None
+    assert cache.stats['hits'] == 1 and cache.stats['misses'] == 1
+
+
+def test_uncacheable_and_unreadable(tmp_path):
+    cache = GremlinResultCache(path=str(tmp_path / 'results.sqlite'))
+    cache.put('k', [object()])
+    assert cache.stats['uncacheable'] == 1 and cache.stats['puts'] == 0
+    cache.store.put('pickled', f'{datetime.now().timestamp()}:gASVBQAAAAAAAACMAXiULg==')
+    cache.store.put('untagged', f'{datetime.now().timestamp()}:{{"a": 1}}')
+    assert cache.get('pickled') is None and cache.get('untagged') is None
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from TigerGraph_helper.df_helper import binned_colors, edges_to_nodes_df, lookup_colors, transactions_to_df
+
+
+def edges(rows):
+    return pd.DataFrame(rows, columns=['from_id', 'from_type', 'to_id', 'to_type'])
+
+
+def test_edges_to_nodes_df_first_appearance():
+    edges_df = edges([('1', 'User', '2', 'Device'), ('3', 'User', '1', 'User'), ('2', 'Device', '4', 'Card')])
+    nodes_df = edges_to_nodes_df(edges_df)
+    assert nodes_df['n'].tolist() == ['1', '2', '3', '4']
+    assert nodes_df['type'].tolist() == ['User', 'Device', 'User', 'Card']
+
+
+def test_edges_to_nodes_df_values():
+    edges_df = edges([('1', 'User', '2', 'User'), ('2', 'User', '3', 'User')])
+    # 2 is first seen as a destination, so its value comes from to_values
+    nodes_df = edges_to_nodes_df(
+        edges_df, from_values={'1': [0.1], '2': [0.9]}, to_values={'2': [0.5], '3': []}, value='trust', default=0)
+    assert nodes_df['trust'].tolist() == [0.1, 0.5, 0]
+
+
+def test_edges_to_nodes_df_empty():
+    nodes_df = edges_to_nodes_df(edges([]), node='id', from_values={}, to_values={})
+    assert list(nodes_df.columns) == ['id', 'type', 'value']
+    assert len(nodes_df) == 0
+
+
+def test_lookup_colors():
+    colors = lookup_colors(pd.Series(['a', 'b', None, 'a']), {'a': 1}, default=7)
+    assert colors.tolist() == [1, 7, 7, 1]
+
+
+def test_binned_colors():
+    colors = binned_colors(pd.Series([0.0, 0.2, 0.39, 0.4, 1.0]), [0.2, 0.4], [10, 20, 30])
+    assert colors.tolist() == [10, 20, 20, 30, 30]
+    assert isinstance(colors, np.ndarray)
+
+
+def test_transactions_to_df():
+    def transfer(day, amount):
+        return {'attributes': {'ts': pd.Timestamp(day).timestamp(), 'amount': amount}}
+
+    df = transactions_to_df({
+        'transfer': [transfer('2020-09-13', 5), transfer('2020-09-14', 7)],
+        'receive': [transfer('2020-05-20', 3)]})
+    assert df.to_dict('list') == {
+        'Type': ['receive', 'transfer'], 'Color': ['rgba(0,0,255,0.5)', 'rgba(255,0,0,0.5)'], 'Amount': [3, 12]}
+    assert df.index.strftime('%Y-%m').tolist() == ['2020-05', '2020-09']
@@ -0,0 +1,35 @@
+import pytest
+
+pytest.importorskip('pyTigerGraph')
+
+from TigerGraph_helper.tg_helper import QueryCatalog, query_gsql  # noqa: E402
+
+LS = """---- Graph AntiFraud
+Vertex Types:
+  - VERTEX User(PRIMARY_ID id UINT, trust_score FLOAT) WITH STATS="OUTDEGREE_BY_EDGETYPE"
+Edge Types:
+  - UNDIRECTED EDGE User_to_Device(FROM User, TO Device_Token)
+
+Queries:
+  - totalTransaction(vertex<User> Source) (installed v2)
+  - fraudConnectivityGraph(vertex<User> inputUser)
+  - circleDetection(vertex<User> srcId) (installed v2)
+
+Data Sources:
+  - s3 my_source(config)
+"""
+
+
+def test_parse_ls():
+    defined, installed = QueryCatalog.parse_ls(LS)
+    assert defined == ['totalTransaction', 'fraudConnectivityGraph', 'circleDetection']
+    assert installed == ['totalTransaction', 'circleDetection']
+
+
+def test_parse_ls_without_queries():
+    assert QueryCatalog.parse_ls('---- Graph AntiFraud\nVertex Types:\n  - VERTEX User(PRIMARY_ID id UINT)\n') == ([], [])
+
+
+def test_query_gsql():
+    gsql = query_gsql('totalTransaction', 'MyGraph')
+    assert 'CREATE QUERY totalTransaction(Vertex<User> Source) FOR GRAPH MyGraph {' in gsql
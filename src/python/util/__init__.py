@@ -1 +1,3 @@
 from .log import getChild
+from .kv_store import SqliteKVStore
+from .tracer import Tracer
@@ -0,0 +1,179 @@
+"""Import-time profiler for entrypoint.py, components and views
+
+Enable with IMPORT_PROFILE=1 (independent of LOG_LEVEL). Every module imported after start()
+is timed, including transitive dependencies like graphistry, pandas, gremlin_python and splunklib.
+report() emits one JSON line per batch of newly imported modules, to IMPORT_PROFILE_PATH when set
+(appended, for tracking cold-start regressions across releases) and otherwise to stderr.
+
+Standalone, from src/python:  python -m util.import_profile components views.demo_01_fancy
+"""
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+
+IMPORT_PROFILE_VAR = "IMPORT_PROFILE"
+IMPORT_PROFILE_PATH_VAR = "IMPORT_PROFILE_PATH"
+IMPORT_PROFILE_TOP_VAR = "IMPORT_PROFILE_TOP"
+
+# first-party packages under src/python, reported individually with their inclusive times
+APP_PACKAGES = ["components", "css", "neptune_helper", "TigerGraph_helper", "util", "views"]
+
+
+class ImportTimer:
+    """Meta path finder that delegates to the regular finders and times each loader's exec_module
+
+    Times are inclusive ('cumulative_s') and exclusive of nested imports ('self_s')"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.records = []  # [ { 'module': str, 'parent': ? str, 'cumulative_s': float, 'self_s': float } ]
+        self.reported = 0
+
+    def find_spec(self, fullname, path, target=None):
+        if getattr(self.local, "finding", False):
+            return None
+        self.local.finding = True
+        try:
+            spec = None
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    break
+        finally:
+            self.local.finding = False
+        if spec is not None:
+            self.wrap_loader(spec)
+        return spec
+
+    def wrap_loader(self, spec):
+        loader = spec.loader
+        # builtin/frozen importers are shared classes, and cheap: leave them be
+        if loader is None or isinstance(loader, type) or not hasattr(loader, "exec_module"):
+            return
+        exec_module = loader.exec_module
+        name = spec.name
+
+        def timed_exec_module(module):
+            stack = self.stack()
+            frame = {"module": name, "child_s": 0.0}
+            stack.append(frame)
+            start = time.perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                elapsed = time.perf_counter() - start
+                stack.pop()
+                if len(stack) > 0:
+                    stack[-1]["child_s"] += elapsed
+                with self.lock:
+                    self.records.append({
+                        "module": name,
+                        "parent": stack[-1]["module"] if len(stack) > 0 else None,
+                        "cumulative_s": elapsed,
+                        "self_s": elapsed - frame["child_s"],
+                    })
+
+        try:
+            loader.exec_module = timed_exec_module
+        except AttributeError:
+            pass  # slotted loaders
+
+    def stack(self):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    # ? int -> ? dict
+    def take_report(self, label=None, top=None):
+        with self.lock:
+            records = self.records[self.reported:]
+            self.reported = len(self.records)
+        if len(records) == 0:
+            return None
+        top = int(os.environ.get(IMPORT_PROFILE_TOP_VAR, "25")) if top is None else top
+
+        # roots: imports issued directly by app code (entrypoint.py, AppPicker, views)
+        roots = sorted([r for r in records if r["parent"] is None], key=lambda r: -r["cumulative_s"])
+
+        app_modules = sorted(
+            [r for r in records if r["module"].split(".")[0] in APP_PACKAGES],
+            key=lambda r: -r["cumulative_s"])
+
+        packages = {}
+        for r in records:
+            pkg = r["module"].split(".")[0]
+            if pkg not in packages:
+                packages[pkg] = {"package": pkg, "self_s": 0.0, "modules": 0}
+            packages[pkg]["self_s"] += r["self_s"]
+            packages[pkg]["modules"] += 1
+
+        return {
+            "event": "import_profile",
+            "label": label,
+            "pid": os.getpid(),
+            "time": time.time(),
+            "total_s": sum([r["cumulative_s"] for r in roots]),
+            "module_count": len(records),
+            "roots": roots,
+            "app_modules": app_modules,
+            "packages": sorted(packages.values(), key=lambda p: -p["self_s"])[:top],
+            "slowest_modules": sorted(records, key=lambda r: -r["self_s"])[:top],
+        }
+
+
+timer = None
+
+
+def is_enabled():
+    return os.environ.get(IMPORT_PROFILE_VAR, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+# () -> ? ImportTimer
+def start(force=False):
+    """Install the import timer at the front of sys.meta_path; idempotent across Streamlit reruns"""
+    global timer
+    if not (force or is_enabled()):
+        return None
+    if timer is None:
+        timer = ImportTimer()
+        sys.meta_path.insert(0, timer)
+    return timer
+
+
+# ? str -> ? dict
+def report(label=None):
+    """Emit modules imported since the last report, if any"""
+    if timer is None:
+        return None
+    out = timer.take_report(label=label)
+    if out is None:
+        return None
+
+    line = json.dumps(out)
+    path = os.environ.get(IMPORT_PROFILE_PATH_VAR)
+    if path:
+        with open(path, "a") as f:
+            f.write(line + "\n")
+    else:
+        sys.stderr.write(line + "\n")
+
+    sys.stderr.write(
+        f"import_profile[{label}]: {out['module_count']} modules, {out['total_s']:0.3f}s\n"
+        + "".join([f"  {r['cumulative_s']:8.3f}s  {r['module']}\n" for r in out["app_modules"][:10]])
+        + "".join([f"  {p['self_s']:8.3f}s  self  {p['package']} ({p['modules']} modules)\n" for p in out["packages"][:10]])
+    )
+    sys.stderr.flush()
+    return out
+
+
+if __name__ == "__main__":
+    start(force=True)
+    for mod_name in sys.argv[1:] or ["components"]:
+        importlib.import_module(mod_name)
+    report(label="cli")
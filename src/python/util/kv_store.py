@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from .log import getChild
+
+logger = getChild(__name__)
+
+
+class SqliteKVStore:
+    """Persistent str -> str store in a local SQLite file, safe across threads and processes
+
+    Entries expire ttl_seconds after their last access, and the least recently accessed
+    entries are evicted once the stored values exceed max_bytes. Access times are only
+    rewritten when older than touch_seconds, so hot reads stay read-only."""
+
+    def __init__(self, path: str, max_bytes: int = 100 * 1024 * 1024, ttl_seconds: Optional[float] = None,
+                 touch_seconds: float = 60):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.touch_seconds = touch_seconds
+        self.lock = threading.Lock()
+        self.conn = None
+        self.stats = {'hits': 0, 'misses': 0, 'puts': 0, 'evictions': 0}
+
+    def _connect(self):
+        if self.conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS kv ('
+                ' key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS kv_accessed ON kv (accessed)')
+            self.conn = conn
+        return self.conn
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self.lock:
+            conn = self._connect()
+            row = conn.execute('SELECT value, accessed FROM kv WHERE key = ?', (key,)).fetchone()
+            if row is None or (self.ttl_seconds is not None and row[1] < now - self.ttl_seconds):
+                self.stats['misses'] += 1
+                return None
+            if row[1] < now - self.touch_seconds:
+                conn.execute('UPDATE kv SET accessed = ? WHERE key = ?', (now, key))
+            self.stats['hits'] += 1
+            return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        with self.lock:
+            conn = self._connect()
+            conn.execute(
+                'INSERT OR REPLACE INTO kv (key, value, size, accessed) VALUES (?, ?, ?, ?)',
+                (key, value, len(value), time.time()))
+            self.stats['puts'] += 1
+            self._evict(conn)
+
+    def delete(self, key: str) -> None:
+        with self.lock:
+            self._connect().execute('DELETE FROM kv WHERE key = ?', (key,))
+
+    def _evict(self, conn):
+        evicted = 0
+        if self.ttl_seconds is not None:
+            evicted += conn.execute('DELETE FROM kv WHERE accessed < ?', (time.time() - self.ttl_seconds,)).rowcount
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM kv').fetchone()[0]
+        if total > self.max_bytes:
+            # drop least recently accessed entries until under budget
+            freed = 0
+            doomed = []
+            for key, size in conn.execute('SELECT key, size FROM kv ORDER BY accessed ASC'):
+                if total - freed <= self.max_bytes:
+                    break
+                doomed.append((key,))
+                freed += size
+            conn.executemany('DELETE FROM kv WHERE key = ?', doomed)
+            evicted += len(doomed)
+        if evicted > 0:
+            self.stats['evictions'] += evicted
+            logger.debug('Evicted %s entries from %s', evicted, self.path)
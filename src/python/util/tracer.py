@@ -0,0 +1,78 @@
+import time
+from contextlib import contextmanager
+
+from .log import getChild
+
+logger = getChild(__name__)
+
+
+class Tracer:
+    """Timings of the named stages of one view run, ex: query, transform, flatten, upload, render
+
+    Create one per run (not per module) so concurrent sessions never share timings. Cached
+    functions trace into their own Tracer and return its snapshot() with their result; the
+    caller merge()s it, and a snapshot created before the caller's Tracer is a cache replay,
+    so its spans are marked cached instead of reported as if they had just run."""
+
+    # ? str -> ()
+    def __init__(self, name=None):
+        self.name = name
+        self.created = time.time()
+        # [ { 'stage': str, 'seconds': float, 'cached': bool } ]
+        self.spans = []
+        self.counts = {}
+
+    @contextmanager
+    def span(self, stage):
+        tic = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.record(stage, time.perf_counter() - tic)
+
+    # str * float * bool -> ()
+    def record(self, stage, seconds, cached=False):
+        self.spans.append({"stage": stage, "seconds": seconds, "cached": cached})
+        logger.debug("%s: %s took %0.3fs%s", self.name, stage, seconds, " (cached)" if cached else "")
+
+    # str * 'a -> ()
+    def count(self, name, value):
+        self.counts[name] = value
+
+    # () -> { 'name': ? str, 'created': float, 'spans': [...], 'counts': {...} }
+    def snapshot(self):
+        return {
+            "name": self.name,
+            "created": self.created,
+            "spans": [{**s} for s in self.spans],
+            "counts": {**self.counts},
+        }
+
+    # ? dict -> ()
+    def merge(self, snapshot):
+        if snapshot is None:
+            return
+        cached = snapshot["created"] < self.created
+        for s in snapshot["spans"]:
+            self.record(s["stage"], s["seconds"], s["cached"] or cached)
+        self.counts.update(snapshot["counts"])
+
+    # str -> float
+    def seconds(self, stage):
+        return sum([s["seconds"] for s in self.spans if s["stage"] == stage])
+
+    # str -> bool
+    def is_cached(self, stage):
+        spans = [s for s in self.spans if s["stage"] == stage]
+        return len(spans) > 0 and all([s["cached"] for s in spans])
+
+    # str -> str
+    def format(self, stage):
+        return f"{self.seconds(stage):0.2f}" + (" (cached)" if self.is_cached(stage) else "")
+
+    # {str -> str} * {str -> str} -> str
+    def footer_html(self, stages, counts=None):
+        """<small> footer of 'Label: value' pairs, from {stage: label} and {count name: label}"""
+        items = [f"{label}: {self.format(stage)}" for stage, label in stages.items()]
+        items += [f"{label}: {self.counts.get(name, '')}" for name, label in (counts or {}).items()]
+        return "<small>\n" + " |\n".join(items) + "\n</small>"
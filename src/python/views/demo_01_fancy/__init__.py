@@ -31,6 +31,13 @@ def run():
     run_all()
 
 
+# Prewarm caches with the sidebar_area() defaults, see components/Warmup.py
+def warmup():
+    n = 100
+    # same keyword order as sidebar_area(): st.cache_data keys keyword arguments in call order
+    run_filters(n=n, edges_df=build_edges_df(n), node_type='all', node_range=(0, n))
+
+
 ############################################
 #
 #   CUSTOM CSS
@@ -58,26 +65,7 @@ def sidebar_area():
     n = st.sidebar.number_input('Number of nodes', min_value=10, max_value=100000, value=n_init, step=20)
     urlParams.set_field('N', n)
 
-    base_url = os.environ.get('BASE_URL', 'http://localhost:8501')
-
-    edges_df = pd.concat([
-        pd.DataFrame({
-            's': [x for x in range(n)],
-            'd': [(x + 1) % n for x in range(n)],
-            'link': [
-                '<a href="' + base_url + '/?view_index=app1&app1_N=' + str(x % n) + '">' + str(x % n) + " nodes</a>"
-                for x in range(n)
-            ]
-        }),
-        pd.DataFrame({
-            's': [x for x in range(n)],
-            'd': [(x + 6) % n for x in range(n)],
-            'link': [
-                '<a href="' + base_url + '/?view_index=app1&app1_N=' + str(x % n) + '">' + str(x % n) + " nodes</a>"
-                for x in range(n)
-            ]
-        })
-    ], sort=False, ignore_index=True)
+    edges_df = build_edges_df(n)
 
     st.sidebar.title("Filter")
     option_to_label = {
@@ -113,6 +101,30 @@ def sidebar_area():
     }
 
 
+def build_edges_df(n):
+
+    base_url = os.environ.get('BASE_URL', 'http://localhost:8501')
+
+    return pd.concat([
+        pd.DataFrame({
+            's': [x for x in range(n)],
+            'd': [(x + 1) % n for x in range(n)],
+            'link': [
+                '<a href="' + base_url + '/?view_index=app1&app1_N=' + str(x % n) + '">' + str(x % n) + " nodes</a>"
+                for x in range(n)
+            ]
+        }),
+        pd.DataFrame({
+            's': [x for x in range(n)],
+            'd': [(x + 6) % n for x in range(n)],
+            'link': [
+                '<a href="' + base_url + '/?view_index=app1&app1_N=' + str(x % n) + '">' + str(x % n) + " nodes</a>"
+                for x in range(n)
+            ]
+        })
+    ], sort=False, ignore_index=True)
+
+
 ############################################
 #
 #   FILTER PIPELINE
@@ -171,7 +183,7 @@ def plot_url(edges_df, n):
     if not GraphistrySt().test_login():
         return ''
 
-    url = graphistry\
+    g = graphistry\
             .bind(source="s", destination="d")\
             .edges(edges_df)\
             .nodes(nodes_df)\
@@ -180,8 +192,8 @@ def plot_url(edges_df, n):
                 'pointSize': 0.3,
                 'splashAfter': 'false',
                 'bg': '%23' + 'f0f2f6'
-            })\
-            .plot(render=False)
+            })
+    url = GraphistrySt().plot_url(g)
 
     logger.info('Generated viz, got back urL: %s', url)
 
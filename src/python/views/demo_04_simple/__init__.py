@@ -28,6 +28,11 @@ def run():
     run_all()
 
 
+# Prewarm caches with the sidebar_area() defaults, see components/Warmup.py
+def warmup():
+    run_filters(num_nodes=100, num_edges=100)
+
+
 ############################################
 #
 #   PIPELINE PIECES
@@ -68,10 +73,9 @@ def run_filters(num_nodes, num_edges):
         's': [x % num_nodes for x in range(0, num_edges)],
         'd': [(x + 1) % num_nodes for x in range(0, num_edges)],
     })
-    graph_url = \
-        graphistry.nodes(nodes_df).edges(edges_df) \
-            .bind(source='s', destination='d', node='n')\
-            .plot(render=False)
+    g = graphistry.nodes(nodes_df).edges(edges_df) \
+            .bind(source='s', destination='d', node='n')
+    graph_url = GraphistrySt().plot_url(g)
     return { 'nodes_df': nodes_df, 'edges_df': edges_df, 'graph_url': graph_url }
 
 
@@ -56,6 +56,17 @@ def run():
     run_all()
 
 
+# Prewarm the Splunk client and cluster ID list used by the sidebar, see components/Warmup.py
+def warmup():
+    splunk_username: str = os.getenv("SPLUNK_USERNAME")
+    splunk_password: str = os.getenv("SPLUNK_PASSWORD")
+    splunk_host: str = os.getenv("SPLUNK_HOST")
+    if splunk_username is None or splunk_password is None or splunk_host is None:
+        return
+    splunk_client = cache_splunk_client(splunk_username, splunk_password, splunk_host)
+    fetch_unique_values(splunk_client, INDEX, "general_cluster")
+
+
 ############################################
 #
 #   PIPELINE PIECES
@@ -213,7 +224,7 @@ def run_filters(splunk_client, cluster_id, general_probability, start_datetime,
             # Generate the graph
             marlowe: AVRMarlowe = AVRMarlowe(data_resource=data_resource)
             g: Plottable = marlowe.umap()
-            graph_url: str = g.plot(render=False)
+            graph_url: str = GraphistrySt().plot_url(g)
 
         # components.iframe(src=graph_url, height=HEIGHT, width=WIDTH, scrolling=True)
     else:
@@ -272,7 +283,7 @@ def run_all():
 
             # First we need to get all the unique
             with st.spinner("Retrieving cluster IDs from Splunk ..."):
-                cluster_select_values = ["None"] + splunk_client.get_unique_values("avr_59k", "general_cluster")
+                cluster_select_values = ["None"] + fetch_unique_values(splunk_client, INDEX, "general_cluster")
 
             # Render sidebar and get current settings
             sidebar_params = sidebar_area(cluster_id, general_probability, cluster_select_values)
@@ -300,6 +311,12 @@ def cache_splunk_client(username: str, password: str, host: str) -> SplunkConnec
     return splunk_client
 
 
+# Cache distinct field values, which otherwise cost a Splunk round-trip per rerun
+@st.cache_data(ttl=60 * 60)
+def fetch_unique_values(_splunk_client: SplunkConnection, index: str, field: str) -> List:
+    return _splunk_client.get_unique_values(index, field)
+
+
 def is_float_str(s: str) -> bool:
     """is_float_str Is it a float string?"""
 
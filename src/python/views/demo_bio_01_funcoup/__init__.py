@@ -1,5 +1,5 @@
 import graphistry, os, pandas as pd, streamlit as st
-from components import GraphistrySt, URLParam
+from components import GraphistrySt, GraphReducer, URLParam
 from graphistry import PyGraphistry
 from css import all_css
 from time import sleep
@@ -16,6 +16,7 @@ import logging
 app_id = 'app_bio_01'
 logger = logging.getLogger(app_id)
 urlParams = URLParam(app_id)
+MAX_EDGES = 50000  # Reasonable limit for Graphistry upload
 
 
 def info():
@@ -31,6 +32,12 @@ def run():
     run_all()
 
 
+# Prewarm the download and default graph of sidebar_area(), see components/Warmup.py
+def warmup():
+    edges_df = fetch_edges_df('B.subtilis', 'compact')
+    run_filters(edges_df=edges_df, node_type='PPV', umap_type=False)
+
+
 ############################################
 #
 #   CUSTOM CSS
@@ -129,29 +136,19 @@ def sidebar_area():
             format_func=(lambda option: edge_to_label[option]))
     urlParams.set_field('filter_by_node', filter_by_node_type)
 
-    
+
     try:
-        # Updated to use FC6.0 with new URL structure
-        url = f'https://funcoup.org/download/network&FC6.0_{filter_by_org_type}_{filter_by_net_type}.gz'
-        logger.info("Attempting to load data from: %s", url)
-        edges_df = pd.read_csv(url, sep='\t')
-    except Exception as e:
-        logger.error("Failed to load data from funcoup.org: %s", e)
-        # Try fallback to old FC5.0 URL structure
-        try:
-            old_url = f'https://funcoup.org/downloads/download.action?type=network&instanceID=24480085&fileName=FC5.0_{filter_by_org_type}_{filter_by_net_type}.gz'
-            logger.info("Trying fallback URL: %s", old_url)
-            edges_df = pd.read_csv(old_url, sep='\t')
-        except Exception as e2:
-            logger.error("Fallback URL also failed: %s", e2)
-            # Create a minimal demo dataset as fallback with proper column structure
-            edges_df = pd.DataFrame({
-                'Gene1': ['GeneA', 'GeneB', 'GeneC'],
-                'Gene2': ['GeneB', 'GeneC', 'GeneD'],
-                'PPV': [0.8, 0.9, 0.7],
-                'FBS_max': [0.6, 0.8, 0.5]
-            })
-            st.sidebar.warning("⚠️ External data source unavailable. Using demo dataset.")
+        edges_df = fetch_edges_df(filter_by_org_type, filter_by_net_type)
+    except Exception as e2:
+        logger.error("Fallback URL also failed: %s", e2)
+        # Create a minimal demo dataset as fallback with proper column structure
+        edges_df = pd.DataFrame({
+            'Gene1': ['GeneA', 'GeneB', 'GeneC'],
+            'Gene2': ['GeneB', 'GeneC', 'GeneD'],
+            'PPV': [0.8, 0.9, 0.7],
+            'FBS_max': [0.6, 0.8, 0.5]
+        })
+        st.sidebar.warning("⚠️ External data source unavailable. Using demo dataset.")
 
     return {
         'edges_df': edges_df,
@@ -160,6 +157,22 @@ def sidebar_area():
     }
 
 
+# Downloads are cached across reruns and sessions; failures are not cached, so they get retried
+@st.cache_data(ttl=60 * 60 * 24)
+def fetch_edges_df(org_type, net_type):
+    try:
+        # Updated to use FC6.0 with new URL structure
+        url = f'https://funcoup.org/download/network&FC6.0_{org_type}_{net_type}.gz'
+        logger.info("Attempting to load data from: %s", url)
+        return pd.read_csv(url, sep='\t')
+    except Exception as e:
+        logger.error("Failed to load data from funcoup.org: %s", e)
+        # Try fallback to old FC5.0 URL structure
+        old_url = f'https://funcoup.org/downloads/download.action?type=network&instanceID=24480085&fileName=FC5.0_{org_type}_{net_type}.gz'
+        logger.info("Trying fallback URL: %s", old_url)
+        return pd.read_csv(old_url, sep='\t')
+
+
 ############################################
 #
 #   FILTER PIPELINE
@@ -191,12 +204,13 @@ def run_filters(edges_df, node_type, umap_type=False):
             'ProteinB': 'Gene2'
         })
 
-    # Limit dataset size to prevent 502 errors
-    MAX_EDGES = 50000  # Reasonable limit for Graphistry upload
-    if len(filtered_edges_df) > MAX_EDGES:
-        logger.warning("Dataset too large (%d edges), sampling to %d edges", len(filtered_edges_df), MAX_EDGES)
-        filtered_edges_df = filtered_edges_df.sample(n=MAX_EDGES, random_state=42)
-        st.sidebar.warning(f"⚠️ Dataset too large ({len(filtered_edges_df)} edges), showing random sample of {MAX_EDGES} edges.")
+    # Limit dataset size to prevent 502 errors: each gene keeps its strongest links by the selected evidence
+    reducer = GraphReducer(max_edges=MAX_EDGES, strategy='degree', weight=node_type)
+    filtered_edges_df, _ = reducer.reduce(filtered_edges_df, 'Gene1', 'Gene2')
+    if reducer.report['edges_after'] < reducer.report['edges_before']:
+        st.sidebar.warning(
+            f"⚠️ Dataset too large ({reducer.report['edges_before']} edges), "
+            f"showing the strongest {reducer.report['edges_after']} links by {node_type} per gene.")
 
     # include viz generation as part of cache
     url = plot_url(filtered_edges_df,node_type,umap_type)
@@ -232,7 +246,7 @@ def plot_url(edges_df,node_type, umap_type=False):
     
     if umap_type == False:
         try:
-            url = graphistry\
+            g = graphistry\
                     .edges(edges_df)\
                     .bind(source="Gene1", destination="Gene2", edge_weight=node_type)\
                     .nodes(nodes_df)\
@@ -241,8 +255,8 @@ def plot_url(edges_df,node_type, umap_type=False):
                         'pointSize': 0.3,
                         'splashAfter': 'false',
                         'bg': '%23' + 'f0f2f6'
-                    })\
-                    .plot(render=False)#, as_files=True, suffix='.html', output=None, open=False)
+                    })
+            url = GraphistrySt().plot_url(g)#, as_files=True, suffix='.html', output=None, open=False)
         except Exception as e:
             if "502" in str(e) or "Bad Gateway" in str(e):
                 logger.error("502 Bad Gateway error - dataset might be too large: %s", e)
@@ -262,7 +276,8 @@ def plot_url(edges_df,node_type, umap_type=False):
                     })\
                     .umap(feature_engine='dirty_cat',engine='umap_learn',memoize=True)
             emb2=AA._node_embedding
-            url=graphistry.nodes(emb2.reset_index(),'index').edges(AA._edges,'_src_implicit','_dst_implicit').bind(point_x="x",point_y="y").settings(url_params={"play":0}).addStyle(bg={'color': '#eee'}).plot(render=False)
+            g=graphistry.nodes(emb2.reset_index(),'index').edges(AA._edges,'_src_implicit','_dst_implicit').bind(point_x="x",point_y="y").settings(url_params={"play":0}).addStyle(bg={'color': '#eee'})
+            url=GraphistrySt().plot_url(g)
         except Exception as e:
             if "502" in str(e) or "Bad Gateway" in str(e):
                 logger.error("502 Bad Gateway error - dataset might be too large for UMAP: %s", e)
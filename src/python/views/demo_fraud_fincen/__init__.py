@@ -15,6 +15,12 @@ app_id = 'fincen'
 logger = logging.getLogger(app_id)
 urlParams = URLParam(app_id)
 
+# Uploaded for inspection in the graph besides bound/encoded columns, see GraphistrySt.plot_url()
+inspect_cols = [
+    'bank', 'bank_country', 'iso', 'number_transactions', 'sum_transactions',
+    'filer_org_name', 'originator_bank', 'beneficiary_bank', 'begin_date', 'end_date', 'amount_transactions'
+]
+
 
 def info():
     return {
@@ -28,6 +34,13 @@ def run():
     run_all()
 
 
+# Prewarm the data download and default graph of sidebar_area(), see components/Warmup.py
+def warmup():
+    res = run_filters(num_nodes=1000000, num_edges=1000000, bank='Rosbank', bank_ids=[])
+    g = build_graph(res['nodes_df'], res['edges_df'])
+    GraphistrySt().upload_async(g, keep_columns=inspect_cols, key=res['plot_key']).result()
+
+
 ############################################
 #
 #   PIPELINE PIECES
@@ -208,10 +221,6 @@ def run_filters(num_nodes, num_edges, bank, bank_ids):
             and ('ISO3166-1-Alpha-2' in row and type(row['ISO3166-1-Alpha-2']) == str)
     }
     nodes_df['iso2'] = nodes_df['iso'].apply(lambda v: iso3_to_iso2[v.lower()] if v.lower() in iso3_to_iso2 else '')
-    iso2_to_flags = {
-        iso2: 'flag-icon-' + iso2
-        for iso2 in nodes_df['iso2'].unique()
-    }
 
     # PROJECTION
 
@@ -221,12 +230,25 @@ def run_filters(num_nodes, num_edges, bank, bank_ids):
         nodes_df, sample_df, ids,
         src='originator_bank_id', dst='beneficiary_bank_id', node='entity_id')
 
-    # VIZ
+    # keyed here, so reruns share one upload without rehashing the graph; the graph itself is not cached,
+    # as an unpickled plotter would upload with the api token of the run that computed it
+    plot_key = GraphistrySt().upload_key(build_graph(nodes_df, sample_df), keep_columns=inspect_cols)
+
+    return { 'nodes_df': nodes_df, 'edges_df': sample_df, 'ego_banks_df': ego_banks_df, 'plot_key': plot_key }
+
+
+# Built from run_filters() results each run, and uploaded by main_area() with plot_async()
+#  so tables render without waiting on it
+def build_graph(nodes_df, edges_df):
 
     # abbrv_to_abbrv = {x: x for x in nodes_df['abbreviation'].unique().tolist()}
     bank_to_bank = {x: x for x in nodes_df['bank'].unique().tolist()}
+    iso2_to_flags = {
+        iso2: 'flag-icon-' + iso2
+        for iso2 in nodes_df['iso2'].unique()
+    }
 
-    g = graphistry.edges(sample_df).nodes(nodes_df)\
+    return graphistry.edges(edges_df).nodes(nodes_df)\
         .bind(source='originator_bank_id', destination='beneficiary_bank_id', node='entity_id')\
         .bind(point_title='bank', point_size='sum_transactions')\
         .encode_point_icon('bank', as_text=True, categorical_mapping=bank_to_bank)\
@@ -245,20 +267,17 @@ def run_filters(num_nodes, num_edges, bank, bank_ids):
         .settings(
             height=800,
             url_params={
-                'pointOpacity': 0.3 if len(sample_df) > 1500 else 1.0,
-                'edgeOpacity': 0.2 if len(sample_df) > 1500 else 1.0,
+                'pointOpacity': 0.3 if len(edges_df) > 1500 else 1.0,
+                'edgeOpacity': 0.2 if len(edges_df) > 1500 else 1.0,
                 'strongGravity': True,
                 'showPointsOfInterestLabel': False,
                 'play': 5000})
 
-    graph_url = g.plot(render=False)
-    return { 'nodes_df': g._nodes, 'edges_df': g._edges, 'graph_url': graph_url, 'ego_banks_df': ego_banks_df }
-
 
-def main_area(num_nodes, num_edges, bank, bank_ids, nodes_df, edges_df, graph_url, ego_banks_df):
+def main_area(num_nodes, num_edges, bank, bank_ids, nodes_df, edges_df, ego_banks_df, plot_key):
 
-    logger.debug('rendering main area, with url: %s', graph_url)
-    GraphistrySt().render_url(graph_url)
+    logger.debug('rendering main area, uploading graph')
+    GraphistrySt().plot_async(build_graph(nodes_df, edges_df), keep_columns=inspect_cols, key=plot_key)
 
     st.subheader('Selected banks')
     st.write(ego_banks_df)
@@ -1,15 +1,13 @@
-import asyncio
 import graphistry
 import os
 import pandas as pd
 import streamlit as st
-from components import GraphistrySt, URLParam
+from components import GraphistrySt, ScriptRun, URLParam
 from css import all_css
 from neptune_helper import gremlin_helper, df_helper
 
 from gremlin_python import statics
 from gremlin_python.process.graph_traversal import __
-from gremlin_python.process.traversal import WithOptions, T
 import logging 
 
 ############################################
@@ -42,6 +40,12 @@ def run():
     run_all()
 
 
+# Prewarm caches with the sidebar_area() defaults, see components/Warmup.py
+def warmup():
+    if gremlin_helper.is_configured():
+        run_filters(num_edges=100)
+
+
 ############################################
 #
 #   PIPELINE PIECES
@@ -85,70 +89,39 @@ def plot_url(nodes_df, edges_df):
     if not (edge_label_col is None):
         g = g.bind(edge_title=edge_label_col)
 
-    url = g\
+    g = g\
         .settings(url_params={
             'bg': '%23' + 'f0f2f6'
-        })\
-        .plot(render=False)
+        })
+    url = GraphistrySt().plot_url(g)
 
     logger.info('Generated viz, got back urL: %s', url)
 
     return url
 
 
-def path_to_df(p):
-    nodes = {}
-    edges = {}
-
-    for triple in p:
-
-        src_id = triple[0][T.id]
-        nodes[src_id] = df_helper.vertex_to_dict(triple[0])
-
-        dst_id = triple[2][T.id]
-        nodes[dst_id] = df_helper.vertex_to_dict(triple[2])
-
-        edges[triple[1][T.id]] = df_helper.edge_to_dict(
-            triple[1], src_id, dst_id)
-
-    return pd.DataFrame(nodes.values()), pd.DataFrame(edges.values())
-
-
 # Given filter settings, generate/cache/return dataframes & viz
 #@st.cache(suppress_st_warning=True, allow_output_mutation=True)
 @st.cache_data
 def run_filters(num_edges):
-    result = gremlin_helper.connect_to_neptune()
-    if result is None:
+    pool = gremlin_helper.get_pool()
+    if pool is None:
         st.error("Neptune connection not configured. Please set NEPTUNE_READER_HOST, NEPTUNE_READER_PORT, and NEPTUNE_READER_PROTOCOL environment variables.")
         return {'nodes_df': None, 'edges_df': None, 'url': None}
-    g, conn = result
 
     logger.info('Querying neptune')
-    res = g.V().inE().limit(num_edges).outV().path().by(
-        __.valueMap().with_(WithOptions.tokens)).toList()
+    frames = df_helper.PathFrames()
+    for paths in pool.stream(
+            lambda g: gremlin_helper.path_by_properties(g.V().inE().limit(num_edges).outV()),
+            cancelled=ScriptRun.superseded_check()):
+        frames.add(paths)
 
-    nodes_df, edges_df = path_to_df(res)
+    nodes_df, edges_df = frames.to_dfs()
     url = plot_url(nodes_df, edges_df)
 
     logger.info("Finished compute phase")
 
-    try:
-        conn.close()
-
-    except RuntimeError as e:
-        if str(e) == "There is no current event loop in thread 'ScriptRunner.scriptThread'.":
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            conn.close()
-        else:
-            raise e
-
-    except Exception as e:
-        logger.error('oops in gremlin', exc_info=True)
-        raise e
-
-    return {'nodes_df': nodes_df, 'edges_df': edges_df, 'url': url, 'res': res}
+    return {'nodes_df': nodes_df, 'edges_df': edges_df, 'url': url}
 
 
 def main_area(url):
@@ -178,6 +151,9 @@ def run_all():
         # Render main viz area based on computed filter pipeline results and sidebar settings
         main_area(filter_pipeline_result['url'])
 
+    except gremlin_helper.QueryCancelled:
+        # a newer rerun, ex: the slider moved again, is waiting to start
+        logger.info('Query superseded by a newer run')
     except Exception as exn:
         st.write('Error loading dashboard')
         st.write(exn)
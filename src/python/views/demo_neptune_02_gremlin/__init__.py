@@ -1,17 +1,15 @@
-import asyncio
 import graphistry
 import os
 import pandas as pd
 import streamlit as st
-from components import GraphistrySt, URLParam
+from components import GraphistrySt, ScriptRun, URLParam
 from neptune_helper import gremlin_helper, df_helper
 from css import all_css
-import time
+from util import Tracer
 import altair as alt
 
 from gremlin_python import statics
 from gremlin_python.process.graph_traversal import __
-from gremlin_python.process.traversal import WithOptions, T
 import logging
 
 ############################################
@@ -30,10 +28,15 @@ src_id_col = 'source'
 dst_id_col = 'target'
 node_label_col = 'label'
 edge_label_col = 'label'
+# Uploaded for inspection in the graph besides bound columns, see GraphistrySt.plot_url()
+inspect_cols = ['state', 'city']
+# Properties fetched from Neptune besides id and label: the inspected columns, which the bar chart also groups by
+node_props = inspect_cols
+edge_props = inspect_cols
 
-# Setup a structure to hold metrics
-metrics = {'neptune_time': 0, 'graphistry_time': 0,
-           'node_cnt': 0, 'edge_cnt': 0, 'prop_cnt': 0}
+# Footer of per-run timings and counts, see util.Tracer
+footer_stages = {'query': 'Neptune Load Time (s)', 'aggregate': 'Neptune Aggregate Time (s)', 'upload': 'Graphistry Load Time (s)'}
+footer_counts = {'node_cnt': 'Node Count', 'edge_cnt': 'Edge Count', 'prop_cnt': 'Property Count'}
 
 
 # Define the name of the view
@@ -49,6 +52,16 @@ def run():
     run_all()
 
 
+# Prewarm caches with the sidebar_area() defaults, see components/Warmup.py
+def warmup():
+    if gremlin_helper.is_configured():
+        res = run_filters(num_edges=10000, state='All States', city='')
+        run_counts(state='All States', city='')
+        if res['nodes_df'].size > 0:
+            g = build_graph(res['nodes_df'], res['edges_df'])
+            GraphistrySt().upload_async(g, keep_columns=inspect_cols, key=res['plot_key']).result()
+
+
 ############################################
 #
 #   PIPELINE PIECES
@@ -138,13 +151,9 @@ def sidebar_area():
     return {'num_edges': num_edges, 'state': state, 'city': city}
 
 
-def plot_url(nodes_df, edges_df):
-    global metrics
-    nodes_df = df_helper.flatten_df(nodes_df)
-    edges_df = df_helper.flatten_df(edges_df)
-
-    logger.info('Starting graphistry plot')
-    tic = time.perf_counter()
+# Built from run_filters()' flattened frames each run, and uploaded by main_area() with plot_async()
+#  so the chart renders without waiting on it
+def build_graph(nodes_df, edges_df):
     g = graphistry\
         .edges(edges_df)\
         .bind(source=src_id_col, destination=dst_id_col)\
@@ -157,126 +166,123 @@ def plot_url(nodes_df, edges_df):
     if not (edge_label_col is None):
         g = g.bind(edge_title=edge_label_col)
 
-    url = g\
+    return g\
         .settings(url_params={
             'bg': '%23' + 'f0f2f6'
-        })\
-        .plot(render=False)
-    toc = time.perf_counter()
-    metrics['graphistry_time'] = toc - tic
-    logger.info(f'Graphisty Time: {metrics["graphistry_time"]}')
-    logger.info('Generated viz, got back urL: %s', url)
-
-    return url
-
+        })
 
-def path_to_df(p):
-    nodes = {}
-    edges = {}
-
-    for triple in p:
-
-        src_id = triple[0][T.id]
-        nodes[src_id] = df_helper.vertex_to_dict(triple[0])
-
-        dst_id = triple[2][T.id]
-        nodes[dst_id] = df_helper.vertex_to_dict(triple[2])
-
-        edges[triple[1][T.id]] = df_helper.edge_to_dict(
-            triple[1], src_id, dst_id)
-
-    return pd.DataFrame(nodes.values()), pd.DataFrame(edges.values())
 
 # Given filter settings, generate/cache/return dataframes & viz
 #@st.cache(suppress_st_warning=True, allow_output_mutation=True)
 @st.cache_data
 def run_filters(num_edges, state, city):
-    global metrics
-    result = gremlin_helper.connect_to_neptune()
-    if result is None:
+    tracer = Tracer(app_id)
+    pool = gremlin_helper.get_pool()
+    if pool is None:
         st.error("Neptune connection not configured. Please set NEPTUNE_READER_HOST, NEPTUNE_READER_PORT, and NEPTUNE_READER_PROTOCOL environment variables.")
-        return {'nodes_df': None, 'edges_df': None, 'url': None}
-    g, conn = result
+        return {'nodes_df': None, 'edges_df': None, 'plot_key': None, 'trace': None}
 
     logger.info('Querying neptune')
-    tic = time.perf_counter()
-    t = g.V().inE()
-    # Conditionally add the state filtering in here
-    if not state == "All States":
-        t = t.has('visited', 'state', state)
-    # Conditionally add the city filtering in here
-    if not city == "":
-        t = t.has('visited', 'city', city)
-    res = t.limit(num_edges).outV().path().by(
-        __.valueMap().with_(WithOptions.tokens)).toList()
-    toc = time.perf_counter()
-    logger.info(f'Query Execution: {toc-tic:0.02f} seconds')
-    logger.debug('Query Result Count: %s', len(res))
-    metrics['neptune_time'] = toc - tic
-
-    nodes_df, edges_df = path_to_df(res)
+
+    def query(g):
+        t = g.V().inE()
+        # Conditionally add the state filtering in here
+        if not state == "All States":
+            t = t.has('visited', 'state', state)
+        # Conditionally add the city filtering in here
+        if not city == "":
+            t = t.has('visited', 'city', city)
+        return gremlin_helper.path_by_properties(t.limit(num_edges).outV(), node_props, edge_props)
+
+    # Paths are converted batch by batch as they stream in, so the query time includes most of the transform
+    frames = df_helper.PathFrames()
+    with tracer.span('query'):
+        for paths in pool.stream(query, cancelled=ScriptRun.superseded_check()):
+            frames.add(paths)
+    logger.info(f'Query Execution: {tracer.seconds("query"):0.02f} seconds')
+    logger.debug('Query Result Count: %s', frames.paths)
+
+    with tracer.span('transform'):
+        nodes_df, edges_df = frames.to_dfs()
 
     # Calculate the metrics
-    metrics['node_cnt'] = nodes_df.size
-    metrics['edge_cnt'] = edges_df.size
-    metrics['prop_cnt'] = (nodes_df.size * nodes_df.columns.size) + \
-        (edges_df.size * edges_df.columns.size)
+    tracer.count('node_cnt', nodes_df.size)
+    tracer.count('edge_cnt', edges_df.size)
+    tracer.count('prop_cnt', (nodes_df.size * nodes_df.columns.size) + (edges_df.size * edges_df.columns.size))
 
+    # flattened and keyed here, so reruns share one upload without reflattening or rehashing the graph; the graph
+    #  itself is not cached, as an unpickled plotter would upload with the api token of the run that computed it
+    plot_key = None
     if nodes_df.size > 0:
-        url = plot_url(nodes_df, edges_df)
-    else:
-        url = ""
+        with tracer.span('flatten'):
+            nodes_df = df_helper.flatten_df(nodes_df)
+            edges_df = df_helper.flatten_df(edges_df)
+            plot_key = GraphistrySt().upload_key(build_graph(nodes_df, edges_df), keep_columns=inspect_cols)
 
     logger.info("Finished compute phase")
 
-    try:
-        conn.close()
-
-    except RuntimeError as e:
-        if str(e) == "There is no current event loop in thread 'ScriptRunner.scriptThread'.":
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            conn.close()
-        else:
-            raise e
-
-    except Exception as e:
-        logger.error('oops in gremlin', exc_info=True)
-        raise e
+    return {'nodes_df': nodes_df, 'edges_df': edges_df, 'plot_key': plot_key, 'trace': tracer.snapshot()}
 
-    return {'nodes_df': nodes_df, 'edges_df': edges_df, 'url': url, 'res': res}
 
+# Visits per state, or per city of the chosen state, counted by Neptune over all matching edges
+#  rather than over the num_edges sample, so only the counts are transferred
+@st.cache_data
+def run_counts(state, city):
+    tracer = Tracer(app_id)
+    pool = gremlin_helper.get_pool()
+    if pool is None:
+        return {'counts_df': None, 'trace': None}
 
-def main_area(url, nodes, edges, state):
-
-    logger.debug('rendering main area, with url: %s', url)
-    GraphistrySt().render_url(url)
-
-    # Get the count by state of visits shown
-    bar_chart_data = edges[edges['label'] == 'visited']
     group_label = 'state'
     if not state == 'All States':  # If a state is chosen group by city
         group_label = 'city'
-    bar_chart_data['count'] = bar_chart_data.groupby(
-        group_label)[group_label].transform('count')
-    bar_chart_data = bar_chart_data[[group_label, 'count']].drop_duplicates().reset_index()[
-        [group_label, 'count']]
+
+    def query(g):
+        t = g.E().hasLabel('visited')
+        if not state == "All States":
+            t = t.has('state', state)
+        if not city == "":
+            t = t.has('city', city)
+        return t.has(group_label).groupCount().by(group_label)
+
+    counts = {}
+    with tracer.span('aggregate'):
+        for batch in pool.stream(query, cancelled=ScriptRun.superseded_check()):
+            for group_counts in batch:
+                counts.update(group_counts)
+    logger.info(f'Aggregate Execution: {tracer.seconds("aggregate"):0.02f} seconds')
+
+    counts_df = pd.DataFrame({group_label: list(counts.keys()), 'count': list(counts.values())})
     # Sort the values by group_label
-    bar_chart_data.sort_values(by=[group_label], inplace=True)
-    chart = alt.Chart(bar_chart_data).mark_bar().encode(
-        x=group_label,
-        y='count')
-    st.altair_chart(chart, use_container_width=True)
-    # Show a datatable with the values transposed
-    st.dataframe(bar_chart_data.set_index(group_label).T)
-
-    st.markdown(f'''<small>
-            Neptune Load Time (s): {float(metrics['neptune_time']):0.2f} |
-            Graphistry Load Time (s): {float(metrics['graphistry_time']):0.2f} |
-            Node Count: {metrics['node_cnt']} |
-            Edge Count: {metrics['edge_cnt']} |
-            Property Count: {metrics['prop_cnt']}
-        </small>''', unsafe_allow_html=True)
+    counts_df = counts_df.sort_values(by=[group_label]).reset_index(drop=True)
+    return {'counts_df': counts_df, 'trace': tracer.snapshot()}
+
+
+def main_area(nodes_df, edges_df, plot_key, counts_df, tracer):
+
+    logger.info('Starting graphistry plot')
+    plot = GraphistrySt().plot_async(build_graph(nodes_df, edges_df), keep_columns=inspect_cols, key=plot_key)
+
+    # Visits by state, or by city, see run_counts()
+    if counts_df is not None:
+        group_label = counts_df.columns[0]
+        chart = alt.Chart(counts_df).mark_bar().encode(
+            x=group_label,
+            y='count')
+        st.altair_chart(chart, use_container_width=True)
+        # Show a datatable with the values transposed
+        st.dataframe(counts_df.set_index(group_label).T)
+
+    if plot is not None:
+        with tracer.span('render'):
+            plot.render()
+        # the upload's own time, not the chart rendered meanwhile; a replay when an earlier run uploaded it
+        seconds = plot.upload_seconds()
+        if seconds is not None:
+            tracer.record('upload', seconds, cached=plot.reused)
+        logger.info(f'Graphisty Time: {tracer.seconds("upload")}')
+
+    st.markdown(tracer.footer_html(footer_stages, footer_counts), unsafe_allow_html=True)
 
 
 ############################################
@@ -292,22 +298,31 @@ def run_all():
 
     try:
 
+        tracer = Tracer(app_id)
+
         # Render sidebar and get current settings
         sidebar_filters = sidebar_area()
 
         # Compute filter pipeline (with auto-caching based on filter setting inputs)
         # Selective mark these as URL params as well
         filter_pipeline_result = run_filters(**sidebar_filters)
+        tracer.merge(filter_pipeline_result['trace'])
+        counts_result = run_counts(sidebar_filters['state'], sidebar_filters['city'])
+        tracer.merge(counts_result['trace'])
 
         # Render main viz area based on computed filter pipeline results and sidebar settings if data is returned
         if filter_pipeline_result['nodes_df'].size > 0:
-            main_area(filter_pipeline_result['url'],
-                      filter_pipeline_result['nodes_df'],
+            main_area(filter_pipeline_result['nodes_df'],
                       filter_pipeline_result['edges_df'],
-                      sidebar_filters['state'])
+                      filter_pipeline_result['plot_key'],
+                      counts_result['counts_df'],
+                      tracer)
         else:  # render a message
             st.write("No data matching the specfiied criteria is found")
 
+    except gremlin_helper.QueryCancelled:
+        # a newer rerun, ex: the slider moved again, is waiting to start
+        logger.info('Query superseded by a newer run')
     except Exception as exn:
         st.write('Error loading dashboard')
         st.write(exn)
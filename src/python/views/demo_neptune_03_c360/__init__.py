@@ -1,17 +1,16 @@
-import asyncio
 import graphistry
 import os
 import pandas as pd
 import streamlit as st
-from components import GraphistrySt, URLParam
+from components import GraphistrySt, ScriptRun, URLParam
 from neptune_helper import gremlin_helper, df_helper
 from css import all_css
-import time
+from util import Tracer
 import altair as alt
 
 from gremlin_python import statics
 from gremlin_python.process.graph_traversal import __
-from gremlin_python.process.traversal import WithOptions, T, TextP
+from gremlin_python.process.traversal import TextP
 import logging 
 
 ############################################
@@ -31,10 +30,6 @@ dst_id_col = 'target'
 node_label_col = 'label'
 edge_label_col = 'label'
 
-# Setup a structure to hold metrics
-metrics = {'neptune_time': 0, 'graphistry_time': 0,
-           'node_cnt': 0, 'edge_cnt': 0, 'prop_cnt': 0}
-
 
 # Define the name of the view
 def info():
@@ -49,6 +44,12 @@ def run():
     run_all()
 
 
+# Prewarm caches with the sidebar_area() defaults, see components/Warmup.py
+def warmup():
+    if gremlin_helper.is_configured():
+        run_filters(num_edges=10000, num_matches=50, transient_id='')
+
+
 ############################################
 #
 #   PIPELINE PIECES
@@ -85,13 +86,12 @@ def sidebar_area():
     return {'num_edges': num_edges, 'num_matches': num_matches, 'transient_id': transient_id}
 
 
-def plot_url(nodes_df, edges_df):
-    global metrics
-    nodes_df = df_helper.flatten_df(nodes_df)
-    edges_df = df_helper.flatten_df(edges_df)
+def plot_url(nodes_df, edges_df, tracer):
+    with tracer.span('flatten'):
+        nodes_df = df_helper.flatten_df(nodes_df)
+        edges_df = df_helper.flatten_df(edges_df)
 
     logger.info('Starting graphistry plot')
-    tic = time.perf_counter()
     g = graphistry\
         .edges(edges_df)\
         .bind(source=src_id_col, destination=dst_id_col)\
@@ -104,99 +104,70 @@ def plot_url(nodes_df, edges_df):
     if not (edge_label_col is None):
         g = g.bind(edge_title=edge_label_col)
 
-    url = g\
+    g = g\
         .settings(url_params={
             'bg': '%23' + 'f0f2f6'
-        })\
-        .plot(render=False)
-    toc = time.perf_counter()
-    metrics['graphistry_time'] = toc - tic
-    logger.info(f'Graphisty Time: {metrics["graphistry_time"]}')
+        })
+    with tracer.span('upload'):
+        url = GraphistrySt().plot_url(g)
+    logger.info(f'Graphisty Time: {tracer.seconds("upload")}')
     logger.info('Generated viz, got back urL: %s', url)
 
     return url
 
 
-def path_to_df(p):
-    nodes = {}
-    edges = {}
-
-    for triple in p:
-
-        src_id = triple[0][T.id]
-        nodes[src_id] = df_helper.vertex_to_dict(triple[0])
-
-        dst_id = triple[2][T.id]
-        nodes[dst_id] = df_helper.vertex_to_dict(triple[2])
-
-        edges[triple[1][T.id]] = df_helper.edge_to_dict(
-            triple[1], src_id, dst_id)
-
-    return pd.DataFrame(nodes.values()), pd.DataFrame(edges.values())
-
-
 # Given filter settings, generate/cache/return dataframes & viz
 #@st.cache(suppress_st_warning=True, allow_output_mutation=True)
 @st.cache_data
 def run_filters(num_edges, num_matches, transient_id):
-    global metrics
-    result = gremlin_helper.connect_to_neptune()
-    if result is None:
+    tracer = Tracer(app_id)
+    pool = gremlin_helper.get_pool()
+    if pool is None:
         st.error("Neptune connection not configured. Please set NEPTUNE_READER_HOST, NEPTUNE_READER_PORT, and NEPTUNE_READER_PROTOCOL environment variables.")
-        return {'nodes_df': None, 'edges_df': None, 'url': None}
-    g, conn = result
+        return {'nodes_df': None, 'edges_df': None, 'url': None, 'trace': None}
 
     logger.info('Querying neptune')
-    tic = time.perf_counter()
-    t = g.V().hasLabel('transientId')
-    if not transient_id == "":
-        # If using Neptune full text search this will perform much faster than the built in Gremlin text search
-        t = t.has('uid', TextP.containing(transient_id))
-    res = t.limit(num_matches).bothE().otherV().limit(num_edges).path().by(
-        __.valueMap().with_(WithOptions.tokens)).toList()
 
-    toc = time.perf_counter()
-    logger.info(f'Query Execution: {toc-tic:0.02f} seconds')
-    logger.debug('Query Result Count: %s', len(res))
-    metrics['neptune_time'] = toc - tic
+    def query(g):
+        t = g.V().hasLabel('transientId')
+        if not transient_id == "":
+            # If using Neptune full text search this will perform much faster than the built in Gremlin text search
+            t = t.has('uid', TextP.containing(transient_id))
+        return gremlin_helper.path_by_properties(t.limit(num_matches).bothE().otherV().limit(num_edges))
+
+    # Paths are converted batch by batch as they stream in, so the query time includes most of the transform
+    frames = df_helper.PathFrames()
+    with tracer.span('query'):
+        for paths in pool.stream(query, cancelled=ScriptRun.superseded_check()):
+            frames.add(paths)
 
-    nodes_df, edges_df = path_to_df(res)
+    logger.info(f'Query Execution: {tracer.seconds("query"):0.02f} seconds')
+    logger.debug('Query Result Count: %s', frames.paths)
+
+    with tracer.span('transform'):
+        nodes_df, edges_df = frames.to_dfs()
 
     # Calculate the metrics
-    metrics['node_cnt'] = nodes_df.size
-    metrics['edge_cnt'] = edges_df.size
-    metrics['prop_cnt'] = (nodes_df.size * nodes_df.columns.size) + \
-        (edges_df.size * edges_df.columns.size)
+    tracer.count('node_cnt', nodes_df.size)
+    tracer.count('edge_cnt', edges_df.size)
+    tracer.count('prop_cnt', (nodes_df.size * nodes_df.columns.size) + (edges_df.size * edges_df.columns.size))
 
     if nodes_df.size > 0:
-        url = plot_url(nodes_df, edges_df)
+        url = plot_url(nodes_df, edges_df, tracer)
     else:
         url = ""
 
     logger.info("Finished compute phase")
 
-    try:
-        conn.close()
-
-    except RuntimeError as e:
-        if str(e) == "There is no current event loop in thread 'ScriptRunner.scriptThread'.":
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            conn.close()
-        else:
-            raise e
-
-    except Exception as e:
-        logger.error('oops in gremlin', exc_info=True)
-        raise e
+    return {'nodes_df': nodes_df, 'edges_df': edges_df, 'url': url, 'trace': tracer.snapshot()}
 
-    return {'nodes_df': nodes_df, 'edges_df': edges_df, 'url': url, 'res': res}
 
-
-def main_area(url, nodes, edges):
+def main_area(url, nodes, edges, tracer):
 
     logger.debug('rendering main area, with url: %s', url)
-    GraphistrySt().render_url(url)
+    with tracer.span('render'):
+        GraphistrySt().render_url(url)
+    logger.info('Timings: %s', tracer.snapshot())
 
 
 ############################################
@@ -212,21 +183,28 @@ def run_all():
 
     try:
 
+        tracer = Tracer(app_id)
+
         # Render sidebar and get current settings
         sidebar_filters = sidebar_area()
 
         # Compute filter pipeline (with auto-caching based on filter setting inputs)
         # Selective mark these as URL params as well
         filter_pipeline_result = run_filters(**sidebar_filters)
+        tracer.merge(filter_pipeline_result['trace'])
 
         # Render main viz area based on computed filter pipeline results and sidebar settings if data is returned
         if filter_pipeline_result['nodes_df'].size > 0:
             main_area(filter_pipeline_result['url'],
                       filter_pipeline_result['nodes_df'],
-                      filter_pipeline_result['edges_df'])
+                      filter_pipeline_result['edges_df'],
+                      tracer)
         else:  # render a message
             st.write("No data matching the specfiied criteria is found")
 
+    except gremlin_helper.QueryCancelled:
+        # a newer rerun, ex: the slider moved again, is waiting to start
+        logger.info('Query superseded by a newer run')
     except Exception as exn:
         st.write('Error loading dashboard')
         st.write(exn)
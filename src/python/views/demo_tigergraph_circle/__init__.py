@@ -1,10 +1,11 @@
-import asyncio, datetime, graphistry, pandas as pd, \
-    plotly.express as px, pyTigerGraph as tg, \
+import asyncio, graphistry, pandas as pd, \
+    plotly.express as px, \
     streamlit as st, time
 
 from components import GraphistrySt, URLParam
 from css import all_css
-from TigerGraph_helper import tg_helper
+from util import Tracer
+from TigerGraph_helper import tg_helper, df_helper as tg_df_helper
 import logging
 
 ############################################
@@ -24,9 +25,9 @@ dst_id_col = 'to_id'
 node_label_col = 'Source_Type'
 edge_label_col = 'Destination_Type'
 
-# Setup a structure to hold metrics
-metrics = {'tigergraph_time': 0, 'graphistry_time': 0,
-           'node_cnt': 0, 'edge_cnt': 0, 'prop_cnt': 0}
+# Footer of per-run timings and counts, see util.Tracer
+footer_stages = {'query': 'TigerGraph Load Time (s)', 'upload': 'Graphistry Load Time (s)'}
+footer_counts = {'node_cnt': 'Node Count', 'edge_cnt': 'Edge Count', 'prop_cnt': 'Property Count'}
 
 
 # Define the name of the view
@@ -42,6 +43,12 @@ def run():
     run_all()
 
 
+def warmup():
+    conn = tg_helper.connect_to_tigergraph()
+    if conn is not None:
+        tg_helper.query_catalog.ensure(conn)
+
+
 ############################################
 #
 #   PIPELINE PIECES
@@ -78,19 +85,13 @@ def sidebar_area():
     tg_secret = st.sidebar.text_input('TigerGraph Secret', type='password')
     tg_graphname = st.sidebar.text_input('TigerGraph Graphname')
     if st.sidebar.button("Connect"):
-        try:
-            conn = tg.TigerGraphConnection(
-                host=tg_host, graphname=tg_graphname, username=tg_username, password=tg_password,
-                version=tg_helper.TIGERGRAPH_CONNECTION_VERSION)
-            if tg_secret:
-                conn.getToken(tg_secret)
-            else:
-                conn.getToken(conn.createSecret())
-        # FIXME: What is the expected exn?
-        except Exception as e:  # noqa: E722
-            logger.error('Failed dynamic tg connection: %s', e, exc_info=True)
-            st.sidebar.error("Failed to Connect")
-            st.sidebar.error(e)
+        # Reuses an authenticated connection for the same host/graph/user across reruns and sessions
+        conn = tg_helper.connection_cache.get(
+            host=tg_host, graphname=tg_graphname, username=tg_username, password=tg_password,
+            secret=tg_secret or None)
+        if conn is None:
+            logger.error('Failed dynamic tg connection to %s', tg_host)
+            st.sidebar.error("Failed to Connect, see logs for details")
             return None
     else:
         conn = tg_helper.connect_to_tigergraph()
@@ -99,14 +100,16 @@ def sidebar_area():
         st.write(RuntimeError('Demo requires a TigerGraph connection. Put creds into left sidebar, or fill in envs/tigergraph.env & restart'))
         return None
 
+    # Lists and installs missing queries in the background, once per graph
+    tg_helper.query_catalog.ensure(conn)
+
     st.sidebar.success("Connnected Successfully")
-    return {'user_id': user_id, 'conn': conn}
+    return {'user_id': user_id, 'graph': (conn.host, conn.graphname), '_conn': conn}
 
 
-def plot_url(nodes_df, edges_df):
+def plot_url(nodes_df, edges_df, tracer):
 
     logger.info('Starting graphistry plot')
-    tic = time.perf_counter()
 
     # edge weight ( ==> score )
     # edgeInfluence @ https://hub.graphistry.com/docs/api/1/rest/url/#urloptions
@@ -137,11 +140,9 @@ def plot_url(nodes_df, edges_df):
     # if not (edge_label_col is None):
     #     g = g.bind(edge_title=edge_label_col)
 
-    url = g.plot(render=False, as_files=True)
-
-    toc = time.perf_counter()
-    metrics['graphistry_time'] = toc - tic
-    logger.info(f'Graphisty Time: {metrics["graphistry_time"]}')
+    with tracer.span('upload'):
+        url = GraphistrySt().plot_url(g, as_files=True)
+    logger.info(f'Graphisty Time: {tracer.seconds("upload")}')
     logger.info('Generated viz, got back urL: %s', url)
 
     return url
@@ -150,120 +151,42 @@ def plot_url(nodes_df, edges_df):
 # Given filter settings, generate/cache/return dataframes & viz
 #@st.cache(suppress_st_warning=True, allow_output_mutation=True)
 @st.cache_data
-def run_filters(user_id, conn):  # noqa: C901
-
-    logger.info("Installing Queries")
+def run_filters(user_id, graph, _conn):  # noqa: C901
+    # _conn: shared, token-refreshed connection, so not hashed: graph keys the cache instead
+    conn = _conn
+    tracer = Tracer(app_id)
     logger.info('Graph name: %s, user_id: %s', conn.graphname, user_id)
-    try:
-        res = conn.gsql(
-        '''
-        use graph {}
-        ls
-        '''.format(conn.graphname), options=[])
-    except SystemExit as e:
-        logger.error('Failed listing graph queries %s', e, exc_info=True)
-        st.write('Failed listing graph queries')
-        st.write(e)
-        raise e
-    except Exception as e:
-        logger.error('Failed on `use graph` test: %s', e, exc_info=True)
-        st.write(e)
-        raise e
-
-    ind = res.index('Queries:') + 1
-    installTran = True
-    for query in res[ind:]:
-        if 'totalTransaction' in query:
-            installTran = False
-
-    if installTran:
-        conn.gsql(
-        '''
-        use graph AntiFraud
-        CREATE QUERY totalTransaction(Vertex<User> Source) FOR GRAPH AntiFraud {
-            start = {Source};
-
-            transfer = SELECT tgt
-                FROM start:s -(User_Transfer_Transaction:e) - :tgt;
-
-            receive = select tgt
-                FROM start:s -(User_Recieve_Transaction:e) -:tgt;
-
-            PRINT transfer, receive;
-        }
-        Install query totalTransaction
-        ''', options=[])
 
     logger.info('Querying Tigergraph')
+    with tracer.span('query'):
+        raw_results = tg_helper.query_runner.run_one(conn, 'circleDetection', {'srcId': user_id}, {'sizeLimit': 1000000000, 'timeout': 120000})
+    results = raw_results[0]['@@circleEdgeTuples']
     tic = time.perf_counter()
 
-    raw_results = conn.runInstalledQuery("circleDetection", {"srcId": user_id}, sizeLimit=1000000000, timeout=120000)
-    results = raw_results[0]['@@circleEdgeTuples']
+    # circles share edges: keep each distinct (from, to, amount, time, type) once
+    tuples = [s for o in results for s in o]
+    edges_df = tg_df_helper.edges_to_df([s['e'] for s in tuples])
+    edges_df['amount'] = [s['amount'] for s in tuples]
+    edges_df['time'] = [s['ts'] for s in tuples]
+    edges_df = edges_df.drop_duplicates(['from_id', 'to_id', 'amount', 'time', 'type'], ignore_index=True)
 
-    # FIXME: Automate
-    out = []
-    from_ids = []
-    to_ids = []
-    times = []
-    amounts = []
-    types = []
-    from_types = []
-    to_types = []
-    for o in results:
-        for s in o:
-            if {
-                "from_id": s["e"]["from_id"], "to_id": s["e"]["to_id"], "amount": s["amount"], "time": s["ts"],
-                "type": s["e"]["e_type"]
-            } not in out:
-                out.append(
-                    {"from_id": s["e"]["from_id"], "to_id": s["e"]["to_id"], "amount": s["amount"], "time": s["ts"],
-                     "type": s["e"]["e_type"]})
-                from_ids.append(s["e"]["from_id"])
-                to_ids.append(s["e"]["to_id"])
-                amounts.append(s["amount"])
-                times.append(s["ts"])
-                types.append(s["e"]["e_type"])
-                from_types.append(s['e']['from_type'])
-                to_types.append(s['e']['from_type'])
-
-    edges_df = pd.DataFrame({
-        'from_id': from_ids,
-        'to_id': to_ids,
-        'amount': amounts,
-        'time': times,
-        'type': types
-    })
-    node_idf = []
-    typef = []
-    for i in range(len(from_ids)):
-        if from_ids[i] not in node_idf:
-            node_idf.append(from_ids[i])
-            typef.append(from_types[i])
-        if to_ids[i] not in node_idf:
-            node_idf.append(to_ids[i])
-            typef.append(to_types[i])
-
-    nodes_df = pd.DataFrame({
-        'n': node_idf,
-        'type': typef,
-        'size': 0.1
-    })
+    nodes_df = tg_df_helper.edges_to_nodes_df(edges_df, node='n')
+    nodes_df['size'] = 0.1
+    edges_df = edges_df[['from_id', 'to_id', 'amount', 'time', 'type']]
 
     try:
         res = nodes_df.values.tolist()
-        toc = time.perf_counter()
-        logger.info(f'Query Execution: {toc - tic:0.02f} seconds')
+        tracer.record('transform', time.perf_counter() - tic)
+        logger.info(f'Query Execution: {tracer.seconds("query"):0.02f} seconds')
         logger.debug('Query Result Count: %s', len(res))
-        metrics['tigergraph_time'] = toc - tic
 
         # Calculate the metrics
-        metrics['node_cnt'] = nodes_df.size
-        metrics['edge_cnt'] = edges_df.size
-        metrics['prop_cnt'] = (nodes_df.size * nodes_df.columns.size) + \
-                              (edges_df.size * edges_df.columns.size)
+        tracer.count('node_cnt', nodes_df.size)
+        tracer.count('edge_cnt', edges_df.size)
+        tracer.count('prop_cnt', (nodes_df.size * nodes_df.columns.size) + (edges_df.size * edges_df.columns.size))
 
         if nodes_df.size > 0:
-            url = plot_url(nodes_df, edges_df)
+            url = plot_url(nodes_df, edges_df, tracer)
         else:
             url = ""
     except Exception as e:
@@ -286,44 +209,29 @@ def run_filters(user_id, conn):  # noqa: C901
         logger.error('oops in TigerGraph', exc_info=True)
         raise e
 
-    return {'nodes_df': nodes_df, 'edges_df': edges_df, 'url': url, 'res': res, 'conn': conn}
+    return {'nodes_df': nodes_df, 'edges_df': edges_df, 'url': url, 'res': res, 'trace': tracer.snapshot()}
 
 
-def main_area(url, nodes, edges, user_id, conn):
+# Kept out of run_filters: raises when the query fails, so st.cache_data does not keep a missing bar chart and
+#  the next rerun retries it. run_all runs it on the query pool, alongside run_filters
+@st.cache_data(show_spinner=False)
+def run_transactions(user_id, graph, _conn):
+    """Monthly transaction totals of user_id, for the bar chart"""
+    tg_helper.query_catalog.wait(_conn, ['totalTransaction'])
+    transactions = tg_helper.query_runner.run_one(_conn, 'totalTransaction', {'Source': user_id}, {})[0]
+    return tg_df_helper.transactions_to_df(transactions)
 
-    logger.info('rendering main area, with url: %s', url)
-    GraphistrySt().render_url(url)
 
-    dates = []
-    amounts = []
-    transfer_type = []
-    results = None
+def main_area(url, nodes, edges, user_id, transactions_df, tracer):
 
-    try:
-        results = conn.runInstalledQuery("totalTransaction", params={"Source": user_id})[0]
-    except Exception as e:
-        print(e)
+    logger.info('rendering main area, with url: %s', url)
+    with tracer.span('render'):
+        GraphistrySt().render_url(url)
 
     # Create bar chart of transactions
-    if results is not None:
-        for action in results:
-            for transfer in results[action]:
-                dates.append(datetime.datetime.fromtimestamp(transfer['attributes']['ts']))
-                amounts.append(transfer['attributes']['amount'])
-                transfer_type.append(action)
-        cols = list(zip(dates, amounts, transfer_type))
-        cols = sorted(cols, key=lambda x: x[0].day)
-        cols = sorted(cols, key=lambda x: x[0].month)
-        cols = sorted(cols, key=lambda x: x[0].year)
-        df = pd.DataFrame(data=cols, columns=['Date', 'Amount', 'Type'])
-        df['Date'] = pd.to_datetime(df['Date'])
-        map_color = {"receive": "rgba(0,0,255,0.5)", "transfer": "rgba(255,0,0,0.5)"}
-        df['Color'] = df['Type'].map(map_color)
-
-        df = df.groupby([df['Date'].dt.to_period('M'), 'Type', 'Color']).sum()
-        df = df.reset_index(level=['Type', 'Color'])
-        df.index = df.index.values.astype('datetime64[M]')
-        bar = px.bar(df, x=df.index, y='Amount', labels={'x': 'Date'}, color='Type', color_discrete_map=map_color,
+    if transactions_df is not None:
+        bar = px.bar(transactions_df, x=transactions_df.index, y='Amount', labels={'x': 'Date'}, color='Type',
+                     color_discrete_map=tg_df_helper.TRANSACTION_COLORS,
                      text='Amount', title="Transaction Amounts by Month for User {}".format(user_id), height=350,
                      barmode='group')
         bar.update_xaxes(
@@ -339,13 +247,7 @@ def main_area(url, nodes, edges, user_id, conn):
 
         st.plotly_chart(bar, use_container_width=True)
 
-    st.markdown(f'''<small>
-            TigerGraph Load Time (s): {float(metrics['tigergraph_time']):0.2f} |
-            Graphistry Load Time (s): {float(metrics['graphistry_time']):0.2f} |
-            Node Count: {metrics['node_cnt']} |
-            Edge Count: {metrics['edge_cnt']} |
-            Property Count: {metrics['prop_cnt']}
-        </small>''', unsafe_allow_html=True)
+    st.markdown(tracer.footer_html(footer_stages, footer_counts), unsafe_allow_html=True)
 
 
 ############################################
@@ -362,6 +264,8 @@ def run_all():
 
     try:
 
+        tracer = Tracer(app_id)
+
         # Render sidebar, get current settings and TG connection
         sidebar_filters = sidebar_area()
 
@@ -369,8 +273,16 @@ def run_all():
         if sidebar_filters is None:
             return
 
+        # the graph and the bar chart's transactions in parallel: as slow as the slower query, not both
+        transactions = tg_helper.query_runner.get_pool().submit(run_transactions, **sidebar_filters)
         # Compute filter pipeline, with auto-caching based on filter setting inputs
         filter_pipeline_result = run_filters(**sidebar_filters)
+        tracer.merge(filter_pipeline_result['trace'])
+        try:
+            transactions_df = transactions.result()
+        except Exception as e:
+            logger.error('Failed querying transactions: %s', e, exc_info=True)
+            transactions_df = None
 
         # Render main viz area based on computed filter pipeline results and sidebar settings if data is returned
         if filter_pipeline_result['nodes_df'].size > 0:
@@ -378,7 +290,8 @@ def run_all():
                       filter_pipeline_result['nodes_df'],
                       filter_pipeline_result['edges_df'],
                       sidebar_filters['user_id'],
-                      filter_pipeline_result['conn'])
+                      transactions_df,
+                      tracer)
         else:  # render a message
             st.write("No data matching the specfiied criteria is found")
 
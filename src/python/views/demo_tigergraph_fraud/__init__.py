@@ -4,11 +4,10 @@ import pandas as pd
 import streamlit as st
 from components import GraphistrySt, URLParam
 from css import all_css
+from util import Tracer
 import time
-from TigerGraph_helper import tg_helper
+from TigerGraph_helper import tg_helper, df_helper as tg_df_helper
 import plotly.express as px
-import pyTigerGraph as tg
-import datetime
 import logging
 
 ############################################
@@ -28,9 +27,30 @@ dst_id_col = 'Destination'
 node_label_col = 'Source_Type'
 edge_label_col = 'Destination_Type'
 
-# Setup a structure to hold metrics
-metrics = {'tigergraph_time': 0, 'graphistry_time': 0,
-           'node_cnt': 0, 'edge_cnt': 0, 'prop_cnt': 0}
+# Footer of per-run timings and counts, see util.Tracer
+footer_stages = {'query': 'TigerGraph Load Time (s)', 'upload': 'Graphistry Load Time (s)'}
+footer_counts = {'node_cnt': 'Node Count', 'edge_cnt': 'Edge Count', 'prop_cnt': 'Property Count'}
+
+# Users are colored by trust score, from red (< 0.2) to green (>= 0.8), other nodes by type
+trust_bins = [0.2, 0.4, 0.6, 0.8]
+trust_colors = [0xED293800, 0xB25F4A00, 0x77945C00, 0x3BCA6800, 0x00FF7F00]
+nodeType2color = {
+    'Transaction': 0x00000000,         # black
+    'Payment_Instrument': 0xFF00FF00,  # Purple
+    'Device_Token': 0x00FFFF00         # Light Blue
+}
+
+# FIXME: Beter as g.encode_edge_color('type', categorical_mapping={'User_Transfer_Transaction': 'orange', ...})
+edgeType2color = {
+    'User_Transfer_Transaction': 0xFF740000,     # orange
+    'User_Recieve_Transaction_Rev': 0xA5A5A500,  # light gray
+    'User_to_Payment': 0x42424200,               # dark gray
+    'User_to_Device': 0xF5B61700,                # yellow
+    'User_Referred_By_User': 0x60B9E000,         # light blue
+    'User_Recieve_Transaction': 0x0F0F0F00,
+    'User_Transfer_Transaction_Rev': 0xFF00FF00,
+    'User_Refer_User': 0xFF0F0F00
+}
 
 
 # Define the name of the view
@@ -46,6 +66,12 @@ def run():
     run_all()
 
 
+def warmup():
+    conn = tg_helper.connect_to_tigergraph()
+    if conn is not None:
+        tg_helper.query_catalog.ensure(conn)
+
+
 ############################################
 #
 #   PIPELINE PIECES
@@ -81,19 +107,13 @@ def sidebar_area():
     tg_secret = st.sidebar.text_input('TigerGraph Secret', type='password')
     tg_graphname = st.sidebar.text_input('TigerGraph Graphname')
     if st.sidebar.button("Connect"):
-        try:
-            conn = tg.TigerGraphConnection(
-                host=tg_host, graphname=tg_graphname, username=tg_username, password=tg_password,
-                version=tg_helper.TIGERGRAPH_CONNECTION_VERSION)
-            if tg_secret:
-                conn.getToken(tg_secret)
-            else:
-                conn.getToken(conn.createSecret())
-        # FIXME: What is the expected exn?
-        except Exception as e:  # noqa: E722
-            logger.error('Failed dynamic tg connection: %s', e, exc_info=True)
-            st.sidebar.error("Failed to Connect")
-            st.sidebar.error(e)
+        # Reuses an authenticated connection for the same host/graph/user across reruns and sessions
+        conn = tg_helper.connection_cache.get(
+            host=tg_host, graphname=tg_graphname, username=tg_username, password=tg_password,
+            secret=tg_secret or None)
+        if conn is None:
+            logger.error('Failed dynamic tg connection to %s', tg_host)
+            st.sidebar.error("Failed to Connect, see logs for details")
             return None
     else:
         conn = tg_helper.connect_to_tigergraph()
@@ -102,18 +122,19 @@ def sidebar_area():
         st.write(RuntimeError('Demo requires a TigerGraph connection. Put creds into left sidebar, or fill in envs/tigergraph.env & restart'))
         return None
 
-    return {'user_id': user_id, 'conn': conn}
+    # Lists and installs missing queries in the background, once per graph
+    tg_helper.query_catalog.ensure(conn)
+
+    return {'user_id': user_id, 'graph': (conn.host, conn.graphname), '_conn': conn}
 
 
-def plot_url(nodes_df, edges_df):
-    global metrics
+def plot_url(nodes_df, edges_df, tracer):
     # .encode_point_color("color") \
     # .encode_point_color('trust', palette=['red', 'green'], as_continuous=True) \
     # .encode_point_color('type', categorical_mapping={'Transaction': 'black', 'Device_Token': 'blue'})\
 
     try:
         logger.info('Starting graphistry plot')
-        tic = time.perf_counter()
         g = graphistry \
             .edges(edges_df) \
             .bind(source='from_id', destination='to_id') \
@@ -130,213 +151,56 @@ def plot_url(nodes_df, edges_df):
                                default_mapping='question') \
             .settings(url_params={'play': 7000, 'dissuadeHubs': True})
 
-        url = g.plot(render=False, as_files=True)
+        with tracer.span('upload'):
+            url = GraphistrySt().plot_url(g, as_files=True)
     except Exception as e:
         raise e
-    toc = time.perf_counter()
-    metrics['graphistry_time'] = toc - tic
-    logger.info(f'Graphisty Time: {metrics["graphistry_time"]}')
+    logger.info(f'Graphisty Time: {tracer.seconds("upload")}')
     logger.info('Generated viz, got back urL: %s', url)
 
     return url
 
+
 # Given filter settings, generate/cache/return dataframes & viz
 #@st.cache(suppress_st_warning=True, allow_output_mutation=True)
 @st.cache_data
-def run_filters(user_id, conn):  # noqa: C901
-    global metrics
+def run_filters(user_id, graph, _conn):  # noqa: C901
+    # _conn: shared, token-refreshed connection, so not hashed: graph keys the cache instead
+    conn = _conn
+    tracer = Tracer(app_id)
 
-    logger.info("Installing Queries")
-    try:
-        res = conn.gsql(
-        '''
-        use graph {}
-        ls
-        '''.format(conn.graphname), options=[])
-    except SystemExit as e:
-        logger.error('Failed listing graph queries %s', e, exc_info=True)
-        st.write('Failed listing graph queries')
-        st.write(e)
-        raise e
-    except Exception as e:
-        logger.error('Failed on `use graph` test: %s', e, exc_info=True)
-        st.write(e)
-        raise e
-
-    ind = res.index('Queries:') + 1
-    installTran = True
-    installFraud = True
-    for query in res[ind:]:
-        if 'totalTransaction' in query:
-            installTran = False
-        if 'fraudConnectivityGraph' in query:
-            installFraud = False
-
-    if installTran:
-        conn.gsql(
-        '''
-        use graph AntiFraud
-        CREATE QUERY totalTransaction(Vertex<User> Source) FOR GRAPH AntiFraud {
-            start = {Source};
-
-            transfer = SELECT tgt
-                FROM start:s -(User_Transfer_Transaction:e) - :tgt;
-
-            receive = select tgt
-                FROM start:s -(User_Recieve_Transaction:e) -:tgt;
-
-            PRINT transfer, receive;
-        }
-        Install query totalTransaction
-        ''', options=[])
-
-    if installFraud:
-        conn.gsql(
-        '''
-        use graph AntiFraud
-        CREATE QUERY fraudConnectivityGraph (VERTEX<User> inputUser) FOR GRAPH AntiFraud {
-            /*
-            This query finds all connect users/payment cards/device .
-
-            Starting with a user X find all other users connected to
-            X through device token, payment instrument connected via transactions
-
-            Sample input
-            User: any integer between 1 and 500
-            */
-            MapAccum<VERTEX,SetAccum <float>> @@trustS,@@trustD;
-            OrAccum<bool> @visited;
-            SetAccum<edge> @@visResult;
-
-            Start (_) = {inputUser};
-
-            // keep traverse for 3 steps
-            WHILE Start.size()>0 limit 5 DO
-                Start = SELECT t
-                    FROM Start:s-(:e)-:t
-                    WHERE t.@visited == false AND t != inputUser
-                    ACCUM
-                    @@visResult += e,
-                    @@trustS +=  (s -> s.trust_score),
-                    @@trustD +=  (t -> t.trust_score)
-                    POST-ACCUM
-                    t.@visited += true;
-            END;
-            print @@trustS;
-            print @@trustD;
-            print @@visResult;
-        }
-        Install query fraudConnectivityGraph
-        ''', options=[])
+    # in memory once the catalog is loaded, see sidebar_area()
+    tg_helper.query_catalog.wait(conn, ['fraudConnectivityGraph'])
 
     logger.info('Querying Tigergraph')
+    with tracer.span('query'):
+        results_TG = tg_helper.query_runner.run_one(conn, 'fraudConnectivityGraph', {'inputUser': user_id}, {'sizeLimit': 1000000000})
     tic = time.perf_counter()
-
-    results_TG = conn.runInstalledQuery("fraudConnectivityGraph", {"inputUser": user_id}, sizeLimit=1000000000)
-    results = results_TG[2]['@@visResult']
-    results_trust_source = results_TG[0]['@@trustS']
-    results_trust_destination = results_TG[1]['@@trustD']
-
-    # trust = []
-    from_ids = []
-    to_ids = []
-    types = []
-    from_types = []
-    to_types = []
-
-    for s in results:
-        from_ids.append(s['from_id'])
-        to_ids.append(s['to_id'])
-        types.append(s['e_type'])
-        from_types.append(s['from_type'])
-        to_types.append(s['to_type'])
-
-    edges_df = pd.DataFrame({
-        'from_id': from_ids,
-        'to_id': to_ids,
-        'type': types
-    })
-    node_idf = []
-    typef = []
-    trustf = []
-    for i in range(len(from_ids)):
-        if from_ids[i] not in node_idf:
-            try:
-                trustf.append(results_trust_source[str(from_ids[i])][0])
-            # FIXME: What is the expected exn?
-            except:  # noqa: E722
-                trustf.append(0)
-            node_idf.append(from_ids[i])
-            typef.append(from_types[i])
-        if to_ids[i] not in node_idf:
-            try:
-                trustf.append(results_trust_destination[str(to_ids[i])][0])
-            # FIXME: What is the expected exn?
-            except:  # noqa: E722
-                trustf.append(0)
-            node_idf.append(to_ids[i])
-            typef.append(to_types[i])
-
-    def nodeType2color(node_type, trust):
-        if node_type == 'User':
-            if trust < 0.2:
-                return 0xED293800       # red
-            elif trust < 0.4:
-                return 0xB25F4A00
-            elif trust < 0.6:
-                return 0x77945C00
-            elif trust < 0.8:
-                return 0x3BCA6800
-            else:
-                return 0x00FF7F00       # green
-
-        elif node_type == 'Transaction':
-            return 0x00000000  # black
-        elif node_type == 'Payment_Instrument':
-            return 0xFF00FF00  # Purple
-        elif node_type == 'Device_Token':
-            return 0x00FFFF00  # Light Blue
-
-        else:
-            return 0xFFFFFF00
-
-    # FIXME: Beter as g.encode_edge_color('type', categorical_mapping={'User_Transfer_Transaction': 'orange', ...})
-    edgeType2color = {
-        'User_Transfer_Transaction': 0xFF740000,     # orange
-        'User_Recieve_Transaction_Rev': 0xA5A5A500,  # light gray
-        'User_to_Payment': 0x42424200,               # dark gray
-        'User_to_Device': 0xF5B61700,                # yellow
-        'User_Referred_By_User': 0x60B9E000,         # light blue
-        'User_Recieve_Transaction': 0x0F0F0F00,
-        'User_Transfer_Transaction_Rev': 0xFF00FF00,
-        'User_Refer_User': 0xFF0F0F00
-    }
-
-    nodes_df = pd.DataFrame({
-        'n': node_idf,
-        'type': typef,
-        'trust': trustf,
-        'size': 0.1
-    })
-
-    nodes_df['color'] = nodes_df.apply(lambda x: nodeType2color(x['type'], x['trust']), axis=1)
-    edges_df['color'] = edges_df['type'].apply(lambda type_str: edgeType2color[type_str])
+    edges_df = tg_df_helper.edges_to_df(results_TG[2]['@@visResult'])
+    nodes_df = tg_df_helper.edges_to_nodes_df(
+        edges_df, node='n', from_values=results_TG[0]['@@trustS'], to_values=results_TG[1]['@@trustD'],
+        value='trust', default=0)
+    nodes_df['size'] = 0.1
+    edges_df = edges_df[['from_id', 'to_id', 'type']]
+
+    nodes_df['color'] = tg_df_helper.lookup_colors(nodes_df['type'], nodeType2color)
+    users = (nodes_df['type'] == 'User').to_numpy()
+    nodes_df.loc[users, 'color'] = tg_df_helper.binned_colors(nodes_df['trust'][users], trust_bins, trust_colors)
+    edges_df['color'] = tg_df_helper.lookup_colors(edges_df['type'], edgeType2color)
 
     try:
         res = nodes_df.values.tolist()
-        toc = time.perf_counter()
-        logger.info(f'Query Execution: {toc - tic:0.02f} seconds')
+        tracer.record('transform', time.perf_counter() - tic)
+        logger.info(f'Query Execution: {tracer.seconds("query"):0.02f} seconds')
         logger.debug('Query Result Count: %s', len(res))
-        metrics['tigergraph_time'] = toc - tic
 
         # Calculate the metrics
-        metrics['node_cnt'] = nodes_df.size
-        metrics['edge_cnt'] = edges_df.size
-        metrics['prop_cnt'] = (nodes_df.size * nodes_df.columns.size) + \
-                              (edges_df.size * edges_df.columns.size)
+        tracer.count('node_cnt', nodes_df.size)
+        tracer.count('edge_cnt', edges_df.size)
+        tracer.count('prop_cnt', (nodes_df.size * nodes_df.columns.size) + (edges_df.size * edges_df.columns.size))
 
         if nodes_df.size > 0:
-            url = plot_url(nodes_df, edges_df)
+            url = plot_url(nodes_df, edges_df, tracer)
         else:
             url = ""
     except Exception as e:
@@ -360,44 +224,29 @@ def run_filters(user_id, conn):  # noqa: C901
         logger.error('oops in TigerGraph', exc_info=True)
         raise e
 
-    return {'nodes_df': nodes_df, 'edges_df': edges_df, 'url': url, 'res': res, 'conn': conn}
+    return {'nodes_df': nodes_df, 'edges_df': edges_df, 'url': url, 'res': res, 'trace': tracer.snapshot()}
 
 
-def main_area(url, nodes, edges, user_id, conn):
+# Kept out of run_filters: raises when the query fails, so st.cache_data does not keep a missing bar chart and
+#  the next rerun retries it. run_all runs it on the query pool, alongside run_filters
+@st.cache_data(show_spinner=False)
+def run_transactions(user_id, graph, _conn):
+    """Monthly transaction totals of user_id, for the bar chart"""
+    tg_helper.query_catalog.wait(_conn, ['totalTransaction'])
+    transactions = tg_helper.query_runner.run_one(_conn, 'totalTransaction', {'Source': user_id}, {})[0]
+    return tg_df_helper.transactions_to_df(transactions)
 
-    logger.debug('rendering main area, with url: %s', url)
-    GraphistrySt().render_url(url)
 
-    dates = []
-    amounts = []
-    transfer_type = []
-    results = None
+def main_area(url, nodes, edges, user_id, transactions_df, tracer):
 
-    try:
-        results = conn.runInstalledQuery("totalTransaction", params={"Source": user_id})[0]
-    except Exception as e:
-        print(e)
+    logger.debug('rendering main area, with url: %s', url)
+    with tracer.span('render'):
+        GraphistrySt().render_url(url)
 
     # Create bar chart of transactions
-    if results is not None:
-        for action in results:
-            for transfer in results[action]:
-                dates.append(datetime.datetime.fromtimestamp(transfer['attributes']['ts']))
-                amounts.append(transfer['attributes']['amount'])
-                transfer_type.append(action)
-        cols = list(zip(dates, amounts, transfer_type))
-        cols = sorted(cols, key=lambda x: x[0].day)
-        cols = sorted(cols, key=lambda x: x[0].month)
-        cols = sorted(cols, key=lambda x: x[0].year)
-        df = pd.DataFrame(data=cols, columns=['Date', 'Amount', 'Type'])
-        df['Date'] = pd.to_datetime(df['Date'])
-        map_color = {"receive": "rgba(0,0,255,0.5)", "transfer": "rgba(255,0,0,0.5)"}
-        df['Color'] = df['Type'].map(map_color)
-
-        df = df.groupby([df['Date'].dt.to_period('M'), 'Type', 'Color']).sum()
-        df = df.reset_index(level=['Type', 'Color'])
-        df.index = df.index.values.astype('datetime64[M]')
-        bar = px.bar(df, x=df.index, y='Amount', labels={'x': 'Date'}, color='Type', color_discrete_map=map_color,
+    if transactions_df is not None:
+        bar = px.bar(transactions_df, x=transactions_df.index, y='Amount', labels={'x': 'Date'}, color='Type',
+                     color_discrete_map=tg_df_helper.TRANSACTION_COLORS,
                      text='Amount', title="Transaction Amounts by Month for User {}".format(user_id), height=350,
                      barmode='group')
         bar.update_xaxes(
@@ -413,13 +262,7 @@ def main_area(url, nodes, edges, user_id, conn):
 
         st.plotly_chart(bar, use_container_width=True)
 
-    st.markdown(f'''<small>
-            TigerGraph Load Time (s): {float(metrics['tigergraph_time']):0.2f} |
-            Graphistry Load Time (s): {float(metrics['graphistry_time']):0.2f} |
-            Node Count: {metrics['node_cnt']} |
-            Edge Count: {metrics['edge_cnt']} |
-            Property Count: {metrics['prop_cnt']}
-        </small>''', unsafe_allow_html=True)
+    st.markdown(tracer.footer_html(footer_stages, footer_counts), unsafe_allow_html=True)
 
 
 ############################################
@@ -434,6 +277,8 @@ def run_all():
 
     try:
 
+        tracer = Tracer(app_id)
+
         # Render sidebar, get current settings and TG connection
         sidebar_filters = sidebar_area()
 
@@ -441,7 +286,15 @@ def run_all():
         if sidebar_filters is None:
             return
 
+        # the graph and the bar chart's transactions in parallel: as slow as the slower query, not both
+        transactions = tg_helper.query_runner.get_pool().submit(run_transactions, **sidebar_filters)
         filter_pipeline_result = run_filters(**sidebar_filters)
+        tracer.merge(filter_pipeline_result['trace'])
+        try:
+            transactions_df = transactions.result()
+        except Exception as e:
+            logger.error('Failed querying transactions: %s', e, exc_info=True)
+            transactions_df = None
 
         # Render main viz area based on computed filter pipeline results and sidebar settings if data is returned
         if filter_pipeline_result['nodes_df'].size > 0:
@@ -449,7 +302,8 @@ def run_all():
                       filter_pipeline_result['nodes_df'],
                       filter_pipeline_result['edges_df'],
                       sidebar_filters['user_id'],
-                      filter_pipeline_result['conn'])
+                      transactions_df,
+                      tracer)
         else:  # render a message
             st.write("No data matching the specfiied criteria is found")
 